@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# bench_chip_memory.py
+#
+# Memory used by Chip objects, built the same way ChipList does
+#
+#   python -m benchmarks.bench_chip_memory [--count n]
+#
+import argparse
+import gc
+import json
+import tracemalloc
+from chiplabel.chip import Chip
+from .synthetic import generate_chips
+
+def measure_chip_memory(count, seed=0):
+    # yaml templates give the same pin list object to all chips using them
+    definitions = list(generate_chips(count, seed))
+
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+
+    chips = []
+    # Pin tuples shared while a library file is loaded, see ChipList._load_file
+    pin_tuples = {}
+    for definition in definitions:
+        chip = Chip(definition['id'], len(definition['pins']), library='lib',
+            rowSpacing=12 if definition.get('type') == 'wide' else 6)
+        if 'name' in definition:
+            chip.name = definition['name']
+        chip.description = definition['description']
+        chip.set_pins(definition['pins'])
+        chips.append(Chip.from_compiled(chip.unscoped_id, chip.library, chip.name,
+            chip.description, tuple(chip), rowSpacing=chip.row_spacing, pin_tuples=pin_tuples))
+    del chip, pin_tuples
+
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'chips': len(chips),
+        'bytes': end - start,
+        'bytes_per_chip': round((end - start) / len(chips), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Chip memory benchmark')
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(measure_chip_memory(args.count, args.seed), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# bench_crop.py
+#
+# Page crop time: pixel scan (Image.eval + getbbox) vs tracked label bbox
+#
+#   python -m benchmarks.bench_crop [--dpi 300 600 1200] [--page_size 7.5 10]
+#
+import argparse
+import json
+import logging
+import time
+from PIL import Image
+from chiplabel.chip import Chip
+from chiplabel.chip_grid_printer import ChipGridPrinter
+
+DEFAULT_DPIS = [300, 600, 1200]
+DEFAULT_PAGE_SIZE = (7.5, 10)
+REPEAT = 5
+
+def _fill_page(dpi, page_size):
+    """Page mostly filled with labels, with some whitespace left to crop"""
+    printer = ChipGridPrinter(dpi=dpi, page_size=page_size, page_nocrop=True)
+    chip = Chip('bench', 16, rowSpacing=6)
+    label_width, label_height = printer.get_chip_size(chip)
+    padding = printer.page_padding_pixels
+    page_width, page_height = printer.page_size_pixels
+    columns = max(1, (page_width * 3 // 4) // (label_width + padding))
+    rows = max(1, (page_height * 3 // 4) // (label_height + padding))
+    for n in range(columns * rows):
+        printer.print_to_page(chip)
+    return printer
+
+def _scan_crop(page):
+    inverted = Image.eval(page, (lambda x: 1-x))
+    return page.crop(inverted.getbbox())
+
+def _time(function, *args):
+    best = None
+    for n in range(REPEAT):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_crop(dpi, page_size):
+    printer = _fill_page(dpi, page_size)
+    page = printer._curr_page_image
+    bbox = printer.page_bbox
+    scan_time, scanned = _time(_scan_crop, page)
+    tracked_time, tracked = _time(page.crop, bbox)
+    assert scanned.size == tracked.size
+    return {
+        'dpi': dpi,
+        'page_pixels': page.size[0] * page.size[1],
+        'cropped_size': list(tracked.size),
+        'scan_time': round(scan_time, 6),
+        'tracked_time': round(tracked_time, 6),
+        'speedup': round(scan_time / tracked_time, 1) if tracked_time else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Page crop benchmark')
+    parser.add_argument('--dpi', type=int, nargs='+', default=DEFAULT_DPIS)
+    parser.add_argument('--page_size', type=float, nargs=2, default=DEFAULT_PAGE_SIZE)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    results = [bench_crop(dpi, tuple(args.page_size)) for dpi in args.dpi]
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
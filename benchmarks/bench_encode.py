@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# bench_encode.py
+#
+# Encode time vs output size of the bitmap formats, for a label and a page
+#
+#   python -m benchmarks.bench_encode [--dpi 300 600 1200] [--json]
+#
+import argparse
+import json
+import logging
+import time
+from chiplabel.args import DEFAULT_FONT_DIR
+from chiplabel.bilevel import encode_image, has_libtiff
+from chiplabel.chip import Chip
+from chiplabel.chip_grid_printer import ChipGridPrinter
+from chiplabel.chip_printer import ChipPrinter
+
+DEFAULT_DPIS = [300, 600, 1200]
+PAGE_SIZE = (7.5, 10)
+REPEAT = 3
+
+# Name: encode_image arguments
+ENCODINGS = {
+    'png -1': dict(format='png', png_compress=1),
+    'png -6': dict(format='png', png_compress=6),
+    'png -9': dict(format='png', png_compress=9),
+    'png -6 rle': dict(format='png', png_compress=6, png_strategy='rle'),
+    'png -6 huffman': dict(format='png', png_compress=6, png_strategy='huffman'),
+    'pbm': dict(format='pbm'),
+    'tiff (G4)': dict(format='tiff'),
+}
+
+def _chip():
+    chip = Chip('bench', 40, rowSpacing=15.24)
+    chip.set_pins([f'{"ABDQY"[n % 5]}{n}' for n in range(40)])
+    return chip
+
+def _page(dpi):
+    """Page filled with labels"""
+    printer = ChipGridPrinter(dpi=dpi, font=DEFAULT_FONT_DIR, page_size=PAGE_SIZE, page_nocrop=True)
+    chip = Chip('bench', 16, rowSpacing=6)
+    chip.set_pins([f'{"ABDQY"[n % 5]}{n}' for n in range(16)])
+    label = printer._print_label(chip)
+    label_width, label_height = label.size
+    padding = printer.page_padding_pixels
+    page_width, page_height = printer.page_size_pixels
+    columns = max(1, (page_width + padding) // (label_width + padding))
+    rows = max(1, (page_height + padding) // (label_height + padding))
+    for n in range(columns * rows):
+        printer.print_to_page(chip, label)
+    return printer._curr_page_image
+
+def _time(function, *args, **kwargs):
+    best = None
+    for n in range(REPEAT):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_encode(dpi):
+    images = {
+        'label': ChipPrinter(dpi=dpi, font=DEFAULT_FONT_DIR).print_chip(_chip()),
+        'page': _page(dpi),
+    }
+    results = []
+    for image_name, image in images.items():
+        for name, options in ENCODINGS.items():
+            encode_time, data = _time(encode_image, image, dpi=dpi, **options)
+            results.append({
+                'image': image_name,
+                'dpi': dpi,
+                'pixels': image.size[0] * image.size[1],
+                'encoding': name,
+                'time': round(encode_time, 6),
+                'size': len(data),
+            })
+    return results
+
+def _table(results):
+    lines = ['| image | dpi | encoding | time (ms) | size (KB) |', '|---|---|---|---|---|']
+    for result in results:
+        lines.append(f"| {result['image']} | {result['dpi']} | {result['encoding']} | "
+            f"{result['time'] * 1000:.1f} | {result['size'] / 1024:.1f} |")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Bitmap encode benchmark')
+    parser.add_argument('--dpi', type=int, nargs='+', default=DEFAULT_DPIS)
+    parser.add_argument('--json', action='store_true', help='JSON output instead of a markdown table')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    results = [result for dpi in args.dpi for result in bench_encode(dpi)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(_table(results))
+        print(f"\ntiff encoder: {'libtiff' if has_libtiff() else 'chiplabel.tiff_writer'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# bench_import.py
+#
+# Startup time of the command line, with a budget
+#
+#   python -m benchmarks.bench_import [--repeat n] [--budget_ms ms]
+#
+# Measures the cumulative import time of chiplabel.chip_label (-X importtime)
+# and the wall time of a few quick commands, and checks that they don't
+# import modules they don't need. Exits with an error when over budget.
+#
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+IMPORT_BUDGET_MS = 60 # cumulative import time of chiplabel.chip_label
+DEFAULT_REPEAT = 5
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# command: modules it must not import
+COMMANDS = {
+    '--version': ['PIL', 'yaml', 'pkg_resources'],
+    '-l': ['PIL', 'pkg_resources'],
+    '-t -c 7400': ['PIL', 'pkg_resources'],
+    '--search shift reg': ['PIL', 'pkg_resources'],
+    '-c 7400 -o {output}': ['pkg_resources'],
+    '-c 7400 -p -o {output}': ['pkg_resources', 'numpy'],
+}
+
+CHECK_MODULES = '''
+import sys, io, contextlib
+from chiplabel import chip_label
+with contextlib.redirect_stdout(io.StringIO()):
+    chip_label.main(['chip_label'] + sys.argv[1:])
+print(' '.join(sorted(name for name in {modules!r} if name in sys.modules)))
+'''
+
+def _python(*args, **kwargs):
+    return subprocess.run([sys.executable, *args], cwd=ROOT_DIR,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True, **kwargs)
+
+def measure_import_time():
+    """Cumulative import time of chiplabel.chip_label in ms"""
+    result = _python('-X', 'importtime', '-c', 'import chiplabel.chip_label')
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'chiplabel.chip_label':
+            return int(fields[1]) / 1000
+    raise RuntimeError('chiplabel.chip_label not found in -X importtime output')
+
+def measure_command(command, forbidden, output_dir):
+    """Wall time (ms) of a command, and the forbidden modules it imported"""
+    args = command.format(output=output_dir).split()
+    start = time.perf_counter()
+    _python('-m', 'chiplabel', *args)
+    wall_time = (time.perf_counter() - start) * 1000
+    imported = _python('-c', CHECK_MODULES.format(modules=forbidden), *args).stdout.split()
+    return wall_time, imported
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time benchmark')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--budget_ms', type=float, default=IMPORT_BUDGET_MS,
+        help=f'import time budget (default: {IMPORT_BUDGET_MS})')
+    args = parser.parse_args()
+
+    import tempfile
+    report = {
+        'import_ms': round(min(measure_import_time() for n in range(args.repeat)), 1),
+        'budget_ms': args.budget_ms,
+        'commands': {},
+    }
+    errors = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for command, forbidden in COMMANDS.items():
+            runs = [measure_command(command, forbidden, output_dir) for n in range(args.repeat)]
+            imported = runs[0][1]
+            report['commands'][command] = {
+                'wall_ms': round(min(wall_time for wall_time, _ in runs), 1),
+                'forbidden_imports': imported,
+            }
+            if imported:
+                errors.append(f'[{command}] imports {", ".join(imported)}')
+
+    if report['import_ms'] > args.budget_ms:
+        errors.append(f'import time {report["import_ms"]} ms is over budget ({args.budget_ms} ms)')
+    print(json.dumps(report, indent=2))
+    for error in errors:
+        print(f'ERROR: {error}', file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# bench_suite.py
+#
+# Load, lookup, render and CLI benchmarks on synthetic chip libraries
+#
+#   python -m benchmarks.bench_suite [--sizes 1000 10000 100000] [--output results.json]
+#   python -m benchmarks.bench_suite --compare old.json new.json
+#
+# Each benchmark runs in a fresh interpreter so peak RSS only accounts for
+# that benchmark. Results are written as JSON.
+#
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from chiplabel.args import DEFAULT_FONT_DIR
+from .synthetic import chip_ids, write_library
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_RENDER_COUNT = 200 # labels rendered by the render benchmarks
+DEFAULT_LOOKUP_COUNT = 100000
+FILES_PER_10K_CHIPS = 4
+# The bundled font, like the command line
+RENDER_CONFIG = {'dpi': 300, 'font': DEFAULT_FONT_DIR}
+PAGE_CONFIG = {'dpi': 300, 'font': DEFAULT_FONT_DIR, 'page_size': (8.5, 11)}
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+def get_peak_rss():
+    """Peak resident set size of this process in KB, None if unknown"""
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+class Phases:
+    """Wall clock time of the named phases of a benchmark"""
+    def __init__(self):
+        self.times = {}
+
+    @contextlib.contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0) + time.perf_counter() - start
+
+def _load(library, phases):
+    from chiplabel.chip_list import ChipList
+    chip_list = ChipList()
+    with phases('load'):
+        chip_list.load(library)
+    return chip_list
+
+def _sample(chip_list, count, seed=0):
+    chips = list(chip_list)
+    random.Random(seed).shuffle(chips)
+    return chips[:count]
+
+def bench_load(library, phases, options):
+    chip_list = _load(library, phases)
+    return len(chip_list), phases.times['load']
+
+def bench_find_chip(library, phases, options):
+    chip_list = _load(library, phases)
+    ids = chip_ids(options.count, options.seed)
+    rng = random.Random(options.seed)
+    # Mix of direct hits, family aliases (74LS00 -> 7400) and misses
+    lookups = []
+    for n in range(options.lookup_count):
+        chip_id = rng.choice(ids)
+        kind = rng.random()
+        if kind < 0.2 and chip_id.startswith('74'):
+            chip_id = f'74LS{chip_id[2:]}'
+        elif kind < 0.3:
+            chip_id = f'X{chip_id}'
+        lookups.append(chip_id)
+    with phases('lookup'):
+        for chip_id in lookups:
+            chip_list.find_chip(chip_id)
+    return len(lookups), phases.times['lookup']
+
+def bench_search(library, phases, options):
+    chip_list = _load(library, phases)
+    ids = chip_ids(options.count, options.seed)
+    rng = random.Random(options.seed)
+    # Exact ids, prefixes, family aliases, typos and words
+    queries = []
+    for n in range(min(options.lookup_count, 10000)):
+        chip_id = rng.choice(ids)
+        kind = rng.random()
+        if kind < 0.2:
+            query = chip_id[:max(2, len(chip_id) - 2)]
+        elif kind < 0.4 and chip_id.startswith('74'):
+            query = f'74HC{chip_id[2:]}'
+        elif kind < 0.6:
+            position = rng.randrange(len(chip_id))
+            query = chip_id[:position] + 'X' + chip_id[position + 1:]
+        elif kind < 0.7:
+            query = f'synthetic {rng.randrange(100)}'
+        else:
+            query = chip_id
+        queries.append(query)
+    with phases('index'):
+        chip_list.search(queries[0])
+    with phases('search'):
+        for query in queries:
+            chip_list.search(query)
+    return len(queries), phases.times['search']
+
+def bench_print_chip(library, phases, options):
+    from chiplabel.chip_printer import ChipPrinter
+    chip_list = _load(library, phases)
+    chips = _sample(chip_list, options.render_count, options.seed)
+    with phases('init'):
+        printer = ChipPrinter(**RENDER_CONFIG)
+    with phases('render'):
+        for chip in chips:
+            printer.print_chip(chip)
+    return len(chips), phases.times['render']
+
+def bench_print_pages(library, phases, options):
+    from chiplabel.chip_grid_printer import ChipGridPrinter
+    chip_list = _load(library, phases)
+    chips = _sample(chip_list, options.render_count, options.seed)
+    with tempfile.TemporaryDirectory() as output_dir:
+        with phases('init'):
+            printer = ChipGridPrinter(output=output_dir, **PAGE_CONFIG)
+        with phases('render'):
+            printer.print_chips(chips)
+    return len(chips), phases.times['render']
+
+def bench_print_pages_numpy(library, phases, options):
+    from chiplabel.chip_grid_printer import ChipGridPrinter
+    chip_list = _load(library, phases)
+    chips = _sample(chip_list, options.render_count, options.seed)
+    with tempfile.TemporaryDirectory() as output_dir:
+        with phases('init'):
+            printer = ChipGridPrinter(output=output_dir, page_engine='numpy', **PAGE_CONFIG)
+        with phases('render'):
+            printer.print_chips(chips)
+    return len(chips), phases.times['render']
+
+def bench_text(library, phases, options):
+    from chiplabel.chip_label import print_chips_text
+    chip_list = _load(library, phases)
+    chips = _sample(chip_list, options.render_count, options.seed)
+    with phases('render'), contextlib.redirect_stdout(io.StringIO()):
+        print_chips_text(chips, None)
+    return len(chips), phases.times['render']
+
+def bench_cli(library, phases, options):
+    from chiplabel import chip_label
+    ids = chip_ids(options.count, options.seed)
+    random.Random(options.seed).shuffle(ids)
+    ids = ids[:options.render_count]
+    with tempfile.TemporaryDirectory() as output_dir:
+        argv = ['chip_label', '-i', library, '-o', output_dir, '-c'] + ids
+        with phases('main'):
+            chip_label.main(argv)
+    return len(ids), phases.times['main']
+
+BENCHMARKS = {
+    'load': bench_load,
+    'find_chip': bench_find_chip,
+    'search': bench_search,
+    'print_chip': bench_print_chip,
+    'print_pages': bench_print_pages,
+    'print_pages_numpy': bench_print_pages_numpy,
+    'text': bench_text,
+    'cli': bench_cli,
+}
+
+def run_benchmark(name, library, options):
+    """Run one benchmark in this process and return its result"""
+    logging.disable(logging.CRITICAL)
+    phases = Phases()
+    start = time.perf_counter()
+    items, measured_time = BENCHMARKS[name](library, phases, options)
+    total_time = time.perf_counter() - start
+    return {
+        'benchmark': name,
+        'chips': options.count,
+        'items': items,
+        'time': round(measured_time, 6),
+        'throughput': round(items / measured_time, 1) if measured_time else None,
+        'total_time': round(total_time, 6),
+        'phases': {phase: round(seconds, 6) for phase, seconds in phases.times.items()},
+        'peak_rss_kb': get_peak_rss(),
+    }
+
+def _run_in_subprocess(name, library, options):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        result_file = os.path.join(temp_dir, 'result.json')
+        command = [sys.executable, '-m', 'benchmarks.bench_suite',
+            '--run', name, '--library', library, '--result', result_file,
+            '--sizes', str(options.count), '--seed', str(options.seed),
+            '--render_count', str(options.render_count),
+            '--lookup_count', str(options.lookup_count)]
+        subprocess.run(command, check=True)
+        with open(result_file, encoding='utf8') as result:
+            return json.load(result)
+
+def run_suite(sizes, names, options):
+    from chiplabel._version import __version__
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as library:
+            files = max(1, size * FILES_PER_10K_CHIPS // 10000)
+            write_library(library, size, files=files, seed=options.seed)
+            options.count = size
+            for name in names:
+                print(f'{name} ({size} chips)...', file=sys.stderr)
+                results.append(_run_in_subprocess(name, library, options))
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+def compare(old_file, new_file):
+    """Print the time ratio of each benchmark between two result files"""
+    def load_results(filename):
+        with open(filename, encoding='utf8') as result_file:
+            return {(result['benchmark'], result['chips']): result
+                for result in json.load(result_file)['results']}
+    old = load_results(old_file)
+    new = load_results(new_file)
+    print(f'{"benchmark":<12} {"chips":>7} {"old (s)":>10} {"new (s)":>10} {"ratio":>7} {"RSS (MB)":>17}')
+    for key, new_result in new.items():
+        old_result = old.get(key)
+        if not old_result:
+            continue
+        ratio = new_result['time'] / old_result['time'] if old_result['time'] else 0
+        rss = '-'
+        if old_result['peak_rss_kb'] and new_result['peak_rss_kb']:
+            rss = f"{old_result['peak_rss_kb'] // 1024} -> {new_result['peak_rss_kb'] // 1024}"
+        print(f'{key[0]:<12} {key[1]:>7} {old_result["time"]:>10.4f} '
+            f'{new_result["time"]:>10.4f} {ratio:>7.2f} {rss:>17}')
+
+def main():
+    parser = argparse.ArgumentParser(description='chiplabel benchmark suite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='library sizes (number of chips)')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS),
+        default=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--render_count', type=int, default=DEFAULT_RENDER_COUNT,
+        help='labels rendered by the render benchmarks')
+    parser.add_argument('--lookup_count', type=int, default=DEFAULT_LOOKUP_COUNT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON output file (default: stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+        help='compare two result files')
+    # Internal, single benchmark run in a subprocess
+    parser.add_argument('--run', choices=list(BENCHMARKS), help=argparse.SUPPRESS)
+    parser.add_argument('--library', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.run:
+        args.count = args.sizes[0]
+        result = run_benchmark(args.run, args.library, args)
+        with open(args.result, 'w', encoding='utf8') as result_file:
+            json.dump(result, result_file)
+        return
+
+    report = run_suite(args.sizes, args.benchmarks, args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
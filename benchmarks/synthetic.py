@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# synthetic.py
+#
+# Synthetic chip libraries for benchmarks
+#
+import os
+import random
+
+PIN_COUNTS = [8, 8, 14, 14, 14, 16, 16, 18, 20, 24, 28, 40]
+PIN_NAMES = ['GND', 'VCC', 'CLK', '/OE', '/CE', '/WE', 'NC', '~RST', 'RDY', 'OUT']
+TEMPLATE_RATIO = 0.7 # chips sharing a pinout with other chips
+FAMILY_RATIO = 0.3 # chips with family aliases
+
+def _make_pins(rng, pin_count):
+    pins = []
+    for pin in range(pin_count):
+        if rng.random() < 0.3:
+            pins.append(rng.choice(PIN_NAMES))
+        else:
+            pins.append(f'{rng.choice("ABDQY")}{rng.randint(0, 15)}')
+    return pins
+
+def generate_chips(count, seed=0):
+    """Generate chip definitions (dict) similar to the ones in yaml libraries.
+
+    Like the bundled libraries, most chips share their pinout with other
+    chips (yaml templates) and some are part of the 7400 family.
+    """
+    rng = random.Random(seed)
+    templates = [_make_pins(rng, rng.choice(PIN_COUNTS))
+        for n in range(max(1, count // 20))]
+
+    for n in range(count):
+        chip = {}
+        if rng.random() < FAMILY_RATIO:
+            chip['id'] = f'74{n}'
+            chip['family'] = '7400'
+        else:
+            chip['id'] = f'C{n}'
+        if rng.random() < 0.2:
+            chip['name'] = f'Chip{n}'
+        chip['description'] = f'synthetic chip {n % 100}'
+        if rng.random() < 0.1:
+            chip['type'] = 'wide'
+        if rng.random() < TEMPLATE_RATIO:
+            chip['template'] = rng.randrange(len(templates))
+            chip['pins'] = templates[chip['template']]
+        else:
+            chip['pins'] = _make_pins(rng, rng.choice(PIN_COUNTS))
+        yield chip
+
+def _yaml_list(items):
+    return '[' + ', '.join(f"'{item}'" for item in items) + ']'
+
+def write_library(directory, count, files=1, seed=0):
+    """Write count chips in one or more .yaml library files"""
+    chips = list(generate_chips(count, seed))
+    per_file = max(1, -(-count // files))
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, f'lib{index}.yaml')
+        file_chips = chips[index*per_file:(index+1)*per_file]
+        templates = sorted({chip['template'] for chip in file_chips if 'template' in chip})
+        with open(path, 'w', encoding='utf8') as libfile:
+            for template in templates:
+                pins = next(chip['pins'] for chip in file_chips if chip.get('template') == template)
+                libfile.write(f'_t{template}: &t{template}\n  pins: {_yaml_list(pins)}\n\n')
+            for chip in file_chips:
+                libfile.write(f"'{chip['id']}':\n")
+                if 'template' in chip:
+                    libfile.write(f"  <<: *t{chip['template']}\n")
+                else:
+                    libfile.write(f"  pins: {_yaml_list(chip['pins'])}\n")
+                for key in ('name', 'description', 'type', 'family'):
+                    if key in chip:
+                        libfile.write(f"  {key}: '{chip[key]}'\n")
+        paths.append(path)
+    return paths
+
+def chip_ids(count, seed=0):
+    return [chip['id'] for chip in generate_chips(count, seed)]
@@ -1,17 +1,44 @@
 #!/usr/bin/env python3
 import argparse
 import logging
-import pkg_resources
+import os
 log = logging.getLogger(__name__)
 
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _resource_path(name):
+    """Path of a file bundled with the package"""
+    path = os.path.join(PACKAGE_DIR, name)
+    if os.path.exists(path):
+        return path
+    # Not installed as plain files, importlib.resources is slow to import
+    try:
+        from importlib.resources import files
+    except ImportError: # Python < 3.9
+        return path
+    return str(files('chiplabel').joinpath(name))
+
 MIN_DPI = 100
 MAX_DPI = 2000
 DEFAULT_DPI = 300
 DEFAULT_FONT = 'CascadiaMono.ttf'
 DEFAULT_FONT_SIZE = 1.0
-DEFAULT_FONT_DIR = pkg_resources.resource_filename('chiplabel', f'fonts/{DEFAULT_FONT}')
-DEFAULT_INPUT_DIR = pkg_resources.resource_filename('chiplabel', 'chips')
+IMAGE_FORMATS = ['png', 'pbm', 'tiff', 'svg', 'pdf']
+BITMAP_FORMATS = ['png', 'pbm', 'tiff']
+VECTOR_FORMATS = ['svg', 'pdf']
+DEFAULT_IMAGE_FORMAT = 'png'
+MIN_PNG_COMPRESS = 0
+MAX_PNG_COMPRESS = 9
+DEFAULT_PNG_COMPRESS = 6 # same default as Pillow and zlib
+PNG_STRATEGIES = ['default', 'filtered', 'huffman', 'rle', 'fixed']
+DEFAULT_PNG_STRATEGY = 'default'
+DEFAULT_FONT_DIR = _resource_path(f'fonts/{DEFAULT_FONT}')
+DEFAULT_INPUT_DIR = _resource_path('chips')
 DEFAULT_OUTPUT_DIR = '.'
+DEFAULT_SERVE_ADDRESS = 'localhost:8765'
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'chiplabel')
 
 MIN_PAGE_SIZE = 1
 MAX_PAGE_SIZE = 20
@@ -21,6 +48,17 @@ MIN_PADDING = 0
 MAX_PADDING = 1
 DEFAULT_PAGE_PADDING = 0.1
 
+DEFAULT_PAGE_MEMORY = 256 # MB
+
+DEFAULT_WATCH_INTERVAL = 1.0 # seconds
+
+PAGE_FILE_EXTENSIONS = ['.pdf', '.tif', '.tiff']
+
+PAGE_PACKING = ['shelf', 'skyline', 'maxrects', 'guillotine']
+DEFAULT_PAGE_PACKING = 'shelf'
+PAGE_ENGINES = ['pil', 'numpy']
+DEFAULT_PAGE_ENGINE = 'pil'
+
 def _page_padding_range(string):
     try:
         value = float(string)
@@ -39,6 +77,20 @@ def _page_size_range(string):
         raise argparse.ArgumentTypeError(f'{string} is not an integer value')
     return value
 
+def _watch_interval_type(string):
+    try:
+        value = float(string)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{string} is not a number')
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive number')
+    return value
+
+def _page_file_type(string):
+    if os.path.splitext(string)[1].lower() not in PAGE_FILE_EXTENSIONS:
+        raise argparse.ArgumentTypeError(f'{string} is not a .pdf or .tiff file')
+    return string
+
 def _dpi_range(string):
     try:
         value = int(string)
@@ -48,6 +100,33 @@ def _dpi_range(string):
         raise argparse.ArgumentTypeError(f'{string} is not an integer value')
     return value
 
+def _png_compress_range(string):
+    try:
+        value = int(string)
+        if value < MIN_PNG_COMPRESS or value > MAX_PNG_COMPRESS:
+            raise argparse.ArgumentTypeError(f'{value} is not in range [{MIN_PNG_COMPRESS}, {MAX_PNG_COMPRESS}]')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{string} is not an integer value')
+    return value
+
+def _jobs_type(string):
+    try:
+        value = int(string)
+        if value < 0:
+            raise argparse.ArgumentTypeError(f'{value} is not a positive value')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{string} is not an integer value')
+    return value
+
+def _page_memory_type(string):
+    try:
+        value = int(string)
+        if value < 0:
+            raise argparse.ArgumentTypeError(f'{value} is not a positive value')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{string} is not an integer value')
+    return value
+
 def _float_type(string):
     try:
         value = float(string)
@@ -66,7 +145,7 @@ def parse_args(args=None):
         '-c', '--chip',
         nargs='+',
         metavar='name',
-        help='one or more chip identifier'
+        help="one or more chip identifier, with an optional quantity: 'id x8' or 'id,8' (csv). - reads the list from stdin"
     )
     action_group.add_argument(
         '-a', '--all',
@@ -78,6 +157,19 @@ def parse_args(args=None):
         help='list all chips in package',
         action='store_true'
     )
+    action_group.add_argument(
+        '--search',
+        nargs='+',
+        metavar='word',
+        help='search chips by id, name, description and pin names. Prefixes, family aliases and typos are matched, e.g. --search 74HC59 or --search shift reg',
+    )
+    action_group.add_argument(
+        '--serve',
+        nargs='?',
+        metavar='address',
+        const=DEFAULT_SERVE_ADDRESS,
+        help=f'keep the chip library loaded and serve labels and pages over http on host:port or unix:/path/to/socket (default: {DEFAULT_SERVE_ADDRESS})',
+    )
     action_group.add_argument(
         '--version',
         help="print version info",
@@ -96,6 +188,45 @@ def parse_args(args=None):
         help=f'output directory (default: {DEFAULT_OUTPUT_DIR})',
         default=DEFAULT_OUTPUT_DIR
     )
+    parser.add_argument(
+        '--cache',
+        nargs='?',
+        metavar='dir',
+        const=DEFAULT_CACHE_DIR,
+        help=f'keep compiled chip libraries, an index of the chips in each file and rendered labels in a persistent cache between runs. With an index, -c only loads the files containing the requested chips (default dir: {DEFAULT_CACHE_DIR})',
+        default=None
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='only render the labels whose chip definition or settings changed since the last run, using a manifest file in the output directory. With -a, the labels of chips that no longer exist are deleted. Ignored in page mode',
+    )
+
+    parser.add_argument(
+        '--watch',
+        nargs='?',
+        metavar='seconds',
+        type=_watch_interval_type,
+        const=DEFAULT_WATCH_INTERVAL,
+        help=f'with -a or -c, keep running and check the input files for changes every n seconds (default: {DEFAULT_WATCH_INTERVAL:g}). Only the library files that changed are loaded again, and only the labels or pages of the chips that changed are printed again',
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        metavar='n',
+        type=_jobs_type,
+        help='number of labels to render in parallel, 0 to use all cpus (default: 1). Ignored in page mode',
+        default=1
+    )
+
+    parser.add_argument(
+        '--writers',
+        metavar='n',
+        type=_jobs_type,
+        help='number of background threads encoding and writing images, 0 to write them synchronously (default: 0)',
+        default=0
+    )
 
     graph_group = parser.add_argument_group('Image Options')
     graph_group.add_argument(
@@ -118,6 +249,25 @@ def parse_args(args=None):
         help=f'resolution in dots per inch (default: {DEFAULT_DPI})',
         default=DEFAULT_DPI
     )
+    graph_group.add_argument(
+        '--format',
+        choices=IMAGE_FORMATS,
+        help=f'output format. png, pbm (raw, uncompressed: fastest to write) and tiff (CCITT group 4 fax compression) are 1-bit images. svg and pdf are vector formats, their size does not depend on the dpi; pdf uses the standard Courier font (default: {DEFAULT_IMAGE_FORMAT})',
+        default=DEFAULT_IMAGE_FORMAT
+    )
+    graph_group.add_argument(
+        '--png_compress',
+        metavar='level',
+        type=_png_compress_range,
+        help=f'png zlib compression level, from 0 (none, fastest) to 9 (smallest) (default: {DEFAULT_PNG_COMPRESS})',
+        default=DEFAULT_PNG_COMPRESS
+    )
+    graph_group.add_argument(
+        '--png_strategy',
+        choices=PNG_STRATEGIES,
+        help=f'png zlib compression strategy: rle and huffman are faster, filtered and fixed are alternatives for some images (default: {DEFAULT_PNG_STRATEGY})',
+        default=DEFAULT_PNG_STRATEGY
+    )
     graph_group.add_argument(
         '--invert',
         help='invert label, for dead bug soldering',
@@ -146,6 +296,36 @@ def parse_args(args=None):
         default=DEFAULT_PAGE_PADDING
     )
 
+    page_group.add_argument(
+        '--page_packing',
+        choices=PAGE_PACKING,
+        help=f'how chips are placed on pages: shelf fills rows in order, the other methods pack labels in the gaps (default: {DEFAULT_PAGE_PACKING})',
+        default=DEFAULT_PAGE_PACKING
+    )
+    page_group.add_argument(
+        '--page_rotate',
+        action='store_true',
+        help='allow labels to be rotated 90 degrees to fit more labels on a page (ignored for shelf packing)',
+    )
+    page_group.add_argument(
+        '--page_file',
+        metavar='file',
+        type=_page_file_type,
+        help='write all the pages to a single multi-page .pdf or .tiff file in the output directory instead of a file per page. Pages are written as they are completed, only one page is kept in memory. Vector output (--format pdf) can only be written to a .pdf file',
+    )
+    page_group.add_argument(
+        '--page_memory',
+        metavar='MB',
+        type=_page_memory_type,
+        help=f'memory for a page image, larger pages are rendered and written in horizontal bands (png, pbm or tiff files or --page_file .pdf). 0 for no limit (default: {DEFAULT_PAGE_MEMORY})',
+        default=DEFAULT_PAGE_MEMORY
+    )
+    page_group.add_argument(
+        '--page_engine',
+        choices=PAGE_ENGINES,
+        help=f'how pages are composed: pil images use a byte per pixel, numpy keeps pages bit-packed (8 pixels per byte) and writes png files without a PIL image. Requires numpy (default: {DEFAULT_PAGE_ENGINE})',
+        default=DEFAULT_PAGE_ENGINE
+    )
     page_group.add_argument(
         '--page_nocrop',
         action='store_true',
@@ -160,6 +340,23 @@ def parse_args(args=None):
         action="store_true"
     )
 
+    profile_group = parser.add_argument_group('Profiling Options')
+    profile_group.add_argument(
+        '--profile',
+        help='print the time spent in each phase (yaml parsing, alias creation, font loading, text measurement, drawing, rotation, page layout and crop, encoding) and the slowest chips to stderr',
+        action='store_true'
+    )
+    profile_group.add_argument(
+        '--profile_stats',
+        metavar='file',
+        help='also run cProfile and write its statistics to file, see python -m pstats. Implies --profile',
+    )
+    profile_group.add_argument(
+        '--profile_trace',
+        metavar='file',
+        help='write the phases to a Chrome trace file, for chrome://tracing or ui.perfetto.dev. Implies --profile',
+    )
+
     debug_group = parser.add_mutually_exclusive_group()
     debug_group.add_argument(
         '--debug',
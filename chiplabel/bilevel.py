@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# bilevel.py
+#
+# Encoders of the 1-bit (bitmap) output formats: png with a zlib level and
+# strategy, raw pbm and CCITT group 4 tiff. Images are mode '1' PIL
+# images, PackedPage or bands, anything with size and tobytes().
+#
+import functools
+import io
+import os
+import zlib
+from PIL import Image
+from .args import BITMAP_FORMATS, DEFAULT_PNG_COMPRESS, DEFAULT_PNG_STRATEGY
+from .png_writer import write_png
+from .tiff_writer import write_g4_tiff
+
+PNG_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+# pbm uses 1 for black, mode '1' data 1 for white
+_INVERT = bytes(255 - n for n in range(256))
+
+def write_pbm(stream, size, bands):
+    """Write a raw (P4) pbm of size (width, height) to a binary stream, from
+    bands of the full width, top to bottom. pbm has no resolution"""
+    width, height = size
+    stream.write(b'P4\n%d %d\n' % (width, height))
+    rows = 0
+    for band in bands:
+        if band.size[0] != width:
+            raise ValueError(f'Band width {band.size[0]} is not the image width {width}')
+        rows += band.size[1]
+        stream.write(band.tobytes().translate(_INVERT))
+    if rows != height:
+        raise ValueError(f'Bands have {rows} rows instead of {height}')
+
+@functools.lru_cache(maxsize=None)
+def has_libtiff():
+    """Pillow can write G4 tiff files itself, faster than write_g4_tiff"""
+    from PIL import features
+    return features.check('libtiff')
+
+def write_bands(stream, format, size, bands, dpi=None, png_compress=DEFAULT_PNG_COMPRESS,
+        png_strategy=DEFAULT_PNG_STRATEGY):
+    """Write an image in a bitmap format, from bands of the full width"""
+    if format == 'png':
+        write_png(stream, size, bands, dpi=dpi, compress_level=png_compress,
+            strategy=PNG_STRATEGIES[png_strategy])
+    elif format == 'pbm':
+        write_pbm(stream, size, bands)
+    elif format == 'tiff':
+        write_g4_tiff(stream, size, bands, dpi=dpi)
+    else:
+        raise ValueError(f'Unsupported bitmap format: {format}')
+
+# Other extensions of the bitmap formats
+_EXTENSIONS = {'tif': 'tiff', 'pnm': 'pbm'}
+
+def get_format(filename):
+    """Bitmap format of a file name, from its extension, or None"""
+    extension = os.path.splitext(filename)[1][1:].lower()
+    extension = _EXTENSIONS.get(extension, extension)
+    return extension if extension in BITMAP_FORMATS else None
+
+def save_image(image, fp, format=None, dpi=None, png_compress=DEFAULT_PNG_COMPRESS,
+        png_strategy=DEFAULT_PNG_STRATEGY):
+    """Write an image to a file name or a binary stream. The format of a
+    file name is its extension by default, PIL images with the extension
+    of another format are saved by Pillow"""
+    if not fp:
+        raise ValueError('No output file')
+    if format is None:
+        format = get_format(fp) if isinstance(fp, str) else 'png'
+        if format is None and isinstance(image, Image.Image):
+            image.save(fp, dpi=(dpi, dpi) if dpi else None)
+            return
+    if format not in BITMAP_FORMATS:
+        raise ValueError(f'Unsupported bitmap format: {format}')
+    if isinstance(fp, str):
+        try:
+            with open(fp, 'wb') as stream:
+                save_image(image, stream, format, dpi, png_compress, png_strategy)
+        except Exception:
+            # No partial file
+            if os.path.isfile(fp):
+                os.remove(fp)
+            raise
+        return
+
+    # PIL images are encoded by Pillow when it can
+    if isinstance(image, Image.Image) and format == 'png':
+        image.save(fp, format='PNG', dpi=(dpi, dpi) if dpi else None,
+            compress_level=png_compress, compress_type=PNG_STRATEGIES[png_strategy])
+    elif isinstance(image, Image.Image) and format == 'tiff' and has_libtiff():
+        image.save(fp, format='TIFF', compression='group4', dpi=(dpi, dpi) if dpi else None)
+    else:
+        write_bands(fp, format, image.size, [image], dpi, png_compress, png_strategy)
+
+def encode_image(image, format='png', **options):
+    """Returns the image data in a bitmap format, see save_image"""
+    output = io.BytesIO()
+    save_image(image, output, format, **options)
+    return output.getvalue()
@@ -4,6 +4,8 @@
 import copy
 import re
 import logging
+import sys
+from collections.abc import MutableMapping
 from .typed_property import StrippedString, RegexString
 log = logging.getLogger(__name__)
 
@@ -12,21 +14,78 @@ VALID_ID_REGEX = re.compile(r'^\w[-\w]{0,63}$')
 # Same rules + also allows empty string
 VALID_LIBRARY_REGEX  = re.compile(r'^(?:\w[-\w]{0,63})?$')
 
+DEFAULT_PIN_SPACING = 2.54 # in mm
+DEFAULT_ROW_SPACING = 6 # in mm, 6 for narrow, 12 for wide
+
+def _make_pins(pins, pin_tuples=None):
+    """Tuple of interned pin names, the equal tuple of pin_tuples if given.
+
+    pin_tuples is a dictionary shared by the chips loaded together (see
+    ChipList), chips with the same pinout then share their pin tuple.
+    """
+    pins = tuple(sys.intern(str(pin)) for pin in pins)
+    if pin_tuples is None:
+        return pins
+    return pin_tuples.setdefault(pins, pins)
+
+class ChipConfig(MutableMapping):
+    """Dictionary view of a chip's configuration.
+
+    pinSpacing and rowSpacing are stored in the chip itself, other
+    values in a separate dictionary, shared with the chip's aliases.
+    """
+    __slots__ = ('_chip',)
+
+    def __init__(self, chip):
+        self._chip = chip
+
+    def __getitem__(self, key):
+        if key == 'pinSpacing':
+            return self._chip._pin_spacing
+        if key == 'rowSpacing':
+            return self._chip._row_spacing
+        if self._chip._extra_config is None:
+            raise KeyError(key)
+        return self._chip._extra_config[key]
+
+    def __setitem__(self, key, value):
+        if key == 'pinSpacing':
+            self._chip._pin_spacing = value
+        elif key == 'rowSpacing':
+            self._chip._row_spacing = value
+        else:
+            if self._chip._extra_config is None:
+                self._chip._extra_config = {}
+            self._chip._extra_config[key] = value
+
+    def __delitem__(self, key):
+        if key in ('pinSpacing', 'rowSpacing') or self._chip._extra_config is None:
+            raise KeyError(key)
+        del self._chip._extra_config[key]
+
+    def __iter__(self):
+        yield 'pinSpacing'
+        yield 'rowSpacing'
+        if self._chip._extra_config:
+            yield from self._chip._extra_config
+
+    def __len__(self):
+        return 2 + len(self._chip._extra_config or ())
+
+    def __repr__(self):
+        return repr(dict(self))
+
 class Chip:
-    _id = None
-    _pins = {}
+    __slots__ = ('_id', '_name', '_library', '_description', '_pins',
+        '_pin_spacing', '_row_spacing', '_extra_config', '_config')
 
     name = StrippedString('name')
     #library = StrippedString('library')#, VALID_NAME)
     library = RegexString('library', VALID_LIBRARY_REGEX)
     description = StrippedString('description')
 
-    config = {
-        "pinSpacing": 2.54,
-        "rowSpacing": 6, # in mm, 6 for narrow, 12 for wide
-    }
-
-    def __init__(self, id, pinCount, library='', **kwargs):
+    def __init__(self, id, pinCount, library='',
+            pinSpacing=DEFAULT_PIN_SPACING, rowSpacing=DEFAULT_ROW_SPACING, **kwargs):
         log.debug('Chip.__init__("%s", %d, library="%s")',
             id, pinCount, library)
 
@@ -38,10 +97,28 @@ class Chip:
         self.description = ''
         self.library = library
 
-        self._pins = ["NC"] * pinCount
-
-        if kwargs:
-            self.config = {**self.config, **kwargs}
+        self._pins = _make_pins(["NC"] * pinCount)
+
+        self._pin_spacing = pinSpacing
+        self._row_spacing = rowSpacing
+        self._extra_config = kwargs if kwargs else None
+        self._config = None
+
+    @classmethod
+    def from_compiled(cls, id, library, name, description, pins,
+            pinSpacing=DEFAULT_PIN_SPACING, rowSpacing=DEFAULT_ROW_SPACING, *, pin_tuples=None, **kwargs):
+        # Trusted data (e.g. from a compiled library cache), skip validation
+        new_chip = cls.__new__(cls)
+        new_chip._id = id
+        new_chip._library = library
+        new_chip._name = name
+        new_chip._description = description
+        new_chip._pins = _make_pins(pins, pin_tuples)
+        new_chip._pin_spacing = pinSpacing
+        new_chip._row_spacing = rowSpacing
+        new_chip._extra_config = kwargs if kwargs else None
+        new_chip._config = None
+        return new_chip
 
     def __str__(self):
         return f'{self.id}({len(self._pins)})'
@@ -65,7 +142,23 @@ class Chip:
             raise IndexError(f'Pin number out of range: {index}')
         if not isinstance(value, (float, int, str)):
             raise ValueError(f'Invalid pin value for pin: {index}')
-        self._pins[index-1] = str(value)
+        pins = list(self._pins)
+        pins[index-1] = value
+        self._pins = _make_pins(pins)
+
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = ChipConfig(self)
+        return self._config
+
+    @property
+    def pin_spacing(self):
+        return self._pin_spacing
+
+    @property
+    def row_spacing(self):
+        return self._row_spacing
 
     @property
     def display_name(self):
@@ -94,6 +187,7 @@ class Chip:
         # aliases are shallow copies
         alias = copy.copy(self)
         alias._id = id
+        alias._config = None
         return alias
 
     def set_pins(self, pins):
@@ -103,7 +197,7 @@ class Chip:
         if any([not isinstance(pin, (float, int, str)) for pin in pins]):
             raise ValueError('Invalid pin(s) in pin list')
         log.debug('Chip[%s].set_pins(%s)', self.id, pins)
-        self._pins = [str(pin) for pin in pins]
+        self._pins = _make_pins(pins)
 
     @staticmethod
     def _validate_pin_count(pinCount):
@@ -6,21 +6,17 @@ import math
 import operator
 import os
 from PIL import Image
+from .args import DEFAULT_PAGE_ENGINE, DEFAULT_PAGE_MEMORY
 from .chip_printer import ChipPrinter
+from .page_file import open_page_file
+from .bilevel import write_bands
+from .profiler import phase
+from . import packing
 
 log = logging.getLogger(__name__)
 
-class ChipGridPrinter(ChipPrinter):
-    _page_pos = (0, 0)
-    _curr_page_image = None
-    _curr_page = 0
-    _row_height = 0
-
-    def __init__(self, **kwargs):
-        log.debug('ChipGridPrinter()')
-        ChipPrinter.__init__(self, **kwargs)
-        self.reset()
-
+class PageLayout:
+    """Page settings and label placement, for printers based on ChipPrinter"""
     @property
     def page_padding(self):
         return self.config.get('page_padding', 0.1)
@@ -39,6 +35,100 @@ class ChipGridPrinter(ChipPrinter):
         page_size = self.page_size
         return (self._inch_to_pixels(page_size[0]), self._inch_to_pixels(page_size[1]))
 
+    @property
+    def page_packing(self):
+        return self.config.get('page_packing', 'shelf')
+
+    @property
+    def page_rotate(self):
+        return self.config.get('page_rotate', False)
+
+    @property
+    def page_memory(self):
+        """Memory for a page image in MB, larger pages are rendered in bands. None for no limit"""
+        return self.config.get('page_memory', DEFAULT_PAGE_MEMORY)
+
+    @property
+    def page_engine(self):
+        return self.config.get('page_engine', DEFAULT_PAGE_ENGINE)
+
+    def get_label_size(self, chip):
+        # Size of the label image, which is rotated
+        width, height = self.get_chip_size(chip)
+        return (height, width)
+
+    def get_layout(self, chip_list):
+        """Compute the placement of chips on pages, without rendering them.
+
+        Returns a list of pages, each one a list of packing.Placement
+        (index in chip_list, position and rotation of the label)
+        """
+        with phase('layout'):
+            sizes = [self.get_label_size(chip) for chip in chip_list]
+            if self.page_packing == 'shelf':
+                return self._get_shelf_layout(chip_list, sizes)
+            return packing.pack(sizes, self.page_size_pixels,
+                padding=self.page_padding_pixels,
+                method=self.page_packing,
+                rotate=self.page_rotate and self.page_packing != 'shelf')
+
+    def _get_shelf_layout(self, chip_list, sizes):
+        """Same placement as ChipGridPrinter.print_to_page: the largest chips
+        first, rows filled left to right"""
+        order = sorted(range(len(chip_list)), key=lambda index: self.get_chip_size(chip_list[index]),
+            reverse=True)
+        page_width, page_height = self.page_size_pixels
+        padding = self.page_padding_pixels
+        pages = [[]]
+        x, y, row_height = 0, 0, 0
+        for index in order:
+            width, height = sizes[index]
+            row_height = max(row_height, height)
+            if x + width > page_width:
+                x, y = 0, y + row_height + padding
+                row_height = height
+            if y + height > page_height:
+                pages.append([])
+                x, y, row_height = 0, 0, 0
+            pages[-1].append(packing.Placement(index, x, y, width, height, False))
+            x += width + padding
+        return pages if pages[-1] else pages[:-1]
+
+    def _get_output_dir(self):
+        output_dir = str(self.config.get('output', '.'))
+        if output_dir[-1] not in ('/', '\\'):
+            output_dir = output_dir + '/'
+        
+        if not os.path.isdir(output_dir):
+            raise ValueError(f'Invalid output directory: {output_dir}')
+        return output_dir
+
+    def _get_page_file_path(self):
+        """Path of the single multi-page output file, None for a file per page"""
+        page_file = self.config.get('page_file')
+        if not page_file:
+            return None
+        return os.path.join(self._get_output_dir(), page_file)
+
+class ChipGridPrinter(PageLayout, ChipPrinter):
+    _page_pos = (0, 0)
+    _curr_page_image = None
+    _curr_page = 0
+    _row_height = 0
+    _page_bbox = None
+    _page_file = None
+
+    def __init__(self, **kwargs):
+        log.debug('ChipGridPrinter()')
+        ChipPrinter.__init__(self, **kwargs)
+        if self.page_engine == 'numpy':
+            # numpy is only imported for this engine
+            from .packed_page import is_available
+            if not is_available():
+                log.warning('numpy is not installed, using the pil page engine')
+                self.config = {**self.config, 'page_engine': 'pil'}
+        self.reset()
+
     @property
     def current_page(self):
         return self._curr_page
@@ -57,43 +147,117 @@ class ChipGridPrinter(ChipPrinter):
         self._row_height = 0
         self._curr_page += 1
         log.debug('new_page: %d', self._curr_page)
-        self._curr_page_image = Image.new(mode='1', size=self.page_size_pixels, color=255)
+        # Allocated when the first label is pasted
+        self._curr_page_image = None
+        self._page_bbox = None
+
+    def _new_page_image(self, size):
+        if self.page_engine == 'numpy':
+            from .packed_page import PackedPage
+            return PackedPage(size)
+        return Image.new(mode='1', size=size, color=255)
+
+    def _print_label(self, chip):
+        """Label of chip, in the format of the page engine"""
+        image = self.print_chip(chip)
+        if self.page_engine == 'numpy':
+            # Packed once, copies and bands are pasted without converting again
+            from .packed_page import PackedPage
+            return PackedPage.from_image(image)
+        return image
+
+    def _get_page_image(self):
+        if self._curr_page_image is None:
+            self._curr_page_image = self._new_page_image(self.page_size_pixels)
+        return self._curr_page_image
+
+    @property
+    def page_bbox(self):
+        """Union of the labels pasted on the current page (left, top, right, bottom), None if empty"""
+        return self._page_bbox
+
+    def _paste_label(self, label_image, position):
+        with phase('paste'):
+            self._get_page_image().paste(label_image, box=position)
+
+        # Labels have a border so their rectangle is the bounding box of
+        # their pixels, no need to scan the page to crop it
+        page_width, page_height = self._curr_page_image.size
+        left, top = max(position[0], 0), max(position[1], 0)
+        right = min(position[0] + label_image.size[0], page_width)
+        bottom = min(position[1] + label_image.size[1], page_height)
+        if right <= left or bottom <= top:
+            return
+        if self._page_bbox:
+            left = min(left, self._page_bbox[0])
+            top = min(top, self._page_bbox[1])
+            right = max(right, self._page_bbox[2])
+            bottom = max(bottom, self._page_bbox[3])
+        self._page_bbox = (left, top, right, bottom)
 
     def _crop_image(self):
         if self.config.get('page_nocrop', False):
             return
-        inverted = Image.eval(self._curr_page_image, (lambda x: 1-x))
-        self._curr_page_image = self._curr_page_image.crop(inverted.getbbox())        
-
-    def _get_output_dir(self):
-        output_dir = str(self.config.get('output', '.'))
-        if output_dir[-1] not in ('/', '\\'):
-            output_dir = output_dir + '/'
-        
-        if not os.path.isdir(output_dir):
-            raise ValueError(f'Invalid output directory: {output_dir}')
-        return output_dir
+        if self._page_bbox:
+            with phase('crop'):
+                self._curr_page_image = self._get_page_image().crop(self._page_bbox)
 
     def save_page(self):
         log.debug('save_page()')
 
+        if self._page_file:
+            self._crop_image()
+            with phase('encode', f'page{self._curr_page}'):
+                self._page_file.add_page(self._get_page_image())
+            log.debug('save page %d to page file', self._curr_page)
+            return
+
         output_dir = self._get_output_dir()
-        image_file_name = f'{output_dir}page{self._curr_page}.png'
+        image_file_name = f'{output_dir}page{self._curr_page}.{self.format}'
         log.debug('save page: %s', image_file_name)
-        dpi = self.dpi
         self._crop_image()
-        self._curr_page_image.save(image_file_name, dpi=(dpi, dpi))    
+        self._save_image(self._get_page_image(), image_file_name)
 
     def print_chips(self, chip_list):
+        """Print chips on pages. Chips can be repeated to get more than one label,
+        each distinct chip is rendered once.
+
+        With the page_file setting, pages are streamed to a single pdf or
+        tiff file instead of a png file per page. Returns the page count"""
+        page_file_path = self._get_page_file_path()
+        if not page_file_path:
+            self._print_chips(chip_list)
+            return self._curr_page
+
+        with open_page_file(page_file_path, self.dpi) as self._page_file:
+            try:
+                self._print_chips(chip_list)
+            finally:
+                self._page_file = None
+        log.info('Output saved to %s', page_file_path)
+        return self._curr_page
+
+    def _print_chips(self, chip_list):
+        chip_list = list(chip_list)
+        if self._needs_bands():
+            self._print_banded_chips(chip_list)
+            return
+
+        labels = _LabelCopies(self, chip_list)
+        if self.page_packing != 'shelf':
+            self._print_packed_chips(chip_list, labels)
+            return
+
         sizedChips = [(chip, self.get_chip_size(chip)) for chip in chip_list]
         sizedChips.sort(key=operator.itemgetter(1), reverse=True)
     
         for chip, chip_size in sizedChips:
-            self.print_to_page(chip)
+            self.print_to_page(chip, labels.get(chip))
         self.save_page()
 
-    def print_to_page(self, chip):
-        chip_image = self.print_chip(chip)
+    def print_to_page(self, chip, chip_image=None):
+        if chip_image is None:
+            chip_image = self._print_label(chip)
         chip_size = chip_image.size
 
         self._row_height = max(self._row_height, chip_size[1])
@@ -110,6 +274,170 @@ class ChipGridPrinter(ChipPrinter):
             self.save_page()
             self.new_page()
 
-        self._curr_page_image.paste(chip_image, box=self._page_pos)
+        self._paste_label(chip_image, self._page_pos)
 
         self._page_pos = (self._page_pos[0] + chip_size[0] + self.page_padding_pixels, self._page_pos[1])
+
+    def _print_packed_chips(self, chip_list, labels):
+        layout = self.get_layout(chip_list)
+        log.debug('layout: %d chips on %d pages', len(chip_list), len(layout))
+
+        # Packing assumes an empty page
+        if self._page_pos != (0, 0):
+            self.save_page()
+            self.new_page()
+
+        for page_index, placements in enumerate(layout):
+            if page_index:
+                self.new_page()
+            for placement in placements:
+                chip_image = labels.get(chip_list[placement.index])
+                if placement.rotated:
+                    with phase('rotate'):
+                        chip_image = chip_image.rotate(90, expand=True)
+                self._paste_label(chip_image, (placement.x, placement.y))
+            self.save_page()
+
+    def _get_row_bytes(self, width):
+        # Mode '1' images use a byte per pixel, packed pages a bit
+        if self.page_engine == 'numpy':
+            return (width + 7) // 8
+        return width
+
+    def _needs_bands(self):
+        if not self.page_memory:
+            return False
+        width, height = self.page_size_pixels
+        return self._get_row_bytes(width) * height > self.page_memory * 1024 * 1024
+
+    def _get_band_height(self, width):
+        return max(1, int(self.page_memory * 1024 * 1024) // max(self._get_row_bytes(width), 1))
+
+    def _get_layout_bbox(self, placements):
+        """Page area to render: the union of the labels, or the full page with page_nocrop"""
+        page_width, page_height = self.page_size_pixels
+        if self.config.get('page_nocrop', False) or not placements:
+            return (0, 0, page_width, page_height)
+        return (max(min(placement.x for placement in placements), 0),
+            max(min(placement.y for placement in placements), 0),
+            min(max(placement.x + placement.width for placement in placements), page_width),
+            min(max(placement.y + placement.height for placement in placements), page_height))
+
+    def _page_bands(self, chip_list, placements, bbox):
+        """Yields the page in horizontal bands of at most page_memory MB.
+
+        The same image is reused for the next band, it must be consumed
+        before the next one is requested"""
+        left, top, right, bottom = bbox
+        band_height = self._get_band_height(right - left)
+        labels = _BandLabels(self, chip_list, placements)
+        band = None
+        for band_top in range(top, bottom, band_height):
+            band_bottom = min(band_top + band_height, bottom)
+            band_size = (right - left, band_bottom - band_top)
+            if band is None or band.size != band_size:
+                band = None
+                band = self._new_page_image(band_size)
+            else:
+                band.paste(255, box=(0, 0) + band_size)
+            for placement in placements:
+                if placement.y < band_bottom and placement.y + placement.height > band_top:
+                    label_image = labels.get(placement)
+                    with phase('paste'):
+                        band.paste(label_image, box=(placement.x - left, placement.y - band_top))
+            labels.release(band_bottom)
+            yield band
+
+    def _print_banded_chips(self, chip_list):
+        """Pages too large for memory: the layout is computed first, then each
+        page is rendered and encoded one band at a time"""
+        layout = self.get_layout(chip_list)
+        log.debug('banded layout: %d chips on %d pages', len(chip_list), len(layout))
+        # The layout assumes an empty page
+        if self._page_pos != (0, 0) or self._page_bbox:
+            self.save_page()
+            self.new_page()
+        if self._page_file and not hasattr(self._page_file, 'add_page_bands'):
+            log.warning('Pages are larger than %s MB but this page file format '
+                'is not written in bands, rendering full pages', self.page_memory)
+
+        output_dir = self._get_output_dir()
+        for page_index, placements in enumerate(layout):
+            if page_index:
+                self.new_page()
+            bbox = self._get_layout_bbox(placements)
+            size = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+            bands = self._page_bands(chip_list, placements, bbox)
+            # Bands are rendered as they are encoded, encode includes
+            # their render, paste and rotate phases
+            with phase('encode', f'page{self._curr_page}'):
+                if self._page_file and hasattr(self._page_file, 'add_page_bands'):
+                    self._page_file.add_page_bands(size, bands)
+                elif self._page_file:
+                    page_image = self._new_page_image(size)
+                    y = 0
+                    for band in bands:
+                        page_image.paste(band, box=(0, y))
+                        y += band.size[1]
+                    self._page_file.add_page(page_image)
+                else:
+                    image_file_name = f'{output_dir}page{self._curr_page}.{self.format}'
+                    with open(image_file_name, 'wb') as image_file:
+                        write_bands(image_file, self.format, size, bands, **self._get_save_args())
+                    log.info('Output saved to %s', image_file_name)
+
+class _BandLabels:
+    """Rendered labels of a page rendered in bands.
+
+    A label is kept until the last band it appears in.
+    """
+    def __init__(self, printer, chip_list, placements):
+        self._printer = printer
+        self._chip_list = chip_list
+        self._bottom = {}
+        for placement in placements:
+            key = self._get_key(placement)
+            self._bottom[key] = max(self._bottom.get(key, 0), placement.y + placement.height)
+        self._images = {}
+
+    def _get_key(self, placement):
+        return (self._chip_list[placement.index].scoped_id, placement.rotated)
+
+    def get(self, placement):
+        key = self._get_key(placement)
+        image = self._images.get(key)
+        if image is None:
+            image = self._printer._print_label(self._chip_list[placement.index])
+            if placement.rotated:
+                with phase('rotate'):
+                    image = image.rotate(90, expand=True)
+            self._images[key] = image
+        return image
+
+    def release(self, band_bottom):
+        for key in [key for key in self._images if self._bottom[key] <= band_bottom]:
+            del self._images[key]
+
+class _LabelCopies:
+    """Rendered labels of the chips printed more than once.
+
+    A label is kept until all its copies are placed on pages.
+    """
+    def __init__(self, printer, chip_list):
+        self._printer = printer
+        self._remaining = {}
+        for chip in chip_list:
+            self._remaining[chip.scoped_id] = self._remaining.get(chip.scoped_id, 0) + 1
+        self._images = {}
+
+    def get(self, chip):
+        key = chip.scoped_id
+        image = self._images.get(key)
+        if image is None:
+            image = self._printer._print_label(chip)
+        self._remaining[key] -= 1
+        if self._remaining[key]:
+            self._images[key] = image
+        else:
+            self._images.pop(key, None)
+        return image
@@ -2,57 +2,282 @@
 
 import logging
 import os
+import re
 import sys
-from PIL import Image
-from .args import parse_args
-from .chip import Chip
-from .chip_list import ChipList
-from .chip_printer import ChipPrinter
-from .chip_grid_printer import ChipGridPrinter
+from .args import VECTOR_FORMATS, parse_args
 from ._version import print_version_info
 
+# Pillow, yaml and the printers are imported only when needed so --version,
+# --list and --text start quickly
+
 log = logging.getLogger()
 
-def _to_chip_list(chip_list, chip_ids):
+SEARCH_LIMIT = 20
+QUANTITY_REGEX = re.compile(r'^[x*]?(\d+)$', re.IGNORECASE)
+BARE_QUANTITY_REGEX = re.compile(r'^[x*](\d+)$', re.IGNORECASE) # '-c 74LS173 x8'
+QUANTITY_HEADERS = ('qty', 'quantity') # csv header line
+
+def _read_chip_specs(specs):
+    # - reads the chip list from stdin
+    for spec in specs:
+        if spec == '-':
+            yield from sys.stdin.read().splitlines()
+        else:
+            yield spec
+
+def _parse_chip_specs(specs):
+    """Parse chip ids with optional quantities: 'id', 'id x8', 'id 8' or csv 'id,8[,...]'
+
+    A bare 'x8' is the quantity of the id just before it, the shell
+    splits 'id x8' in two arguments if it isn't quoted.
+
+    Returns a list of (chip id, quantity) in order of first appearance,
+    quantities of repeated ids are added up.
+    """
+    quantities = {}
+    previous_id = None # last id without a quantity
+    for spec in _read_chip_specs(specs):
+        spec = spec.strip()
+        if not spec or spec.startswith('#'):
+            continue
+        fields = [field.strip() for field in spec.split(',')] if ',' in spec else spec.split()
+        chip_id = fields[0]
+        match = BARE_QUANTITY_REGEX.match(spec)
+        if match:
+            if previous_id is None:
+                log.warning("Quantity [%s] without a chip id, skipping. Use 'id x8' or 'id,8'", spec)
+                continue
+            # Replaces the quantity of 1 of the previous id
+            quantity = int(match.group(1))
+            quantities[previous_id] += quantity - 1
+            if not quantity:
+                log.warning('Invalid quantity for chip %s: [%s], skipping', previous_id, spec)
+                if not quantities[previous_id]:
+                    del quantities[previous_id]
+            previous_id = None
+            continue
+        previous_id = chip_id if len(fields) == 1 else None
+        quantity = 1
+        if len(fields) > 1 and fields[1]:
+            if fields[1].lower() in QUANTITY_HEADERS:
+                continue
+            match = QUANTITY_REGEX.match(fields[1])
+            if not match or not int(match.group(1)):
+                log.warning('Invalid quantity for chip %s: [%s], skipping', chip_id, fields[1])
+                continue
+            quantity = int(match.group(1))
+        quantities[chip_id] = quantities.get(chip_id, 0) + quantity
+    return list(quantities.items())
+
+def _to_chip_list(chip_list, chip_quantities):
+    # Copies of a chip are the same object, next to each other
     chips = []
-    for chip_id in chip_ids:
+    for chip_id, quantity in chip_quantities:
         chip = chip_list[chip_id]
         if not chip:
-            log.warning('Chip not found: %s, skipping', chip_id)
+            suggestions = chip_list.suggest(chip_id)
+            if suggestions:
+                log.warning('Chip not found: %s, skipping. Did you mean: %s?', chip_id, ', '.join(suggestions))
+            else:
+                log.warning('Chip not found: %s, skipping', chip_id)
         else:
-            chips.append(chip)
+            chips.extend([chip] * quantity)
     return chips
 
+def print_search_results(chip_list, args):
+    results = chip_list.search(' '.join(args.search), limit=SEARCH_LIMIT)
+    if not results:
+        log.warning('No chip found for [%s]', ' '.join(args.search))
+    for result in results:
+        chip = result.chip
+        print(f'{chip.scoped_id:<24} {chip.description}'.rstrip())
+
 def print_chips_text(chip_list, args):
-    log.info('Printing %s chips to text', len(chip_list))
-    for chip in chip_list:
+    # Quantities are for labels, each chip is printed once
+    unique_chips = {chip.scoped_id: chip for chip in chip_list}
+    log.info('Printing %s chips to text', len(unique_chips))
+    for chip in unique_chips.values():
         print()
         chip.print_ASCII()
 
+def _log_cache_stats(render_cache):
+    from .text_cache import get_text_cache_stats
+    log.info('Render cache: %s', render_cache)
+    text_stats = get_text_cache_stats()
+    log.info('Text cache: %d hits, %d misses', text_stats['hits'], text_stats['misses'])
+
+def _incremental_tasks(tasks, chip_printer, manifest, args):
+    """(chip, output file) tasks whose output is missing or out of date,
+    they are added to the manifest. With -a, the outputs of the chips
+    that no longer exist are deleted"""
+    # Chips with the same unscoped id write the same file, the last one wins
+    tasks = {os.path.basename(output_file): (chip, output_file) for chip, output_file in tasks}
+    changed = []
+    for filename, (chip, output_file) in tasks.items():
+        key = chip_printer.get_output_key(chip)
+        if not manifest.is_fresh(filename, key):
+            manifest.add(filename, key, chip.scoped_id)
+            changed.append((chip, output_file))
+    deleted = manifest.remove_stale(tasks) if args.all else []
+    log.info('Incremental: %d labels up to date, %d to render, %d deleted',
+        len(tasks) - len(changed), len(changed), len(deleted))
+    return changed
+
+def _get_manifest(args, output_dir):
+    if not args.incremental:
+        return None
+    if args.page:
+        log.warning('--incremental is ignored in page mode')
+        return None
+    from .manifest import OutputManifest
+    return OutputManifest(output_dir)
+
+def print_chips_vector(chip_list, args, output_dir):
+    from .vector_printer import VectorChipPrinter, VectorGridPrinter
+    config = vars(args)
+    if not args.page:
+        chip_printer = VectorChipPrinter(**config)
+        unique_chips = {chip.scoped_id: chip for chip in chip_list}
+        tasks = [(chip, f"{output_dir}{chip.unscoped_id}.{args.format}") for chip in unique_chips.values()]
+        manifest = _get_manifest(args, output_dir)
+        if manifest is not None:
+            tasks = _incremental_tasks(tasks, chip_printer, manifest, args)
+        try:
+            for chip, output_file in tasks:
+                log.info('Generating label for chip [%s]', chip.id)
+                chip_printer.print_chip_to_file(chip, output_file)
+        finally:
+            if manifest is not None:
+                manifest.save()
+    else:
+        _get_manifest(args, output_dir)
+        VectorGridPrinter(**config).print_chips(chip_list)
+
 def print_chips_image(chip_list, args):
+    from .chip_printer import ChipPrinter
+    from .chip_grid_printer import ChipGridPrinter
+    from .image_writer import ImageWriter
+    from .parallel import get_job_count, print_chips_to_files
+    from .render_cache import RenderCache
+
     if not os.path.isdir(args.output):
         log.error('Output directory not found [%s]', args.output)
         return
 
-    log.info('Printing %s chips to .png', len(chip_list))
+    log.info('Printing %s chips to .%s', len(chip_list), args.format)
     output_dir = args.output
     if output_dir[-1] not in ('/', '\\'):
         output_dir = output_dir + '/'
 
+    if args.page and args.page_file and args.format in VECTOR_FORMATS and (
+            args.format != 'pdf' or not args.page_file.lower().endswith('.pdf')):
+        log.error('Vector pages can only be written to a .pdf page file [%s]', args.page_file)
+        return
+
+    if args.format in VECTOR_FORMATS:
+        # Rendered without rasterizing, no render cache or jobs needed
+        print_chips_vector(chip_list, args, output_dir)
+        return
+
     config = vars(args)
     log.debug('config: %s', config)
 
-    if not args.page:
-        chip_printer = ChipPrinter(**config)
-        for chip in chip_list:
-            log.info('Generating label for chip [%s]', chip.id)
+    cache_dir = os.path.join(args.cache, 'render') if args.cache else None
+    render_cache = RenderCache(cache_dir=cache_dir)
+    image_writer = ImageWriter(args.writers) if args.writers else None
+    manifest = _get_manifest(args, output_dir)
+    try:
+        if not args.page:
+            chip_printer = ChipPrinter(render_cache=render_cache, image_writer=image_writer, **config)
             #TODO: Prefix lib name flag
-            output_file = f"{output_dir}{chip.unscoped_id}.png"
-            chip_printer.print_chip_to_file(chip, output_file)
+            # One file per chip, whatever the quantity
+            unique_chips = {chip.scoped_id: chip for chip in chip_list}
+            tasks = [(chip, f"{output_dir}{chip.unscoped_id}.{args.format}") for chip in unique_chips.values()]
+            if manifest is not None:
+                tasks = _incremental_tasks(tasks, chip_printer, manifest, args)
+            jobs = get_job_count(args.jobs, len(tasks))
+            if jobs > 1:
+                if args.profile:
+                    log.warning('Labels rendered by worker processes are not profiled, use -j 1')
+                errors = print_chips_to_files(tasks, config, jobs, cache_dir)
+                if errors:
+                    log.error('%d of %d labels could not be generated', errors, len(tasks))
+            else:
+                for chip, output_file in tasks:
+                    log.info('Generating label for chip [%s]', chip.id)
+                    chip_printer.print_chip_to_file(chip, output_file)
+                _log_cache_stats(render_cache)
+        else:
+            #TODO: Output directory/file pattern
+            gridPrinter = ChipGridPrinter(render_cache=render_cache, image_writer=image_writer, **config)
+            gridPrinter.print_chips(chip_list)
+            _log_cache_stats(render_cache)
+    finally:
+        # Write errors are reported once everything is done
+        if image_writer:
+            for output_file, err in image_writer.close():
+                log.error('Unable to write [%s]: %s', output_file, err)
+        # Once everything is written, failed writes are not recorded
+        if manifest is not None:
+            manifest.save()
+
+def run(args):
+    chip_quantities = _parse_chip_specs(args.chip) if args.chip else None
+
+    from .chip_list import ChipList
+    chip_list = ChipList(cache_dir=os.path.join(args.cache, 'library') if args.cache else None)
+    chip_count = 0
+    names = None
+    try:
+        if args.list:
+            names = chip_list.load_names(args.input)
+            chip_count = len(names)
+        else:
+            # With -c, only the files containing the requested chips are loaded
+            chip_ids = [chip_id for chip_id, _ in chip_quantities] if args.chip else None
+            chip_count = chip_list.load(args.input, chip_ids=chip_ids)
+    except IOError as ex:
+        log.error('Error loading chip list [%s]: %s', args.input, ex)
+    if not chip_count:
+        log.error('No chip loaded')
+        return
+
+    print_chips = print_chips_text if args.text else print_chips_image
+
+    if args.serve:
+        from .server import serve
+        serve(chip_list, args)
+    elif args.list:
+        for chip in sorted(names, key=str.casefold):
+            print(chip)
+    elif args.search:
+        print_search_results(chip_list, args)
+    elif args.all:
+        print_chips(chip_list, args)
+    else:        
+        chips = _to_chip_list(chip_list, chip_quantities)
+        if chips and len(chips):
+            requested = sum(quantity for _, quantity in chip_quantities)
+            out_of = f'(out of {requested})' if len(chips) != requested else ''
+            log.info('Found %d chips %s', len(chips), out_of)
+            print_chips(chips, args)
+        else: 
+            log.warning('Nothing to do')
+
+    if args.watch and (args.all or args.chip):
+        watch_chips(chip_list, args, chip_quantities)
+
+def watch_chips(chip_list, args, chip_quantities):
+    """Print the chips again when their library files change, until interrupted"""
+    if args.text:
+        log.warning('--watch is ignored with text output')
+        return
+    from .watch import Watcher
+    if args.all:
+        get_chips = lambda: list(chip_list)
     else:
-        #TODO: Output directory/file pattern
-        gridPrinter = ChipGridPrinter(**config)
-        gridPrinter.print_chips(chip_list)
+        get_chips = lambda: _to_chip_list(chip_list, chip_quantities)
+    Watcher(chip_list, args, get_chips).run(args.watch)
 
 class LogFormatter(logging.Formatter):
     def format(self, record):
@@ -77,30 +302,13 @@ def main(argv):
     log.addHandler(handler)
 
     try:
-        chip_list = ChipList()
-        try:
-            chip_list.load(args.input)
-        except IOError as ex:
-            log.error('Error loading chip list [%s]: %s', args.input, ex)
-        if not len(chip_list):
-            log.error('No chip loaded')
-            return
-
-        print_chips = print_chips_text if args.text else print_chips_image
-
-        if args.list:
-            for chip in sorted(chip_list.names, key=str.casefold):
-                print(chip)
-        elif args.all:
-            print_chips(chip_list, args)
-        else:        
-            chips = _to_chip_list(chip_list, args.chip)
-            if chips and len(chips):
-                out_of = f'(out of {len(args.chip)})' if len(chips) != len(args.chip) else ''
-                log.info('Found %d chips %s', len(chips), out_of)
-                print_chips(chips, args)
-            else: 
-                log.warning('Nothing to do')
+        args.profile = bool(args.profile or args.profile_stats or args.profile_trace)
+        if args.profile:
+            from .profiler import profile
+            with profile(trace_file=args.profile_trace, stats_file=args.profile_stats):
+                run(args)
+        else:
+            run(args)
     finally:
         # Reset log in case we're not running as a standalong app
         log.removeHandler(handler)
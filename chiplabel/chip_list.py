@@ -1,20 +1,79 @@
 #!/usr/bin/env python3
 # chip_list.py
 #
+import hashlib
 import logging
 import os
+import pickle
+from collections import namedtuple
 from pathlib import Path
 import yaml
 from . import chip
+from ._version import __version__
+from .family import get_family
+from .profiler import phase
 
 log = logging.getLogger(__name__)
 
+CACHE_VERSION = f'{__version__}-1'
+CACHE_BLOCK_SIZE = 1024*1024
+STREAM_THRESHOLD = 8*1024*1024 # Files larger than this are parsed incrementally
+
+# Scoped ids of the chips added, changed and removed by ChipList.reload_file
+LibraryChanges = namedtuple('LibraryChanges', 'added changed removed')
+
+# Use the libyaml bindings when available
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+def _stream_yaml_mapping(stream):
+    """Iterate over the (key, value) pairs of a top-level yaml mapping.
+
+    Each entry is composed and constructed on its own so the whole
+    document never has to be in memory. Anchors stay available to the
+    entries that follow. The libyaml parser doesn't expose node-level
+    composition so this uses the pure python loader.
+    """
+    loader = yaml.SafeLoader(stream)
+    try:
+        loader.get_event() # StreamStart
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event() # DocumentStart
+        if not loader.check_event(yaml.MappingStartEvent):
+            # Not a mapping: let the regular loader deal with it
+            node = loader.compose_node(None, None)
+            data = loader.construct_document(node)
+            if data != None:
+                yield from data.items()
+            return
+        loader.get_event() # MappingStart
+        while not loader.check_event(yaml.MappingEndEvent):
+            key_node = loader.compose_node(None, None)
+            value_node = loader.compose_node(None, None)
+            key = loader.construct_object(key_node, deep=True)
+            value = loader.construct_object(value_node, deep=True)
+            # Release constructed objects, anchored nodes are kept by the composer
+            loader.constructed_objects = {}
+            yield key, value
+    finally:
+        loader.dispose()
+
 class ChipList:
     _chip_list = {}
     _global_name_dict = {}
+    _family_dict = {}
+    _cache_dir = None
+    _stream_threshold = STREAM_THRESHOLD
+    _unloaded_ids = {}
+    _search_index = None
 
-    def __init__(self):
-        log.debug('ChipList.__init__()')
+    def __init__(self, cache_dir=None, stream_threshold=STREAM_THRESHOLD):
+        log.debug('ChipList.__init__(%s, %s)', cache_dir, stream_threshold)
+        self._cache_dir = cache_dir
+        self._stream_threshold = stream_threshold
         self.clear()
 
     def find_chip(self, chip_id):
@@ -23,112 +82,504 @@ class ChipList:
             raise ValueError('Expected string')
         if '/' in chip_id: # scoped chip id
             return self._chip_list.get(chip_id)
-        return self._global_name_dict.get(chip_id)
+        found = self._global_name_dict.get(chip_id)
+        if found is None:
+            found = self._find_alias(chip_id)
+        return found
+
+    def _find_alias(self, alias_id):
+        with phase('alias', alias_id):
+            for family, family_chips in self._family_dict.items():
+                for base_id in get_family(family).get_base_ids(alias_id):
+                    base_chip = family_chips.get(base_id)
+                    if base_chip:
+                        log.debug('Found %s alias [%s] for chip [%s]', family, alias_id, base_chip.id)
+                        return base_chip.create_alias(alias_id)
+            return None
 
     def clear(self):
         self._chip_list = {}
         self._global_name_dict = {}
+        self._family_dict = {}
+        self._unloaded_ids = {}
+        self._search_index = None
+
+    def _get_search_index(self):
+        if self._search_index is None:
+            from .chip_search import SearchIndex
+            families = {chip.scoped_id: family for family, family_chips in self._family_dict.items()
+                for chip in family_chips.values()}
+            index = SearchIndex()
+            for scoped_id, chip in self._chip_list.items():
+                index.add(scoped_id, chip, families.get(scoped_id))
+            # Chips of the files skipped by the index can only be suggested
+            for scoped_id, family in self._unloaded_ids.items():
+                if scoped_id not in self._chip_list:
+                    index.add(scoped_id, None, family)
+            log.debug('Search index: %d chips', len(index))
+            self._search_index = index
+        return self._search_index
+
+    def search(self, query, limit=20):
+        """Chips matching all the words of query in their id, name,
+        description or pin names, best first. Returns a list of
+        SearchResult (chip, score).
+
+        Words match a prefix of the chip data or, if nothing starts with
+        them, similar words (typos). Family aliases are returned as alias
+        chips, e.g. 74HC59 finds 74HC595.
+        """
+        from .chip_search import SearchResult
+        index = self._get_search_index()
+        results = []
+        for doc, score, alias_id in index.search(query, limit=limit):
+            chip = index.get_chip(doc)
+            if chip is None:
+                continue
+            if alias_id:
+                chip = chip.create_alias(alias_id)
+            results.append(SearchResult(chip, round(score, 3)))
+        return results
+
+    def suggest(self, chip_id, count=3):
+        """Chip ids close to chip_id, for did you mean messages"""
+        return self._get_search_index().suggest(chip_id, count)
 
-    def load(self, path):
-        log.debug('load_chip_list(%s)', path)
+    @staticmethod
+    def _get_library_files(path):
         if os.path.isfile(path):
-            self._load_single_file(path)
+            return [path]
         elif os.path.isdir(path):
-            for file in os.listdir(path):
-                if file.endswith(".yaml"):
-                    fullpath = os.path.normpath(os.path.join(path, file))
-                    self._load_single_file(fullpath)
+            return [os.path.normpath(os.path.join(path, file))
+                for file in os.listdir(path) if file.endswith(".yaml")]
         else:
             raise IOError('Input must be a file or directory')
 
+    def load(self, path, chip_ids=None):
+        """Load the chip library file or directory at path.
+
+        With a cache dir, an index of the chip ids in each file is kept.
+        If chip_ids is given, files that the index says don't contain
+        any of them (directly or as a family alias) are not loaded.
+        Returns the number of chips in path, loaded or not.
+        """
+        log.debug('load_chip_list(%s, %s)', path, chip_ids)
+        files = self._get_library_files(path)
+        if not self._cache_dir:
+            return sum(len(self._load_single_file(filename) or ()) for filename in files)
+
+        index = self._load_indexed(path, files, chip_ids)
+        return sum(len(entry['ids']) for entry in index.values())
+
+    def _load_indexed(self, path, files, chip_ids):
+        """Load the files not in the index or matching chip_ids, returns the updated index"""
+        index = self._read_index(path)
+        new_index = {}
+        for filename in files:
+            stat = os.stat(filename)
+            entry = index.get(filename)
+            if not self._is_index_fresh(entry, stat):
+                entry = None
+            elif chip_ids is not None and not self._index_matches(entry, chip_ids):
+                log.debug('Skipping %s, no requested chip', filename)
+                new_index[filename] = entry
+                self._add_unloaded_ids(entry)
+                continue
+            records = self._load_single_file(filename)
+            if records is not None:
+                new_index[filename] = self._make_index_entry(filename, stat, records)
+        if new_index != index:
+            self._write_index(path, new_index)
+        return new_index
+
+    def reload_file(self, filename):
+        """Load a library file again after it was modified, or remove its
+        chips if it was deleted. Returns the LibraryChanges of the file"""
+        library_name = Path(filename).stem
+        old_chips = self._get_library_chips(library_name)
+        position = self._get_library_position(old_chips)
+        self._remove_chips(old_chips.values())
+        if os.path.isfile(filename) and self._load_single_file(filename) is None:
+            # Keep the previous version until the file can be parsed (e.g.
+            # while it is being edited)
+            log.warning('Keeping the previous chips of [%s]', filename)
+            self._remove_chips(self._get_library_chips(library_name).values())
+            self._restore_chips(old_chips.values())
+            return LibraryChanges([], [], [])
+        new_chips = self._get_library_chips(library_name)
+        if position is not None:
+            self._move_chips(new_chips, position)
+
+        changes = LibraryChanges(
+            added=sorted(scoped_id for scoped_id in new_chips if scoped_id not in old_chips),
+            changed=sorted(scoped_id for scoped_id, signature in new_chips.items()
+                if scoped_id in old_chips and old_chips[scoped_id][1] != signature[1]),
+            removed=sorted(scoped_id for scoped_id in old_chips if scoped_id not in new_chips))
+        log.debug('reload_file(%s): %s', filename, changes)
+        return changes
+
+    def _get_library_chips(self, library_name):
+        """{scoped id: (chip, signature)} of a library, the signature is all the chip data"""
+        families = {id: family for family, family_chips in self._family_dict.items()
+            for id, family_chip in family_chips.items() if family_chip.library == library_name}
+        return {scoped_id: (chip, (chip.name, chip.description, chip.pin_spacing,
+                chip.row_spacing, tuple(chip), families.get(chip.unscoped_id)))
+            for scoped_id, chip in self._chip_list.items() if chip.library == library_name}
+
+    def _get_library_position(self, library_chips):
+        """Number of other chips before the first chip of a library, None if it has none"""
+        for position, scoped_id in enumerate(self._chip_list):
+            if scoped_id in library_chips:
+                return position
+        return None
+
+    def _move_chips(self, library_chips, position):
+        """Move the chips of a reloaded library back to their place, so chips
+        are listed in the same order as before"""
+        others = [(scoped_id, chip) for scoped_id, chip in self._chip_list.items()
+            if scoped_id not in library_chips]
+        self._chip_list = dict(others[:position])
+        self._chip_list.update((scoped_id, chip) for scoped_id, (chip, _) in library_chips.items())
+        self._chip_list.update(others[position:])
+
+    def _remove_chips(self, chips):
+        removed_ids = set()
+        for old_chip, _ in chips:
+            del self._chip_list[old_chip.scoped_id]
+            id = old_chip.unscoped_id
+            if self._global_name_dict.get(id) is old_chip:
+                del self._global_name_dict[id]
+                removed_ids.add(id)
+            for family_chips in self._family_dict.values():
+                if family_chips.get(id) is old_chip:
+                    del family_chips[id]
+        if removed_ids:
+            # Chips with the same id in other libraries are found again
+            for other_chip in self._chip_list.values():
+                if other_chip.unscoped_id in removed_ids:
+                    self._global_name_dict.setdefault(other_chip.unscoped_id, other_chip)
+        self._search_index = None
+
+    def _restore_chips(self, chips):
+        for old_chip, signature in chips:
+            self._chip_list[old_chip.scoped_id] = old_chip
+            self._global_name_dict[old_chip.unscoped_id] = old_chip
+            family = signature[-1]
+            if family:
+                self._family_dict.setdefault(family, {})[old_chip.unscoped_id] = old_chip
+        self._search_index = None
+
+    def load_names(self, path):
+        """Scoped ids of the chips in path.
+
+        Only the files changed since the index was built are loaded, the
+        others are listed from the index without creating any chip.
+        """
+        if not self._cache_dir:
+            self.load(path)
+            return self.names
+        index = self._load_indexed(path, self._get_library_files(path), chip_ids=[])
+        return [f"{entry['library']}/{id}" for entry in index.values() for id in entry['ids']]
+
     def _add_aliases(self, chip, family):
-        id = chip.unscoped_id
-        if family == '7400':
-            log.debug('Adding 7400-family aliases')
-            if id[:2] != '74':
-                log.error('Chip is missing 74 prefix: [%s], skipping aliases', id)
-            else:
-                FAMILIES = ['L', 'H', 'S', 'LS', 'AS', 'ALS', 'F', # Bipolar
-                            'C', 'HC', 'HCT', 'AC', 'ACT', # CMOS
-                            'ACQ', 'AHC', 'ALVC', 'ALVT', 'AUC', # CMOS overkill
-                            'AUP', 'AVC', 'AXC', 'FC', 'FCT', 'LCX', 
-                            'LV', 'LVC', 'LVT', 'LVQ', 'LVX', 'VHC']
-                names = [f'{id[:2]}{fam}{id[2:]}' for fam in FAMILIES]
-                for name in names:
-                    self._global_name_dict[name] = chip.create_alias(name)
-                log.debug('Added %d aliases: %s', len(names), names)
-        else:
+        rule = get_family(family)
+        if not rule:
             log.warning('Unknown family: [%s] for chip [%s]', family, chip.scoped_id)
+            return
+        id = chip.unscoped_id
+        error = rule.check(id)
+        if error:
+            log.error(error)
+            return
+        # Aliases are resolved on lookup, see find_chip
+        log.debug('Adding %s-family aliases', family)
+        self._family_dict.setdefault(family, {})[id] = chip
 
     @staticmethod
-    def _get_row_spacing(yaml_chip):
+    def _get_row_spacing(yaml_chip, messages):
         spacing = 6
         if 'type' in yaml_chip:
             if yaml_chip['type'] == 'wide':
                 spacing = 12
             else:
-                log.warning('Unknown type attribute: [%s]', yaml_chip['type'])
+                ChipList._log_message(messages, logging.WARNING,
+                    'Unknown type attribute: [%s]', yaml_chip['type'])
         return spacing
 
+    @staticmethod
+    def _log_message(messages, level, msg, *args):
+        # Messages are kept with the compiled library so they can be
+        # replayed when it is loaded from the cache
+        log.log(level, msg, *args)
+        messages.append((level, msg, args))
+
+    @staticmethod
+    def _get_file_signature(filename):
+        stat = os.stat(filename)
+        content_hash = hashlib.sha1()
+        with open(filename, 'rb') as datafile:
+            for block in iter(lambda: datafile.read(CACHE_BLOCK_SIZE), b''):
+                content_hash.update(block)
+        return (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size,
+            content_hash.hexdigest())
+
+    def _get_cache_file(self, signature):
+        path_hash = hashlib.sha1(signature[0].encode('utf8')).hexdigest()
+        return os.path.join(self._cache_dir, f'{path_hash}.pickle')
+
+    @staticmethod
+    def _read_pickle(cache_file):
+        """Returns the dict saved in cache_file, None if there's none.
+        Files that can't be read are removed, they are written again."""
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with open(cache_file, 'rb') as cachefile:
+                data = pickle.load(cachefile)
+            if not isinstance(data, dict):
+                raise TypeError(f'expected a dict, got {type(data).__name__}')
+            return data
+        except Exception as err:
+            # Truncated, foreign or older files can raise almost anything,
+            # the cache is only an optimization
+            log.debug('Unable to read library cache [%s]: %s', cache_file, err)
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+        return None
+
+    def _write_pickle(self, cache_file, data):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        temp_file = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            with open(temp_file, 'wb') as cachefile:
+                pickle.dump(data, cachefile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, cache_file)
+        except IOError as err:
+            log.warning('Unable to write library cache [%s]: %s', cache_file, err)
+
+    def _read_cache(self, signature):
+        cache_file = self._get_cache_file(signature)
+        compiled = self._read_pickle(cache_file)
+        if not compiled:
+            return None
+        if compiled.get('version') != CACHE_VERSION or compiled.get('signature') != signature:
+            log.debug('Stale library cache [%s]', cache_file)
+            return None
+        return compiled
+
+    def _write_cache(self, signature, compiled):
+        self._write_pickle(self._get_cache_file(signature), {
+            'version': CACHE_VERSION,
+            'signature': signature,
+            **compiled
+        })
+
+    def _get_index_file(self, path):
+        path_hash = hashlib.sha1(os.path.abspath(path).encode('utf8')).hexdigest()
+        return os.path.join(self._cache_dir, f'index-{path_hash}.pickle')
+
+    def _read_index(self, path):
+        """Returns {filename: index entry} for the library at path, empty if there's none"""
+        index = self._read_pickle(self._get_index_file(path))
+        if not index or index.get('version') != CACHE_VERSION or \
+                index.get('path') != os.path.abspath(path):
+            return {}
+        return index['files']
+
+    def _write_index(self, path, files):
+        self._write_pickle(self._get_index_file(path), {
+            'version': CACHE_VERSION,
+            'path': os.path.abspath(path),
+            'files': files,
+        })
+
+    @staticmethod
+    def _make_index_entry(filename, stat, records):
+        families = {}
+        for id, family in records:
+            if family:
+                families.setdefault(family, set()).add(id)
+        return {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'library': Path(filename).stem,
+            'ids': tuple(id for id, _ in records),
+            'id_set': frozenset(id for id, _ in records),
+            'families': {family: frozenset(ids) for family, ids in families.items()},
+        }
+
+    def _add_unloaded_ids(self, entry):
+        families = {id: family for family, ids in entry['families'].items() for id in ids}
+        for id in entry['ids']:
+            scoped_id = f"{entry['library']}/{id}" if entry['library'] else id
+            self._unloaded_ids[scoped_id] = families.get(id)
+        self._search_index = None
+
+    @staticmethod
+    def _is_index_fresh(entry, stat):
+        return bool(entry) and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+
+    @staticmethod
+    def _index_matches(entry, chip_ids):
+        """True if the indexed file can provide one of chip_ids"""
+        for chip_id in chip_ids:
+            if '/' in chip_id:
+                library, _, id = chip_id.partition('/')
+                if library == entry['library'] and id in entry['id_set']:
+                    return True
+            elif chip_id in entry['id_set']:
+                return True
+            else:
+                for family, family_ids in entry['families'].items():
+                    rule = get_family(family)
+                    if rule and any(base_id in family_ids for base_id in rule.get_base_ids(chip_id)):
+                        return True
+        return False
+
+    def _read_yaml(self, ymlfile):
+        """Iterate over the (id, chip data) pairs of a chip library file"""
+        if self._stream_threshold is not None and \
+                os.fstat(ymlfile.fileno()).st_size >= self._stream_threshold:
+            log.debug('Streaming yaml file')
+            return _stream_yaml_mapping(ymlfile)
+
+        with phase('yaml', ymlfile.name):
+            yaml_chips = yaml.load(ymlfile, Loader=SafeLoader)
+        return yaml_chips.items() if yaml_chips != None else None
+
+    def _compile_file(self, filename, library_name, compiled):
+        """Parse and validate a chip library file.
+
+        Generates the validated chip records as they are parsed. Messages
+        logged while compiling and the skipped chip count are added to the
+        compiled dict, 'error' is set if the file can't be parsed.
+        """
+        messages = compiled['messages']
+        with open(filename, 'r', encoding='utf8') as ymlfile:
+            try:
+                yaml_chips = self._read_yaml(ymlfile)
+                if yaml_chips == None:
+                    self._log_message(messages, logging.WARNING,
+                        'No chip data in file [%s]', filename)
+                    return
+                for id, yaml_chip in yaml_chips:
+                    record = self._compile_chip(library_name, id, yaml_chip, compiled)
+                    if record:
+                        yield record
+            except yaml.YAMLError as err:
+                log.error('Error parsing chip file [%s]: %s', filename, err)
+                compiled['error'] = True
+
+    def _compile_chip(self, library_name, id, yaml_chip, compiled):
+        log.debug('processing: %s, data: %s', id, yaml_chip)
+        string_id = str(id)
+        scoped_id = f'{library_name}/{string_id}'
+        log.debug('Processing id=%s', scoped_id)
+        if string_id[0] == '_':
+            log.debug('Skipping id=%s', scoped_id)
+            compiled['skipped'] += 1
+            return None
+        try:
+            if not 'pins' in yaml_chip:
+                raise chip.Error('No pins attribute for chip [%s]', scoped_id)
+
+            spacing = self._get_row_spacing(yaml_chip, compiled['messages'])
+            new_chip = chip.Chip(string_id, len(yaml_chip['pins']),
+                library=library_name,
+                rowSpacing=spacing)
+
+            if 'name' in yaml_chip:
+                new_chip.name = str(yaml_chip['name'])
+            if 'description' in yaml_chip:
+                new_chip.description = str(yaml_chip['description'])
+
+            new_chip.set_pins(yaml_chip['pins'])
+            family = str(yaml_chip['family']) if 'family' in yaml_chip else None
+            return (new_chip.unscoped_id, new_chip.name,
+                new_chip.description, spacing, tuple(new_chip), family)
+
+        except chip.Error as err:
+            self._log_message(compiled['messages'], logging.ERROR,
+                'Error adding chip [%s]: %s, skipping', scoped_id, err)
+            compiled['skipped'] += 1
+        return None
+
     def _load_single_file(self, filename):
+        """Returns the (id, family) of the chips loaded, None if the file can't be parsed"""
+        # Large files are streamed, their yaml parsing is part of load
+        with phase('load', filename):
+            return self._load_file(filename)
+
+    def _load_file(self, filename):
         log.debug('load_chip_list_file(%s)', filename)
         library_name = Path(filename).stem
         log.debug('library_name: %s', library_name)
 
+        compiled = None
+        if self._cache_dir:
+            signature = self._get_file_signature(filename)
+            compiled = self._read_cache(signature)
+
+        if compiled:
+            log.debug('Loading compiled library from cache')
+            for level, msg, args in compiled['messages']:
+                log.log(level, msg, *args)
+            records = compiled['chips']
+            write_cache = False
+        else:
+            compiled = {'chips': [], 'messages': [], 'skipped': 0}
+            records = self._compile_file(filename, library_name, compiled)
+            write_cache = bool(self._cache_dir)
+            if write_cache:
+                records = self._collect(records, compiled['chips'])
+
+        new_chips = []
+        # Chips with the same pinout (e.g. a yaml template) share their pins
+        pin_tuples = {}
+        for id, name, description, spacing, pins, family in records:
+            new_chip = chip.Chip.from_compiled(id, library_name, name,
+                description, pins, rowSpacing=spacing, pin_tuples=pin_tuples)
+            new_chips.append((new_chip, family))
+
+        if compiled.get('error'):
+            # Streamed files can fail after some chips were parsed, none
+            # of them are added
+            log.debug('Discarding %d chips of [%s]', len(new_chips), filename)
+            return None
+
         chip_list = {}
-        skipped = 0
-        with open(filename, 'r', encoding='utf8') as ymlfile:
-            yaml_chips = None
-            try:
-                yaml_chips = yaml.safe_load(ymlfile)
-            except yaml.YAMLError as err: 
-                log.error('Error parsing chip file [%s]: %s', filename, err)
-                return
-            if yaml_chips == None:
-                log.warning('No chip data in file [%s]', filename)
-                return
-            for id, yaml_chip in yaml_chips.items():
-                log.debug('processing: %s, data: %s', id, yaml_chip)
-                string_id = str(id)
-                scoped_id = f'{library_name}/{string_id}'
-                log.debug('Processing id=%s', scoped_id)
-                if string_id[0] == '_':
-                    log.debug('Skipping id=%s', scoped_id)
-                    skipped += 1
-                    continue
-                try:
-                    if not 'pins' in yaml_chip:
-                        raise chip.Error('No pins attribute for chip [%s]', scoped_id)
-
-                    spacing = self._get_row_spacing(yaml_chip)
-                    new_chip = chip.Chip(string_id, len(yaml_chip['pins']),
-                        library=library_name,
-                        rowSpacing=spacing)
-
-                    if 'name' in yaml_chip:
-                        new_chip.name = str(yaml_chip['name'])
-                    if 'description' in yaml_chip:
-                        new_chip.description = str(yaml_chip['description'])
-
-                    new_chip.set_pins(yaml_chip['pins'])
-                    chip_list[scoped_id] = new_chip
-
-                    # Add to raw chip list for global searches
-                    if string_id in self._global_name_dict:
-                        log.warning('Duplicate global chip id [%s], use scoped name [%s] for lookup', string_id, scoped_id)
-                    self._global_name_dict[string_id] = new_chip
-
-                    if 'family' in yaml_chip:
-                        self._add_aliases(new_chip, str(yaml_chip['family']))
-
-                except chip.Error as err:
-                    log.error('Error adding chip [%s]: %s, skipping',
-                        scoped_id, err)
-                    skipped += 1
+        loaded = []
+        for new_chip, family in new_chips:
+            id = new_chip.unscoped_id
+            chip_list[new_chip.scoped_id] = new_chip
+
+            # Add to raw chip list for global searches
+            if id in self._global_name_dict:
+                log.warning('Duplicate global chip id [%s], use scoped name [%s] for lookup', id, new_chip.scoped_id)
+            self._global_name_dict[id] = new_chip
+
+            if family:
+                self._add_aliases(new_chip, family)
+            loaded.append((id, family))
+
+        if write_cache:
+            self._write_cache(signature, compiled)
+
+        skipped = compiled['skipped']
         log.info(f'Loaded %d chips from %s %s', len(chip_list), filename,
             f'({skipped} skipped)' if skipped else '')
 
         self._chip_list.update(chip_list)
+        self._search_index = None
+        return loaded
+
+    @staticmethod
+    def _collect(records, record_list):
+        for record in records:
+            record_list.append(record)
+            yield record
 
     def __len__(self):
         return len(self._chip_list)
@@ -145,4 +596,9 @@ class ChipList:
 
     @property
     def global_names(self):
-        return [name for name in self._global_name_dict]
+        names = [name for name in self._global_name_dict]
+        for family, family_chips in self._family_dict.items():
+            rule = get_family(family)
+            for id in family_chips:
+                names.extend(rule.get_aliases(id))
+        return names
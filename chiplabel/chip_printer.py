@@ -6,7 +6,11 @@ import math
 import re
 from PIL import ImageFont, ImageDraw, Image
 from .args import *
+from .bilevel import save_image
 from .chip import Chip
+from .profiler import phase
+from .render_cache import RenderCache
+from .text_cache import get_text_cache
 
 log = logging.getLogger(__name__)
 
@@ -17,28 +21,39 @@ class ChipPrinter:
         'indentSize': 1.0,  # in mm
         'padding': 2, # pixels between edge and label
         'invert': False,
-        'font': ''
+        'font': '',
+        'png_compress': DEFAULT_PNG_COMPRESS,
+        'png_strategy': DEFAULT_PNG_STRATEGY,
     }
 
     _chip = None
     _font = None
+    _text_cache = None
+    _render_cache = None
+    _image_writer = None
 
     _invertRegex = re.compile(r"~[^~]*~?")
 
-    def __init__(self, **kwargs):
+    def __init__(self, render_cache=None, image_writer=None, **kwargs):
         if kwargs:
             self.config = {**self.config, **kwargs}
 
+        self._render_cache = render_cache
+        self._image_writer = image_writer
+
         self._init_font()
 
 
     def _init_font(self):
         font_size = self._get_font_size()
-        try:
-            self._font = ImageFont.truetype(self.config['font'], font_size)
-        except IOError:
-            log.warning(f'Unable to load font: [%s], using internal fixed size font', self.config['font'])
-            self._font = ImageFont.load_default()
+        with phase('font', self.config['font']):
+            try:
+                self._font = ImageFont.truetype(self.config['font'], font_size)
+            except IOError:
+                log.warning(f'Unable to load font: [%s], using internal fixed size font', self.config['font'])
+                self._font = ImageFont.load_default()
+        text_cache_key = (self.config['font'], self.config['fontSize'], self.dpi)
+        self._text_cache = get_text_cache(text_cache_key, self._font)
 
     def _draw_border(self, image):
         draw = ImageDraw.Draw(image)
@@ -59,12 +74,12 @@ class ChipPrinter:
 
     def _draw_chip_name(self, image):
         _, canvasY = image.size
-        draw = ImageDraw.Draw(image)
         x0 = math.ceil(self._get_indent_size() * 1.2)
 
+        # Chip names are unique, not worth caching
         label = self._chip.full_name
-        _, textSizeY = draw.textsize(label, font=self._font)
-        draw.text((x0, (canvasY-textSizeY)//2), label, font=self._font)
+        _, textSizeY = self._text_cache.textsize(label, cache=False)
+        self._text_cache.draw_text(image, (x0, (canvasY-textSizeY)//2), label, cache=False)
 
     def _get_pin_info(self, pin):
         pinName = self._chip[pin]
@@ -95,11 +110,13 @@ class ChipPrinter:
 
         return pinName, invertRange
 
-    def _draw_pins(self, image):
-        width, height = image.size
-        draw = ImageDraw.Draw(image)
+    def _layout_pins(self, size):
+        """Measure the pin names: returns the (x, y, pin name, invert range,
+        text width) of each pin label, on an unrotated image of size"""
+        width, height = size
         padding = self.config['padding']
         rows = len(self._chip) // 2
+        pin_labels = []
         pin = 1
         for col in range(2):
             effective_col = 1-col if self.config['invert'] else col
@@ -109,21 +126,27 @@ class ChipPrinter:
                     y = height-y
                 pinName, invertRange = self._get_pin_info(pin)
                 pin += 1
-                textSizeX, textSizeY = draw.textsize(pinName, font=self._font)
+                textSizeX, textSizeY = self._text_cache.textsize(pinName)
                 offsetY = math.ceil(textSizeY / 2.0)
                 x = padding if effective_col == 0 else width-textSizeX-padding
-                draw.text((x, y-offsetY), pinName, font=self._font)
-                if invertRange:
-                    charWidth = textSizeX / len(pinName)
-                    xStart = x + (invertRange[0] * charWidth)
-                    xEnd = x + (invertRange[1] * charWidth)
-                    draw.line([(xStart,y-offsetY), (xEnd, y-offsetY)])
+                pin_labels.append((x, y-offsetY, pinName, invertRange, textSizeX))
+        return pin_labels
+
+    def _draw_pins(self, image, pin_labels):
+        draw = ImageDraw.Draw(image)
+        for x, y, pinName, invertRange, textSizeX in pin_labels:
+            self._text_cache.draw_text(image, (x, y), pinName)
+            if invertRange:
+                charWidth = textSizeX / len(pinName)
+                xStart = x + (invertRange[0] * charWidth)
+                xEnd = x + (invertRange[1] * charWidth)
+                draw.line([(xStart,y), (xEnd, y)])
 
     def _get_indent_size(self):
         return self._mm_to_pixel(self.config['indentSize'])
 
     def _get_pin_row_y(self, row):
-        return self._mm_to_pixel(self._chip.config['pinSpacing'] * (row + 0.5))
+        return self._mm_to_pixel(self._chip.pin_spacing * (row + 0.5))
 
     def _get_font_size(self):
         return self._mm_to_pixel(self.config['fontSize'])
@@ -138,34 +161,94 @@ class ChipPrinter:
     def dpi(self):
         return self.config.get('dpi', 300)
 
+    @property
+    def format(self):
+        image_format = self.config.get('format', DEFAULT_IMAGE_FORMAT)
+        return image_format if image_format in BITMAP_FORMATS else DEFAULT_IMAGE_FORMAT
+
     @property
     def font(self):
         return self._font
 
+    @property
+    def text_cache(self):
+        return self._text_cache
+
+    @property
+    def render_cache(self):
+        return self._render_cache
+
+    @property
+    def image_writer(self):
+        return self._image_writer
+
+    def _get_render_settings(self):
+        return tuple(self.config.get(key) for key in
+            ('dpi', 'font', 'fontSize', 'invert', 'indentSize', 'padding'))
+
+    def _get_save_args(self):
+        """Encoder options, the format is the extension of the output file"""
+        return {
+            'dpi': self.dpi,
+            'png_compress': self.config['png_compress'],
+            'png_strategy': self.config['png_strategy'],
+        }
+
+    def get_output_key(self, chip):
+        """Hash of everything that affects the output file of a label"""
+        return RenderCache.make_key(chip, self._get_render_settings() + (self.format,) +
+            tuple(self._get_save_args().values()))
+
     def get_chip_size(self, chip):
-        width = self._mm_to_pixel(chip.config['rowSpacing'])
-        height = self._mm_to_pixel(len(chip)//2 * chip.config['pinSpacing'])
+        width = self._mm_to_pixel(chip.row_spacing)
+        height = self._mm_to_pixel(len(chip)//2 * chip.pin_spacing)
         return (math.ceil(width), math.ceil(height))
 
     def print_chip(self, chip):
+        if self._render_cache is None:
+            return self._render_chip(chip)
+
+        key = self._render_cache.make_key(chip, self._get_render_settings())
+        image = self._render_cache.get(key)
+        if image is None:
+            image = self._render_chip(chip)
+            self._render_cache.put(key, image)
+        else:
+            log.debug('print_chip(%s) cache hit', chip)
+        return image
+
+    def _render_chip(self, chip):
         log.debug('print_chip(%s) config=%s', chip, self.config)
-        self._chip = chip
+        with phase('render', chip.scoped_id):
+            self._chip = chip
 
-        canvas_size = self.get_chip_size(chip)
-        log.debug('canvas_size=%s', canvas_size)
+            canvas_size = self.get_chip_size(chip)
+            log.debug('canvas_size=%s', canvas_size)
 
-        image = Image.new(mode='1', size=canvas_size, color=255)
+            with phase('measure'):
+                pin_labels = self._layout_pins(canvas_size)
 
-        self._draw_border(image)
-        self._draw_pins(image)
+            with phase('draw'):
+                image = Image.new(mode='1', size=canvas_size, color=255)
+                self._draw_border(image)
+                self._draw_pins(image, pin_labels)
 
-        rotated = image.rotate(90, expand=True)
+            with phase('rotate'):
+                rotated = image.rotate(90, expand=True)
 
-        self._draw_chip_name(rotated)
-        self._draw_chip_indent(rotated)
-        return rotated
+            with phase('draw'):
+                self._draw_chip_name(rotated)
+                self._draw_chip_indent(rotated)
+            return rotated
+
+    def _save_image(self, image, output_file):
+        if self._image_writer:
+            self._image_writer.submit(image, output_file, save=save_image, **self._get_save_args())
+        else:
+            with phase('encode', output_file):
+                save_image(image, output_file, **self._get_save_args())
+            log.info('Output saved to %s', output_file)
 
     def print_chip_to_file(self, chip, output_file):
         image = self.print_chip(chip)
-        image.save(output_file, dpi=(self.dpi, self.dpi))
-        log.info('Output saved to %s', output_file)
+        self._save_image(image, output_file)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# chip_search.py
+#
+# Search index over a chip list: exact, prefix and fuzzy (trigram) matches
+# on chip ids, names, descriptions and pin names. Family aliases are
+# resolved with the family rules, they are never indexed.
+#
+import bisect
+import difflib
+import heapq
+import itertools
+import logging
+import re
+import sys
+from array import array
+from collections import namedtuple
+from .family import get_family
+
+log = logging.getLogger(__name__)
+
+# A match scores the weight of its field times 3 for an exact match,
+# 2 to 3 for a prefix (closer to 3 for a longer prefix), 1 to 2 for an
+# abbreviation (a term that is a prefix of the word searched, e.g. reg
+# for register) and the similarity (0 to 1) for a fuzzy match
+FIELD_WEIGHTS = {'id': 8, 'name': 4, 'description': 2, 'pin': 1}
+PREFIX_SCORE = 2
+ABBREVIATION_SCORE = 1
+MIN_ABBREVIATION = 3
+MAX_PREFIX_TERMS = 256 # completions of a prefix
+MIN_SIMILARITY = 0.6
+FUZZY_CANDIDATES = 64 # terms sharing the most trigrams, compared to the word searched
+MAX_FUZZY_TERMS = 16 # closest terms of a fuzzy match
+COMMON_TRIGRAM = 2000 # trigrams in more terms are only used if there is nothing better
+
+TOKEN_REGEX = re.compile(r'\w+')
+
+SearchResult = namedtuple('SearchResult', 'chip score')
+
+def tokenize(text):
+    return TOKEN_REGEX.findall(text.casefold())
+
+def _trigrams(term):
+    padded = f'${term}$'
+    return {padded[n:n+3] for n in range(len(padded) - 2)}
+
+class SearchIndex:
+    """Documents are chips (or bare chip ids), with a few text fields.
+
+    Terms are kept in a sorted vocabulary: the completions of a prefix
+    are a contiguous range found by bisection, which is the lookup of a
+    prefix trie without a node per character. Fuzzy matches go through a
+    trigram index of the vocabulary, built on the first fuzzy lookup.
+
+    Matches are kept as levels (score, alias, set of documents) rather
+    than a score per document: a word like 'chip' matches most of the
+    documents, the levels are merged and intersected with set operations.
+    """
+    def __init__(self):
+        self._keys = []
+        self._chips = []
+        self._family_docs = {}
+        self._pin_terms = {} # pins: terms, while the chips are added
+        self._postings = {field: {} for field in FIELD_WEIGHTS}
+        self._vocabulary = None
+        self._trigram_index = None
+        self._order = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _add_terms(self, field, terms, doc):
+        """Add doc to the postings of the distinct terms"""
+        postings = self._postings[field]
+        for term in terms:
+            docs = postings.get(term)
+            if docs is None:
+                postings[term] = array('I', [doc])
+            else:
+                docs.append(doc)
+
+    def add(self, key, chip=None, family=None):
+        """Add a chip, or only its key (scoped id) if chip is None"""
+        if family and get_family(family) is None:
+            # No alias rule for this family
+            family = None
+        doc = len(self._keys)
+        self._keys.append(key)
+        self._chips.append(chip)
+        if family:
+            self._family_docs.setdefault(family, set()).add(doc)
+        unscoped_id = key.rpartition('/')[2].casefold()
+        self._add_terms('id', {unscoped_id, *tokenize(unscoped_id)}, doc)
+        if chip is not None:
+            self._add_terms('name', set(tokenize(chip.name)), doc)
+            self._add_terms('description', set(tokenize(chip.description)), doc)
+            # Most chips share their pinout with other chips
+            pins = tuple(chip)
+            pin_terms = self._pin_terms.get(pins)
+            if pin_terms is None:
+                pin_terms = tuple({sys.intern(term) for term in tokenize(' '.join(pins))})
+                self._pin_terms[pins] = pin_terms
+            self._add_terms('pin', pin_terms, doc)
+        self._vocabulary = None
+        self._trigram_index = None
+        self._order = None
+
+    def _get_vocabulary(self):
+        if self._vocabulary is None:
+            terms = set()
+            for postings in self._postings.values():
+                terms.update(postings)
+            self._vocabulary = sorted(terms)
+            # Only useful while the chips are added
+            self._pin_terms = {}
+        return self._vocabulary
+
+    def _get_trigram_index(self):
+        if self._trigram_index is None:
+            log.debug('Building trigram index')
+            trigram_index = {}
+            for term_index, term in enumerate(self._get_vocabulary()):
+                for trigram in _trigrams(term):
+                    postings = trigram_index.get(trigram)
+                    if postings is None:
+                        trigram_index[trigram] = array('I', [term_index])
+                    else:
+                        postings.append(term_index)
+            self._trigram_index = trigram_index
+        return self._trigram_index
+
+    def _get_order(self):
+        """Documents sorted by key"""
+        if self._order is None:
+            self._order = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+        return self._order
+
+    def _prefix_terms(self, prefix):
+        vocabulary = self._get_vocabulary()
+        start = bisect.bisect_left(vocabulary, prefix)
+        for term in vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def _abbreviation_terms(self, token):
+        """Terms that are a prefix of token"""
+        for length in range(len(token) - 1, MIN_ABBREVIATION - 1, -1):
+            term = token[:length]
+            if any(term in postings for postings in self._postings.values()):
+                yield ABBREVIATION_SCORE + length / len(token), term
+
+    def _fuzzy_terms(self, token):
+        """(similarity, term) of the vocabulary terms closest to token"""
+        trigram_index = self._get_trigram_index()
+        trigrams = _trigrams(token)
+        postings = sorted((trigram_index.get(trigram, ()) for trigram in trigrams), key=len)
+        # Common trigrams (e.g. $74) are slow to count and match everything
+        selected = [terms for terms in postings if len(terms) <= COMMON_TRIGRAM] or postings[:2]
+        counts = {}
+        for terms in selected:
+            for term_index in terms:
+                counts[term_index] = counts.get(term_index, 0) + 1
+
+        # Candidates with the most trigrams in common, ranked by their
+        # similarity to token (trigrams are too coarse for short ids)
+        vocabulary = self._get_vocabulary()
+        candidates = heapq.nlargest(FUZZY_CANDIDATES, counts.items(), key=lambda item: item[1])
+        matches = []
+        for term_index, _ in candidates:
+            term = vocabulary[term_index]
+            similarity = difflib.SequenceMatcher(None, token, term).ratio()
+            if similarity >= MIN_SIMILARITY:
+                matches.append((similarity, term))
+        return heapq.nlargest(MAX_FUZZY_TERMS, matches)
+
+    def _term_docs(self, field, term, candidates):
+        postings = self._postings[field].get(term, ())
+        if candidates is None:
+            return postings
+        if len(candidates) * 8 < len(postings):
+            # Postings are sorted, look up the few candidates
+            docs = set()
+            for doc in candidates:
+                position = bisect.bisect_left(postings, doc)
+                if position < len(postings) and postings[position] == doc:
+                    docs.add(doc)
+            return docs
+        return candidates.intersection(postings)
+
+    def _match_terms(self, terms, fields, groups, alias=None, candidates=None):
+        """Add the documents of (score, term) to groups {(score, alias): [docs]},
+        only the documents in candidates if not None"""
+        for score, term in terms:
+            for field in fields:
+                docs = self._term_docs(field, term, candidates)
+                if alias:
+                    docs = self._family_docs[alias[0]].intersection(docs)
+                if docs:
+                    groups.setdefault((score * FIELD_WEIGHTS[field], alias), []).append(docs)
+
+    @staticmethod
+    def _levels(groups):
+        """[(score, alias, docs)] of groups, best first, with each document
+        in the level of its best score only"""
+        levels = []
+        found = set()
+        # Stable sort: for equal scores the first match wins
+        for (score, alias), postings in sorted(groups.items(), key=lambda item: -item[0][0]):
+            docs = set().union(*postings)
+            docs -= found
+            if docs:
+                found |= docs
+                levels.append((score, alias, docs))
+        return levels
+
+    def _family_base_ids(self, token):
+        """Base chip ids a family alias could come from, with the family name"""
+        for family in self._family_docs:
+            for base_id in get_family(family).get_base_ids(token.upper()):
+                yield family, base_id.casefold()
+
+    def _match_token(self, token, fuzzy=True, fields=FIELD_WEIGHTS, candidates=None):
+        """Levels (score, alias, docs) of the documents matching token"""
+        matches = {}
+        terms = [(PREFIX_SCORE + len(token) / len(term), term) for term in self._prefix_terms(token)]
+        self._match_terms(terms, fields, matches, candidates=candidates)
+        for family, base_id in self._family_base_ids(token):
+            terms = [(PREFIX_SCORE + len(base_id) / len(term), term) for term in self._prefix_terms(base_id)]
+            self._match_terms(terms, ['id'], matches, alias=(family, token), candidates=candidates)
+        if not matches and fuzzy and len(token) >= 2:
+            self._match_terms(self._abbreviation_terms(token), fields, matches, candidates=candidates)
+            self._match_terms(self._fuzzy_terms(token), fields, matches, candidates=candidates)
+            for family, base_id in self._family_base_ids(token):
+                self._match_terms(self._fuzzy_terms(base_id), ['id'], matches,
+                    alias=(family, token), candidates=candidates)
+        return self._levels(matches)
+
+    def _count_prefix_docs(self, token):
+        """Upper bound of the documents matching the prefix token"""
+        return sum(len(postings.get(term, ())) for term in self._prefix_terms(token)
+            for postings in self._postings.values())
+
+    def _alias_id(self, doc, alias):
+        """Alias of the chip id the closest to the alias token searched"""
+        family, token = alias
+        aliases = get_family(family).get_aliases(self._keys[doc].rpartition('/')[2])
+        aliases = [alias_id for alias_id in aliases if alias_id.casefold().startswith(token)] or aliases
+        return max(aliases, key=lambda alias_id: difflib.SequenceMatcher(None, alias_id.casefold(), token).ratio(),
+            default=None)
+
+    def _first_docs(self, docs, count):
+        """The count documents of docs with the first keys"""
+        if len(docs) <= count:
+            return sorted(docs, key=self._keys.__getitem__)
+        order = self._get_order()
+        if len(docs) * 8 < len(order):
+            return heapq.nsmallest(count, docs, key=self._keys.__getitem__)
+        # Most of the documents, the first ones in key order are found quickly
+        first = []
+        for doc in order:
+            if doc in docs:
+                first.append(doc)
+                if len(first) == count:
+                    break
+        return first
+
+    def _best(self, levels, limit):
+        """(doc, score, alias) of the limit best documents of levels,
+        by key for equal scores"""
+        best = []
+        levels = sorted(levels, key=lambda level: -level[0])
+        for score, group in itertools.groupby(levels, key=lambda level: level[0]):
+            if len(best) >= limit:
+                break
+            group = list(group)
+            docs = group[0][2] if len(group) == 1 else set().union(*(docs for _, _, docs in group))
+            for doc in self._first_docs(docs, limit - len(best)):
+                alias = next(alias for _, alias, level_docs in group if doc in level_docs)
+                best.append((doc, score, alias))
+        return best
+
+    def search(self, query, limit=20, fuzzy=True):
+        """Returns the (doc, score, alias id) of the best matches of all the words of query"""
+        results = None
+        # The rarest words first, the other ones are only matched against
+        # the documents found so far
+        tokens = set(tokenize(query))
+        if len(tokens) > 1:
+            tokens = sorted(tokens, key=self._count_prefix_docs)
+        for token in tokens:
+            candidates = None
+            if results is not None:
+                candidates = set().union(*(docs for _, _, docs in results))
+                if len(candidates) * 2 > len(self._keys):
+                    # Filtered by the intersection of the levels anyway
+                    candidates = None
+            levels = self._match_token(token, fuzzy, candidates=candidates)
+            if results is None:
+                results = levels
+            else:
+                # Each document is in one level per word: the documents
+                # of a pair of levels have the sum of their scores
+                results = [(score + token_score, alias or token_alias, docs & token_docs)
+                    for score, alias, docs in results
+                    for token_score, token_alias, token_docs in levels]
+                results = [level for level in results if level[2]]
+            if not results:
+                return []
+        if not results:
+            return []
+        return [(doc, score, self._alias_id(doc, alias) if alias else None)
+            for doc, score, alias in self._best(results, limit)]
+
+    def get_key(self, doc):
+        return self._keys[doc]
+
+    def get_chip(self, doc):
+        return self._chips[doc]
+
+    def suggest(self, chip_id, count=3):
+        """Ids similar to chip_id, for a chip that wasn't found"""
+        suggestions = []
+        token = chip_id.rpartition('/')[2].casefold()
+        levels = self._match_token(token, fields=['id'])
+        for doc, score, alias in self._best(levels, count):
+            suggestion = self._alias_id(doc, alias) if alias else None
+            if not suggestion:
+                key = self._keys[doc]
+                unscoped_id = key.rpartition('/')[2]
+                # Scoped id for an id found in more than one library
+                suggestion = key if len(self._postings['id'][unscoped_id.casefold()]) > 1 else unscoped_id
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+        return suggestions
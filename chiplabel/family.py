@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# family.py
+#
+import logging
+
+log = logging.getLogger(__name__)
+
+class FamilyRule:
+    """Base class for chip family alias rules.
+
+    Aliases are never materialized: a rule only knows how to list the
+    aliases of a chip id and how to map a requested alias back to the
+    chip ids that could have produced it.
+    """
+    name = None
+
+    def check(self, chip_id):
+        """Returns an error message if chip_id can't have family aliases"""
+        return None
+
+    def get_aliases(self, chip_id):
+        return []
+
+    def get_base_ids(self, alias_id):
+        return []
+
+class InfixFamilyRule(FamilyRule):
+    """Family name inserted after a fixed prefix: 7400 -> 74LS00"""
+    def __init__(self, name, prefix, infixes):
+        self.name = name
+        self._prefix = prefix
+        self._infixes = list(infixes)
+        # Longest first so 74LS00 resolves to 7400 rather than 74S00
+        self._lookup_infixes = sorted(self._infixes, key=len, reverse=True)
+
+    def check(self, chip_id):
+        if not chip_id.startswith(self._prefix):
+            return f'Chip is missing {self._prefix} prefix: [{chip_id}], skipping aliases'
+        return None
+
+    def get_aliases(self, chip_id):
+        prefix_len = len(self._prefix)
+        return [f'{chip_id[:prefix_len]}{infix}{chip_id[prefix_len:]}' for infix in self._infixes]
+
+    def get_base_ids(self, alias_id):
+        if not alias_id.startswith(self._prefix):
+            return
+        rest = alias_id[len(self._prefix):]
+        for infix in self._lookup_infixes:
+            if rest.startswith(infix) and len(rest) > len(infix):
+                yield f'{self._prefix}{rest[len(infix):]}'
+
+class PrefixFamilyRule(FamilyRule):
+    """Manufacturer prefix added in front of the chip id: 4011 -> CD4011
+
+    e.g. register_family(PrefixFamilyRule('4000', '4', ['CD', 'HEF', 'MC1']))
+    """
+    def __init__(self, name, first_char, prefixes):
+        self.name = name
+        self._first_char = first_char
+        self._prefixes = list(prefixes)
+        self._lookup_prefixes = sorted(self._prefixes, key=len, reverse=True)
+
+    def check(self, chip_id):
+        if not chip_id.startswith(self._first_char):
+            return f'Chip id must start with {self._first_char}: [{chip_id}], skipping aliases'
+        return None
+
+    def get_aliases(self, chip_id):
+        return [f'{prefix}{chip_id}' for prefix in self._prefixes]
+
+    def get_base_ids(self, alias_id):
+        for prefix in self._lookup_prefixes:
+            if alias_id.startswith(prefix) and len(alias_id) > len(prefix):
+                yield alias_id[len(prefix):]
+
+FAMILY_RULES = {}
+
+def register_family(rule):
+    FAMILY_RULES[rule.name] = rule
+
+def get_family(name):
+    return FAMILY_RULES.get(name)
+
+register_family(InfixFamilyRule('7400', '74', [
+    'L', 'H', 'S', 'LS', 'AS', 'ALS', 'F', # Bipolar
+    'C', 'HC', 'HCT', 'AC', 'ACT', # CMOS
+    'ACQ', 'AHC', 'ALVC', 'ALVT', 'AUC', # CMOS overkill
+    'AUP', 'AVC', 'AXC', 'FC', 'FCT', 'LCX',
+    'LV', 'LVC', 'LVT', 'LVQ', 'LVX', 'VHC']))
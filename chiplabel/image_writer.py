@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# image_writer.py
+#
+import logging
+import queue
+import threading
+from .profiler import phase
+
+log = logging.getLogger(__name__)
+
+QUEUE_SIZE_PER_WORKER = 2
+
+class ImageWriter:
+    """Encode and write images to disk in background threads.
+
+    submit() blocks when the queue is full so at most queue_size images
+    are waiting to be written. Images must not be modified once submitted.
+    Write errors are collected and returned by close().
+    """
+    def __init__(self, workers=2, queue_size=None):
+        log.debug('ImageWriter.__init__(%d, %s)', workers, queue_size)
+        if workers < 1:
+            raise ValueError('At least one worker is needed')
+        if queue_size is None:
+            queue_size = workers * QUEUE_SIZE_PER_WORKER
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._errors = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._written = 0
+        self._threads = [threading.Thread(target=self._worker, daemon=True,
+            name=f'ImageWriter-{n}') for n in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                image, filename, save, save_args = item
+                try:
+                    with phase('encode', filename):
+                        if save:
+                            save(image, filename, **save_args)
+                        else:
+                            image.save(filename, **save_args)
+                    log.info('Output saved to %s', filename)
+                    with self._lock:
+                        self._written += 1
+                except Exception as err:
+                    with self._lock:
+                        self._errors.append((filename, err))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, image, filename, save=None, **save_args):
+        """Queue image to be written to filename, by save(image, filename,
+        **save_args) or image.save(filename, **save_args)"""
+        if self._closed:
+            raise ValueError('ImageWriter is closed')
+        self._queue.put((image, filename, save, save_args))
+
+    def flush(self):
+        """Wait until all the submitted images are written"""
+        self._queue.join()
+
+    def close(self):
+        """Write the pending images and stop the workers. Returns the write errors"""
+        if not self._closed:
+            self._closed = True
+            for thread in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+        return self.errors
+
+    @property
+    def errors(self):
+        with self._lock:
+            return list(self._errors)
+
+    @property
+    def written(self):
+        with self._lock:
+            return self._written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# manifest.py
+#
+# Output manifest for --incremental: the key (hash of the chip definition,
+# render settings and version) of each label file written in an output
+# directory, so unchanged labels are not rendered and written again.
+#
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'chiplabel-manifest.json'
+MANIFEST_VERSION = 1
+
+class OutputManifest:
+    """Label files of an output directory and the key they were rendered with.
+
+    A file is up to date if its key is unchanged and it wasn't modified
+    since it was written (same size and mtime). Files are recorded with
+    add() before they are written, their size and mtime are read by
+    save(), once they are all written.
+    """
+    def __init__(self, output_dir):
+        self._output_dir = output_dir
+        self._path = os.path.join(output_dir, MANIFEST_FILE)
+        self._files = self._read()
+        self._pending = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    def _read(self):
+        if not os.path.isfile(self._path):
+            return {}
+        try:
+            with open(self._path, 'r', encoding='utf8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (IOError, ValueError) as err:
+            log.warning('Unable to read output manifest [%s]: %s', self._path, err)
+            return {}
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            log.debug('Ignoring output manifest [%s], unknown version', self._path)
+            return {}
+        return manifest.get('files', {})
+
+    def _get_file_path(self, filename):
+        return os.path.join(self._output_dir, filename)
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, filename):
+        return filename in self._files
+
+    def is_fresh(self, filename, key):
+        entry = self._files.get(filename)
+        if not entry or entry.get('key') != key:
+            return False
+        try:
+            stat = os.stat(self._get_file_path(filename))
+        except OSError:
+            return False
+        return entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+
+    def add(self, filename, key, chip_id):
+        """Record a file about to be written. The previous version is deleted
+        so a failed write doesn't leave a stale file recorded as new"""
+        self._files.pop(filename, None)
+        self._remove_file(filename)
+        self._pending[filename] = {'key': key, 'chip': chip_id}
+
+    def _remove_file(self, filename):
+        try:
+            os.remove(self._get_file_path(filename))
+        except FileNotFoundError:
+            pass
+
+    def remove_stale(self, filenames):
+        """Delete the files of the manifest that are not in filenames
+        (outputs of chips that no longer exist). Returns the deleted files"""
+        keep = set(filenames) | set(self._pending)
+        stale = sorted(filename for filename in self._files if filename not in keep)
+        for filename in stale:
+            del self._files[filename]
+            try:
+                self._remove_file(filename)
+            except OSError as err:
+                log.warning('Unable to delete stale output [%s]: %s', filename, err)
+                continue
+            log.info('Deleted stale output %s', filename)
+        return stale
+
+    def save(self):
+        """Write the manifest with the files written since add()"""
+        for filename, entry in self._pending.items():
+            try:
+                stat = os.stat(self._get_file_path(filename))
+            except OSError:
+                log.debug('Not in manifest, not written: %s', filename)
+                continue
+            self._files[filename] = {**entry, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        self._pending = {}
+
+        temp_file = f'{self._path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf8') as manifest_file:
+                json.dump({'version': MANIFEST_VERSION, 'files': self._files},
+                    manifest_file, indent=1, sort_keys=True)
+            os.replace(temp_file, self._path)
+        except IOError as err:
+            log.warning('Unable to write output manifest [%s]: %s', self._path, err)
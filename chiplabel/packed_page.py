@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# packed_page.py
+#
+# NumPy page engine (--page_engine numpy): pages are kept bit-packed, 8
+# pixels per byte like the raw data of mode '1' images, and labels are
+# copied with shifts and masks instead of Image.paste. A mode '1' PIL
+# image uses a byte per pixel, a packed page 8 times less.
+#
+import functools
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def is_available():
+    return numpy is not None
+
+@functools.lru_cache(maxsize=1024)
+def _row_mask(offset, width, byte_count):
+    """Bytes with the bits [offset, offset + width) set, and their inverse"""
+    bits = numpy.zeros(byte_count * 8, dtype=numpy.uint8)
+    bits[offset:offset + width] = 1
+    mask = numpy.packbits(bits)
+    inverse = ~mask
+    mask.flags.writeable = False
+    inverse.flags.writeable = False
+    return mask, inverse
+
+def _shift_right(rows, shift, byte_count):
+    """Rows of packed bits moved shift (0-7) bits to the right, byte_count bytes wide"""
+    shifted = numpy.zeros((rows.shape[0], byte_count), dtype=numpy.uint8)
+    width = min(rows.shape[1], byte_count)
+    shifted[:, :width] = rows[:, :width] >> shift
+    if shift:
+        carry = min(rows.shape[1], byte_count - 1)
+        shifted[:, 1:carry + 1] |= rows[:, :carry] << (8 - shift)
+    return shifted
+
+def _shift_left(rows, shift, byte_count):
+    """Rows of packed bits moved shift (0-7) bits to the left, byte_count bytes wide"""
+    shifted = rows[:, :byte_count] << shift
+    if shift:
+        carry = min(byte_count, rows.shape[1] - 1)
+        shifted[:, :carry] |= rows[:, 1:carry + 1] >> (8 - shift)
+    return shifted
+
+class PackedPage:
+    """Bit-packed 1-bit page or label, with the part of the mode '1' Image
+    interface used by ChipGridPrinter: size, paste, crop, rotate, tobytes
+    and save (png).
+
+    Rows are padded to a whole byte, 1 is white and the padding bits are
+    0, so tobytes() returns the same data as a mode '1' image.
+    """
+    mode = '1'
+
+    def __init__(self, size, color=255, data=None):
+        if numpy is None:
+            raise ImportError('The numpy page engine needs numpy')
+        width, height = size
+        self._size = (width, height)
+        self._stride = (width + 7) // 8
+        if data is None:
+            data = numpy.full((height, self._stride), 0xFF if color else 0, dtype=numpy.uint8)
+            self._clear_padding(data)
+        self._data = data
+
+    @classmethod
+    def from_image(cls, image):
+        """Packed copy of a mode '1' PIL image"""
+        width, height = image.size
+        data = numpy.frombuffer(bytearray(image.tobytes()), dtype=numpy.uint8)
+        return cls(image.size, data=data.reshape(height, (width + 7) // 8))
+
+    def _clear_padding(self, data):
+        if self._size[0] % 8 and data.size:
+            data[:, -1] &= (0xFF << (8 - self._size[0] % 8)) & 0xFF
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def width(self):
+        return self._size[0]
+
+    @property
+    def height(self):
+        return self._size[1]
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def _fill(self, color, box):
+        left, top, right, bottom = box
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, self._size[0]), min(bottom, self._size[1])
+        if right <= left or bottom <= top:
+            return
+        first = left // 8
+        byte_count = (right + 7) // 8 - first
+        mask, inverse = _row_mask(left - first * 8, right - left, byte_count)
+        region = self._data[top:bottom, first:first + byte_count]
+        if color:
+            region |= mask
+        else:
+            region &= inverse
+
+    def paste(self, image, box):
+        """Copy a mode '1' image or PackedPage at box (x, y), or fill box
+        (left, top, right, bottom) when image is a color (0 or 255)"""
+        if isinstance(image, int):
+            self._fill(image, box)
+            return
+        x, y = box[:2]
+        width, height = image.size
+        # Clipped to the page
+        clip = (max(-x, 0), max(-y, 0), min(width, self._size[0] - x), min(height, self._size[1] - y))
+        if clip[2] <= clip[0] or clip[3] <= clip[1]:
+            return
+        if clip != (0, 0, width, height):
+            image = image.crop(clip)
+            x, y = x + clip[0], y + clip[1]
+            width, height = image.size
+
+        if isinstance(image, PackedPage):
+            rows = image._data
+        else:
+            rows = numpy.frombuffer(image.tobytes(), dtype=numpy.uint8).reshape(height, (width + 7) // 8)
+        shift = x % 8
+        first = x // 8
+        byte_count = (shift + width + 7) // 8
+        mask, inverse = _row_mask(shift, width, byte_count)
+        region = self._data[y:y + height, first:first + byte_count]
+        region &= inverse
+        if shift:
+            rows = _shift_right(rows, shift, byte_count)
+        region |= rows & mask
+
+    def crop(self, box):
+        """New PackedPage with the area box (left, top, right, bottom) of the page"""
+        left, top, right, bottom = box
+        if left < 0 or top < 0 or right > self._size[0] or bottom > self._size[1]:
+            raise ValueError(f'Crop box {box} is outside of the page {self._size}')
+        width = right - left
+        first = left // 8
+        rows = self._data[top:bottom, first:(right + 7) // 8]
+        page = PackedPage((width, bottom - top), data=_shift_left(rows, left % 8, (width + 7) // 8))
+        page._clear_padding(page._data)
+        return page
+
+    def rotate(self, angle, expand=False):
+        """Rotated counterclockwise by 90 degrees, like Image.rotate(90, expand=True)"""
+        if angle % 360 != 90 or not expand:
+            raise ValueError('Packed pages can only be rotated by 90 degrees, expanded')
+        bits = numpy.unpackbits(self._data, axis=1)[:, :self._size[0]]
+        # packbits pads the rows with 0
+        data = numpy.packbits(numpy.rot90(bits), axis=1)
+        return PackedPage((self._size[1], self._size[0]), data=data)
+
+    def tobytes(self):
+        return self._data.tobytes()
+
+    def to_image(self):
+        """Mode '1' PIL image, for the encoders that need one"""
+        from PIL import Image
+        return Image.frombytes('1', self._size, self.tobytes())
+
+    def save(self, fp, format=None, dpi=None, **params):
+        """Write the page to a file name or a binary stream in a bitmap format
+        (png, pbm or tiff), from the extension of the file name by default"""
+        from .bilevel import save_image
+        save_image(self, fp, format and format.lower(), dpi=dpi[0] if dpi else None, **params)
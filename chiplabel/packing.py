@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# packing.py
+#
+# 2D bin packing of chip labels on pages
+#
+import logging
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+# Position of item [index] on a page. width and height are the size of the
+# label on the page, i.e. after rotation
+Placement = namedtuple('Placement', 'index x y width height rotated')
+
+class _Rect:
+    __slots__ = ('x', 'y', 'width', 'height')
+
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def contains(self, other):
+        return (other.x >= self.x and other.y >= self.y and
+            other.x + other.width <= self.x + self.width and
+            other.y + other.height <= self.y + self.height)
+
+    def intersects(self, x, y, width, height):
+        return not (x >= self.x + self.width or x + width <= self.x or
+            y >= self.y + self.height or y + height <= self.y)
+
+class Bin:
+    """A single page. insert() returns (x, y, rotated) or None if the item doesn't fit"""
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def _orientations(self, width, height, rotate):
+        yield width, height, False
+        if rotate and width != height:
+            yield height, width, True
+
+    def insert(self, width, height, rotate):
+        raise NotImplementedError()
+
+class ShelfBin(Bin):
+    """Rows filled left to right, a new row when the item doesn't fit"""
+    def __init__(self, width, height):
+        Bin.__init__(self, width, height)
+        self._x = 0
+        self._y = 0
+        self._row_height = 0
+
+    def insert(self, width, height, rotate):
+        orientations = list(self._orientations(width, height, rotate))
+        for item_width, item_height, rotated in orientations:
+            if self._x + item_width <= self.width and self._y + item_height <= self.height:
+                x = self._x
+                self._x += item_width
+                self._row_height = max(self._row_height, item_height)
+                return x, self._y, rotated
+        row_y = self._y + self._row_height
+        for item_width, item_height, rotated in orientations:
+            if item_width <= self.width and row_y + item_height <= self.height:
+                self._x = item_width
+                self._y = row_y
+                self._row_height = item_height
+                return 0, row_y, rotated
+        return None
+
+class SkylineBin(Bin):
+    """Bottom-left skyline: keeps the top edge of the placed items"""
+    def __init__(self, width, height):
+        Bin.__init__(self, width, height)
+        self._skyline = [[0, 0, width]] # x, y, width segments
+
+    def _fit(self, index, width, height):
+        x = self._skyline[index][0]
+        end = x + width
+        if end > self.width:
+            return None
+        y = 0
+        while index < len(self._skyline) and self._skyline[index][0] < end:
+            y = max(y, self._skyline[index][1])
+            if y + height > self.height:
+                return None
+            index += 1
+        return y
+
+    def insert(self, width, height, rotate):
+        best = None
+        for item_width, item_height, rotated in self._orientations(width, height, rotate):
+            for index in range(len(self._skyline)):
+                y = self._fit(index, item_width, item_height)
+                if y is None:
+                    continue
+                score = (y + item_height, self._skyline[index][0])
+                if best is None or score < best[0]:
+                    best = (score, index, y, item_width, item_height, rotated)
+        if best is None:
+            return None
+        _, index, y, item_width, item_height, rotated = best
+        x = self._skyline[index][0]
+        self._add_segment(index, x, y + item_height, item_width)
+        return x, y, rotated
+
+    def _add_segment(self, index, x, y, width):
+        self._skyline.insert(index, [x, y, width])
+        # Shrink or remove the segments now under the new one
+        end = x + width
+        next_index = index + 1
+        while next_index < len(self._skyline):
+            seg = self._skyline[next_index]
+            if seg[0] >= end:
+                break
+            overlap = end - seg[0]
+            if overlap >= seg[2]:
+                del self._skyline[next_index]
+            else:
+                seg[0] += overlap
+                seg[2] -= overlap
+                break
+        # Merge segments at the same height
+        merged = [self._skyline[0]]
+        for seg in self._skyline[1:]:
+            if seg[1] == merged[-1][1]:
+                merged[-1][2] += seg[2]
+            else:
+                merged.append(seg)
+        self._skyline = merged
+
+class MaxRectsBin(Bin):
+    """Maximal rectangles, best short side fit"""
+    def __init__(self, width, height):
+        Bin.__init__(self, width, height)
+        self._free = [_Rect(0, 0, width, height)]
+
+    def insert(self, width, height, rotate):
+        best = None
+        for item_width, item_height, rotated in self._orientations(width, height, rotate):
+            for free in self._free:
+                if item_width > free.width or item_height > free.height:
+                    continue
+                leftover_x = free.width - item_width
+                leftover_y = free.height - item_height
+                score = (min(leftover_x, leftover_y), max(leftover_x, leftover_y), free.y, free.x)
+                if best is None or score < best[0]:
+                    best = (score, free.x, free.y, item_width, item_height, rotated)
+        if best is None:
+            return None
+        _, x, y, item_width, item_height, rotated = best
+        self._place(x, y, item_width, item_height)
+        return x, y, rotated
+
+    def _place(self, x, y, width, height):
+        new_free = []
+        for free in self._free:
+            if not free.intersects(x, y, width, height):
+                new_free.append(free)
+                continue
+            if x > free.x:
+                new_free.append(_Rect(free.x, free.y, x - free.x, free.height))
+            if x + width < free.x + free.width:
+                new_free.append(_Rect(x + width, free.y, free.x + free.width - x - width, free.height))
+            if y > free.y:
+                new_free.append(_Rect(free.x, free.y, free.width, y - free.y))
+            if y + height < free.y + free.height:
+                new_free.append(_Rect(free.x, y + height, free.width, free.y + free.height - y - height))
+        # Remove free rectangles contained in another one
+        self._free = [rect for i, rect in enumerate(new_free)
+            if not any(j != i and other.contains(rect) and
+                (not rect.contains(other) or j < i)
+                for j, other in enumerate(new_free))]
+
+class GuillotineBin(Bin):
+    """Guillotine cuts, best area fit, split on the shorter leftover axis"""
+    def __init__(self, width, height):
+        Bin.__init__(self, width, height)
+        self._free = [_Rect(0, 0, width, height)]
+
+    def insert(self, width, height, rotate):
+        best = None
+        for item_width, item_height, rotated in self._orientations(width, height, rotate):
+            for index, free in enumerate(self._free):
+                if item_width > free.width or item_height > free.height:
+                    continue
+                score = (free.width * free.height - item_width * item_height, free.y, free.x)
+                if best is None or score < best[0]:
+                    best = (score, index, item_width, item_height, rotated)
+        if best is None:
+            return None
+        _, index, item_width, item_height, rotated = best
+        free = self._free.pop(index)
+        self._split(free, item_width, item_height)
+        return free.x, free.y, rotated
+
+    def _split(self, free, width, height):
+        leftover_x = free.width - width
+        leftover_y = free.height - height
+        if leftover_x <= leftover_y:
+            # Horizontal cut: the bottom part gets the full width
+            right = _Rect(free.x + width, free.y, leftover_x, height)
+            bottom = _Rect(free.x, free.y + height, free.width, leftover_y)
+        else:
+            # Vertical cut: the right part gets the full height
+            right = _Rect(free.x + width, free.y, leftover_x, free.height)
+            bottom = _Rect(free.x, free.y + height, width, leftover_y)
+        for rect in (right, bottom):
+            if rect.width > 0 and rect.height > 0:
+                self._free.append(rect)
+
+PACKERS = {
+    'shelf': ShelfBin,
+    'skyline': SkylineBin,
+    'maxrects': MaxRectsBin,
+    'guillotine': GuillotineBin,
+}
+
+def pack(sizes, page_size, padding=0, method='maxrects', rotate=False):
+    """Place items of the given (width, height) sizes on as few pages as possible.
+
+    padding is the minimum space between two items. Returns a list of
+    pages, each one a list of Placement. Items that don't fit on an empty
+    page get a page of their own.
+    """
+    bin_class = PACKERS.get(method)
+    if not bin_class:
+        raise ValueError(f'Unknown packing method: {method}')
+
+    # Padding is added to the right and bottom of each item, and the page
+    # is enlarged by the same amount so the last row/column fits exactly
+    bin_width = page_size[0] + padding
+    bin_height = page_size[1] + padding
+
+    order = sorted(range(len(sizes)),
+        key=lambda index: (max(sizes[index]), min(sizes[index])), reverse=True)
+
+    bins = []
+    pages = []
+    for index in order:
+        width, height = sizes[index]
+        for page_bin, page in zip(bins, pages):
+            position = page_bin.insert(width + padding, height + padding, rotate)
+            if position:
+                break
+        else:
+            page_bin = bin_class(bin_width, bin_height)
+            position = page_bin.insert(width + padding, height + padding, rotate)
+            if position:
+                bins.append(page_bin)
+                page = []
+                pages.append(page)
+            else:
+                log.warning('Item %d (%dx%d) is larger than the page', index, width, height)
+                # Alone on its own page, don't put anything else on it
+                page = []
+                pages.append(page)
+                bins.append(bin_class(0, 0))
+                position = (0, 0, False)
+
+        x, y, rotated = position
+        if rotated:
+            width, height = height, width
+        page.append(Placement(index, x, y, width, height, rotated))
+    return pages
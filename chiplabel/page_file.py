@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# page_file.py
+#
+# Multi-page output files for page mode. Pages are written as soon as
+# they are added, only the current page is kept in memory.
+#
+import logging
+import os
+from .bilevel import has_libtiff
+from .pdf import PdfWriter, format_number
+
+log = logging.getLogger(__name__)
+
+class PdfPageFile:
+    """Page images in a pdf file, each image is a page at the image dpi"""
+    def __init__(self, path, dpi):
+        self._file = open(path, 'wb')
+        self._writer = PdfWriter(self._file)
+        self._dpi = dpi
+
+    @property
+    def page_count(self):
+        return self._writer.page_count
+
+    @property
+    def writer(self):
+        """The underlying PdfWriter, for vector pages"""
+        return self._writer
+
+    def _add_image_page(self, size, image_id):
+        width, height = (pixels * 72 / self._dpi for pixels in size)
+        content = f'q {format_number(width)} 0 0 {format_number(height)} 0 0 cm /Im1 Do Q'
+        self._writer.add_page(width, height, content.encode('ascii'), images={'Im1': image_id})
+        self._file.flush()
+
+    def add_page(self, image):
+        self._add_image_page(image.size, self._writer.add_image(image))
+
+    def add_page_bands(self, size, bands):
+        """Page image from bands of mode '1' images, see PdfWriter.add_image_bands"""
+        self._add_image_page(size, self._writer.add_image_bands(size, bands))
+
+    def close(self):
+        try:
+            self._writer.close()
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class TiffPageFile:
+    """Page images as the frames of a tiff file"""
+    def __init__(self, path, dpi):
+        from PIL import TiffImagePlugin
+        self._writer = TiffImagePlugin.AppendingTiffWriter(path, True)
+        self._dpi = dpi
+        self._page_count = 0
+
+    @property
+    def page_count(self):
+        return self._page_count
+
+    def add_page(self, image):
+        if hasattr(image, 'to_image'): # PackedPage
+            image = image.to_image()
+        # G4 compressed when Pillow has libtiff
+        compression = 'group4' if has_libtiff() else None
+        image.save(self._writer, format='TIFF', dpi=(self._dpi, self._dpi), compression=compression)
+        # Finalizes the frame and starts the next one
+        self._writer.newFrame()
+        self._page_count += 1
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def open_page_file(path, dpi):
+    """Returns a PdfPageFile or TiffPageFile, depending on the extension of path"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.pdf':
+        page_file = PdfPageFile(path, dpi)
+    elif extension in ('.tif', '.tiff'):
+        page_file = TiffPageFile(path, dpi)
+    else:
+        raise ValueError(f'Unsupported page file type: {path}')
+    log.debug('open_page_file(%s)', path)
+    return page_file
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# parallel.py
+#
+import functools
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .chip_printer import ChipPrinter
+from .render_cache import RenderCache
+
+log = logging.getLogger(__name__)
+
+CHUNKS_PER_JOB = 4 # balance between load balancing and IPC overhead
+
+# Per-process state of the pool workers, created by their first task
+_worker_state = None
+
+def get_job_count(jobs, task_count):
+    """Number of worker processes to use, 0 means one per cpu"""
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    return max(1, min(jobs, task_count))
+
+def auto_chunksize(task_count, jobs):
+    if task_count <= 0 or jobs <= 0:
+        return 1
+    return max(1, math.ceil(task_count / (jobs * CHUNKS_PER_JOB)))
+
+def _run_task(function, init, initargs, task):
+    global _worker_state
+    if _worker_state is None:
+        # Workers report back to the main process, which does all the
+        # logging so the output stays in order
+        logging.disable(logging.CRITICAL)
+        _worker_state = init(*initargs)
+    return function(_worker_state, task)
+
+class WorkerPool:
+    """Process pool whose tasks are called as function(state, task), with a
+    state (printer, renderer...) created once per worker process by
+    init(*initargs) when it runs its first task.
+
+    Does the job of the ProcessPoolExecutor initializer, which needs
+    Python 3.7. init and function must be module level functions.
+    """
+    def __init__(self, jobs, init, initargs=()):
+        self._executor = ProcessPoolExecutor(max_workers=jobs)
+        self._init = (init, initargs)
+
+    def submit(self, function, task):
+        return self._executor.submit(_run_task, function, *self._init, task)
+
+    def map(self, function, tasks, chunksize=1):
+        return self._executor.map(functools.partial(_run_task, function, *self._init),
+            tasks, chunksize=chunksize)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+def _create_printer(config, cache_dir):
+    return ChipPrinter(render_cache=RenderCache(cache_dir=cache_dir), **config)
+
+def _print_chip_to_file(printer, task):
+    chip, output_file = task
+    try:
+        printer.print_chip_to_file(chip, output_file)
+    except Exception as err:
+        return f'{type(err).__name__}: {err}'
+    return None
+
+def print_chips_to_files(tasks, config, jobs, cache_dir=None):
+    """Render (chip, output_file) tasks in a process pool.
+
+    Results are reported in task order. Errors are logged and do not abort
+    the batch. Returns the number of labels that could not be generated.
+    """
+    tasks = list(tasks)
+    jobs = get_job_count(jobs, len(tasks))
+    chunksize = auto_chunksize(len(tasks), jobs)
+    log.debug('print_chips_to_files: %d chips, %d jobs, chunksize=%d',
+        len(tasks), jobs, chunksize)
+
+    errors = 0
+    with WorkerPool(jobs, _create_printer, (config, cache_dir)) as pool:
+        results = pool.map(_print_chip_to_file, tasks, chunksize=chunksize)
+        for (chip, output_file), error in zip(tasks, results):
+            log.info('Generating label for chip [%s]', chip.id)
+            if error:
+                log.error('Unable to generate label for chip [%s]: %s', chip.id, error)
+                errors += 1
+            else:
+                log.info('Output saved to %s', output_file)
+    return errors
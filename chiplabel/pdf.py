@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# pdf.py
+#
+# Minimal PDF writer: vector content, the standard Courier font and
+# 1-bit images. Objects are written to the output stream as soon as they
+# are added, so pages can be streamed without keeping them in memory.
+#
+import logging
+import zlib
+
+log = logging.getLogger(__name__)
+
+MM_TO_POINTS = 72 / 25.4
+
+def format_number(value):
+    """Short decimal representation for PDF and SVG output"""
+    text = f'{value:.4f}'.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+def encode_text(text):
+    """PDF string literal for text in the WinAnsi encoding"""
+    data = text.encode('cp1252', errors='replace')
+    data = data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+    return b'(' + data + b')'
+
+class PdfWriter:
+    """Write a PDF document page by page to a binary stream.
+
+    Page content is given in PDF content stream syntax; the font resource
+    /F1 (Courier) is available to all pages. close() must be called to
+    write the page tree and cross reference table.
+    """
+    def __init__(self, stream, compress=True):
+        self._stream = stream
+        self._compress = compress
+        self._offsets = []
+        self._position = 0
+        self._page_ids = []
+        self._closed = False
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        # Pages are written before the page tree, reserve its object number
+        self._pages_id = self._reserve()
+        self._font_id = self.add_object(
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>')
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    def _write(self, data):
+        self._stream.write(data)
+        self._position += len(data)
+
+    def _reserve(self):
+        self._offsets.append(None)
+        return len(self._offsets)
+
+    def _write_object(self, object_id, data):
+        self._offsets[object_id-1] = self._position
+        self._write(b'%d 0 obj\n' % object_id)
+        self._write(data)
+        self._write(b'\nendobj\n')
+
+    def add_object(self, data):
+        object_id = self._reserve()
+        self._write_object(object_id, data)
+        return object_id
+
+    def add_stream(self, data, dictionary=b'', compress=None):
+        if compress is None:
+            compress = self._compress
+        if dictionary:
+            dictionary = b' ' + dictionary
+        if compress:
+            data = zlib.compress(data)
+            dictionary += b' /Filter /FlateDecode'
+        return self.add_object(b'<< /Length %d%s >>\nstream\n' % (len(data), dictionary)
+            + data + b'\nendstream')
+
+    def add_image(self, image):
+        """Add a mode '1' PIL image, returns its object id for add_page"""
+        if image.mode != '1':
+            image = image.convert('1')
+        # Rows are padded to full bytes, 1 is white like in mode '1'
+        data = image.tobytes()
+        return self.add_stream(data,
+            b'/Type /XObject /Subtype /Image /Width %d /Height %d '
+            b'/ColorSpace /DeviceGray /BitsPerComponent 1' % image.size)
+
+    def add_image_bands(self, size, bands):
+        """Add a 1-bit image from bands of mode '1' images (full width, top to
+        bottom), without keeping the whole image in memory"""
+        object_id = self._reserve()
+        length_id = self._reserve()
+        self._offsets[object_id-1] = self._position
+        dictionary = (b'/Type /XObject /Subtype /Image /Width %d /Height %d '
+            b'/ColorSpace /DeviceGray /BitsPerComponent 1' % size)
+        if self._compress:
+            dictionary += b' /Filter /FlateDecode'
+        # The length is only known at the end, it is an indirect object
+        self._write(b'%d 0 obj\n<< /Length %d 0 R %s >>\nstream\n' % (object_id, length_id, dictionary))
+        compressor = zlib.compressobj() if self._compress else None
+        length = 0
+        for band in bands:
+            data = band.tobytes()
+            if compressor:
+                data = compressor.compress(data)
+            self._write(data)
+            length += len(data)
+        if compressor:
+            data = compressor.flush()
+            self._write(data)
+            length += len(data)
+        self._write(b'\nendstream\nendobj\n')
+        self._write_object(length_id, b'%d' % length)
+        return object_id
+
+    def add_page(self, width, height, content, images=None):
+        """Add a page of width x height points.
+
+        images is a dict of {resource name: image object id} that can be
+        drawn in content with /name Do.
+        """
+        if self._closed:
+            raise ValueError('PdfWriter is closed')
+        content_id = self.add_stream(content)
+        resources = b'/Font << /F1 %d 0 R >>' % self._font_id
+        if images:
+            resources += b' /XObject << ' + b' '.join(b'/%s %d 0 R' % (name.encode('ascii'), image_id)
+                for name, image_id in images.items()) + b' >>'
+        page_id = self.add_object(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Resources << %s >> /Contents %d 0 R >>'
+            % (self._pages_id, format_number(width).encode('ascii'), format_number(height).encode('ascii'),
+                resources, content_id))
+        self._page_ids.append(page_id)
+        return page_id
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._page_ids)
+        self._write_object(self._pages_id,
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._page_ids)))
+        catalog_id = self.add_object(b'<< /Type /Catalog /Pages %d 0 R >>' % self._pages_id)
+
+        xref_position = self._position
+        self._write(b'xref\n0 %d\n' % (len(self._offsets) + 1))
+        self._write(b'0000000000 65535 f \n')
+        for offset in self._offsets:
+            self._write(b'%010d 00000 n \n' % offset)
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (len(self._offsets) + 1, catalog_id, xref_position))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# png_writer.py
+#
+# Streamed 1-bit png encoder: the image is written band by band, for
+# pages too large to be kept in memory as a single PIL image.
+#
+import struct
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+COMPRESS_LEVEL = 6 # same default as Pillow
+INCH_PER_METER = 39.3701
+CHUNK_ROWS = 256 # rows compressed at a time
+
+def _write_chunk(stream, chunk_type, data):
+    stream.write(struct.pack('>I', len(data)))
+    stream.write(chunk_type)
+    stream.write(data)
+    stream.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+def write_png(stream, size, bands, dpi=None, compress_level=COMPRESS_LEVEL,
+        strategy=zlib.Z_DEFAULT_STRATEGY):
+    """Write a 1-bit grayscale png of size (width, height) to a binary stream.
+
+    bands is an iterable of mode '1' images of the full width, from top to
+    bottom, whose heights add up to the image height. compress_level and
+    strategy are the zlib settings.
+    """
+    width, height = size
+    stream.write(PNG_SIGNATURE)
+    _write_chunk(stream, b'IHDR', struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0))
+    if dpi:
+        pixels_per_meter = round(dpi * INCH_PER_METER)
+        _write_chunk(stream, b'pHYs', struct.pack('>IIB', pixels_per_meter, pixels_per_meter, 1))
+
+    stride = (width + 7) // 8
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, zlib.MAX_WBITS,
+        zlib.DEF_MEM_LEVEL, strategy)
+    rows = 0
+    for band in bands:
+        if band.size[0] != width:
+            raise ValueError(f'Band width {band.size[0]} is not the image width {width}')
+        # Mode '1' rows are packed 8 pixels per byte, 1 is white like
+        # in png grayscale. Each row starts with its filter type (none).
+        data = band.tobytes()
+        rows += band.size[1]
+        for chunk in range(0, len(data), stride * CHUNK_ROWS):
+            chunk_data = b''.join(b'\0' + data[offset:offset + stride]
+                for offset in range(chunk, min(chunk + stride * CHUNK_ROWS, len(data)), stride))
+            compressed = compressor.compress(chunk_data)
+            if compressed:
+                _write_chunk(stream, b'IDAT', compressed)
+    if rows != height:
+        raise ValueError(f'Bands have {rows} rows instead of {height}')
+    _write_chunk(stream, b'IDAT', compressor.flush())
+    _write_chunk(stream, b'IEND', b'')
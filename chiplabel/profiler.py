@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# profiler.py
+#
+# Per-phase timings for --profile: yaml parsing, alias creation, font
+# loading, text measurement, drawing, rotation, page layout and crop,
+# image encoding... Phases are no-ops unless profiling was started.
+#
+import contextlib
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import namedtuple
+
+OUTLIER_RATIO = 3 # items taking more than 3x the median of their phase
+MAX_OUTLIERS = 10
+MIN_OUTLIER_ITEMS = 3 # a median needs a few items
+
+PhaseStats = namedtuple('PhaseStats', 'name count total mean max')
+Outlier = namedtuple('Outlier', 'phase item time ratio')
+
+_profiler = None
+
+class _NoPhase:
+    """Phase when not profiling (contextlib.nullcontext needs Python 3.7)"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        pass
+
+_NO_PHASE = _NoPhase()
+
+class _Phase:
+    __slots__ = ('_profiler', '_name', '_item', '_start')
+
+    def __init__(self, profiler, name, item):
+        self._profiler = profiler
+        self._name = name
+        self._item = item
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._profiler.add(self._name, self._start, time.perf_counter(), self._item)
+
+class Profiler:
+    """Time and count of each phase, and time of each item (chip, file) in a phase.
+
+    Phases can be nested (render includes measure, draw and rotate) and
+    run in several threads. With trace, each phase is also kept as a
+    Chrome trace event (chrome://tracing, Perfetto).
+    """
+    def __init__(self, trace=False):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._end = None
+        self._phases = {} # name: [count, total, max]
+        self._items = {} # name: {item: total}
+        self._events = [] if trace else None
+        self._thread_names = {}
+
+    def phase(self, name, item=None):
+        return _Phase(self, name, item)
+
+    def add(self, name, start, end, item=None):
+        duration = end - start
+        with self._lock:
+            stats = self._phases.get(name)
+            if stats is None:
+                stats = self._phases[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            if item is not None:
+                items = self._items.setdefault(name, {})
+                items[item] = items.get(item, 0.0) + duration
+            if self._events is not None:
+                thread = threading.current_thread()
+                self._thread_names[thread.ident] = thread.name
+                event = {'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': thread.ident,
+                    'ts': round((start - self._start) * 1e6, 1), 'dur': round(duration * 1e6, 1)}
+                if item is not None:
+                    event['args'] = {'item': str(item)}
+                self._events.append(event)
+
+    def stop(self):
+        if self._end is None:
+            self._end = time.perf_counter()
+
+    @property
+    def wall_time(self):
+        end = self._end if self._end is not None else time.perf_counter()
+        return end - self._start
+
+    def get_phases(self):
+        """PhaseStats of each phase (times in seconds), in order of first use"""
+        with self._lock:
+            return [PhaseStats(name, count, total, total / count, max_time)
+                for name, (count, total, max_time) in self._phases.items()]
+
+    def get_outliers(self, ratio=OUTLIER_RATIO, count=MAX_OUTLIERS):
+        """Items (chips, files) much slower than the other items of their phase, slowest first"""
+        outliers = []
+        with self._lock:
+            phase_items = {name: dict(items) for name, items in self._items.items()}
+        for name, items in phase_items.items():
+            if len(items) < MIN_OUTLIER_ITEMS:
+                continue
+            median = statistics.median(items.values())
+            if median <= 0:
+                continue
+            outliers.extend(Outlier(name, item, item_time, item_time / median)
+                for item, item_time in items.items() if item_time > ratio * median)
+        outliers.sort(key=lambda outlier: outlier.time, reverse=True)
+        return outliers[:count]
+
+    def format_report(self):
+        wall_time = self.wall_time
+        lines = [f'{"Phase":<12} {"Count":>7} {"Total ms":>10} {"Mean ms":>9} {"Max ms":>9} {"% wall":>7}']
+        for stats in self.get_phases():
+            percent = stats.total / wall_time * 100 if wall_time else 0
+            lines.append(f'{stats.name:<12} {stats.count:>7} {stats.total * 1000:>10.2f} '
+                f'{stats.mean * 1000:>9.3f} {stats.max * 1000:>9.3f} {percent:>6.1f}%')
+        lines.append(f'Wall time: {wall_time * 1000:.1f} ms (phases can be nested, '
+            'render includes measure, draw and rotate)')
+
+        outliers = self.get_outliers()
+        if outliers:
+            lines.append('')
+            lines.append(f'Outliers (more than {OUTLIER_RATIO}x the median time of their phase):')
+            for outlier in outliers:
+                lines.append(f'{outlier.phase:<12} {str(outlier.item):<40} '
+                    f'{outlier.time * 1000:>9.3f} ms {outlier.ratio:>6.1f}x')
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        """Write the phases in Chrome trace event format"""
+        import json
+        if self._events is None:
+            raise ValueError('Profiler was started without trace')
+        with self._lock:
+            events = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': ident,
+                'args': {'name': name}} for ident, name in self._thread_names.items()]
+            events.extend(self._events)
+        with open(path, 'w', encoding='utf8') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+def phase(name, item=None):
+    """Context manager timing a phase, does nothing unless profiling"""
+    profiler = _profiler
+    if profiler is None:
+        return _NO_PHASE
+    return profiler.phase(name, item)
+
+def start_profiling(trace=False):
+    global _profiler
+    _profiler = Profiler(trace=trace)
+    return _profiler
+
+def stop_profiling():
+    """Stops profiling, returns the Profiler (None if it wasn't started)"""
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    if profiler:
+        profiler.stop()
+    return profiler
+
+def get_profiler():
+    return _profiler
+
+@contextlib.contextmanager
+def profile(trace_file=None, stats_file=None, output=None):
+    """Profile the phases of the code in the with block and print the
+    report to output (default: stderr). Optionally write a Chrome trace
+    and a cProfile (pstats) file"""
+    profiler = start_profiling(trace=bool(trace_file))
+    code_profile = None
+    if stats_file:
+        import cProfile
+        code_profile = cProfile.Profile()
+        code_profile.enable()
+    try:
+        yield profiler
+    finally:
+        if code_profile:
+            code_profile.disable()
+        stop_profiling()
+        print(profiler.format_report(), file=output or sys.stderr)
+        if code_profile:
+            code_profile.dump_stats(stats_file)
+        if trace_file:
+            profiler.write_trace(trace_file)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# render.py
+#
+# In-memory rendering API: labels of any number of chips, as images or
+# encoded data, without writing files.
+#
+#   for chip, data in render_many(['7400', '555'], 'png', chip_list=chip_list):
+#       ...
+#
+import logging
+from collections import deque, namedtuple
+from collections.abc import Sized
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import islice
+from .args import BITMAP_FORMATS, DEFAULT_FONT_DIR, VECTOR_FORMATS
+from .bilevel import encode_image
+from .parallel import CHUNKS_PER_JOB, WorkerPool, auto_chunksize, get_job_count
+from .profiler import phase
+
+log = logging.getLogger(__name__)
+
+# image: PIL image (mode '1'), packed: PackedImage, png, pbm, tiff, svg, pdf: bytes
+RESULT_FORMATS = ['image', 'packed', 'png', 'pbm', 'tiff', 'svg', 'pdf']
+
+# Raw data of a mode '1' image: 1 bit per pixel, most significant bit
+# first, 1 is white, each row padded to a whole byte
+PackedImage = namedtuple('PackedImage', 'width height data')
+
+def pack_image(image):
+    return PackedImage(image.width, image.height, image.tobytes())
+
+class LabelRenderer:
+    """Renders the label of a chip in one of RESULT_FORMATS, in memory.
+
+    Images go through an in-memory RenderCache (bounded LRU), no cache
+    directory or image writer is ever used.
+    """
+    def __init__(self, result_format='png', **config):
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f'Unsupported result format: {result_format}')
+        self._format = result_format
+        config = {'font': DEFAULT_FONT_DIR, **config}
+        if result_format in VECTOR_FORMATS:
+            from .vector_printer import VectorChipPrinter
+            self._printer = VectorChipPrinter(**{**config, 'format': result_format})
+        else:
+            from .chip_printer import ChipPrinter
+            from .render_cache import RenderCache
+            self._printer = ChipPrinter(render_cache=RenderCache(), **config)
+
+    @property
+    def format(self):
+        return self._format
+
+    def render(self, chip):
+        result = self._printer.print_chip(chip)
+        if self._format in BITMAP_FORMATS:
+            with phase('encode'):
+                return encode_image(result, self._format, **self._printer._get_save_args())
+        if self._format == 'packed':
+            return pack_image(result)
+        return result
+
+def _create_renderer(result_format, config):
+    return LabelRenderer(result_format, **config)
+
+def _render_chunk(renderer, chips):
+    return [renderer.render(chip) for chip in chips]
+
+def _resolve_chips(items, chip_list):
+    for item in items:
+        if isinstance(item, str):
+            if chip_list is None:
+                raise ValueError(f'A chip list is needed to render chip ids: {item}')
+            chip = chip_list[item]
+            if not chip:
+                raise KeyError(f'Chip not found: {item}')
+            item = chip
+        yield item
+
+def _chunks(chips, chunksize):
+    while True:
+        chunk = list(islice(chips, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+def render_many(chips, result_format='png', chip_list=None, jobs=1, ordered=True,
+        window=None, chunksize=None, **config):
+    """Lazily render the labels of chips (Chip objects or ids looked up in
+    chip_list), yields (chip, result) with result in result_format.
+
+    With jobs > 1 (0: one per cpu) labels are rendered in worker
+    processes, chunksize chips at a time. Results come in input order,
+    or as soon as they are rendered with ordered=False. At most window
+    chunks are rendered ahead of the consumer, so memory doesn't depend
+    on the number of chips. Errors (unknown chip id, render error) are
+    raised by the generator and end it.
+    """
+    task_count = len(chips) if isinstance(chips, Sized) else float('inf')
+    chips = _resolve_chips(chips, chip_list)
+    jobs = get_job_count(jobs, task_count)
+    if jobs == 1:
+        renderer = LabelRenderer(result_format, **config)
+        for chip in chips:
+            yield chip, renderer.render(chip)
+        return
+
+    if chunksize is None:
+        chunksize = 1 if task_count == float('inf') else auto_chunksize(task_count, jobs)
+    if window is None:
+        window = jobs * CHUNKS_PER_JOB
+    if chunksize < 1 or window < 1:
+        raise ValueError('chunksize and window must be positive')
+    log.debug('render_many: %s, %d jobs, chunksize=%d, window=%d', result_format, jobs, chunksize, window)
+
+    chunks = _chunks(chips, chunksize)
+    pool = WorkerPool(jobs, _create_renderer, (result_format, config))
+    pending = deque() if ordered else {}
+    try:
+        while True:
+            # Keep up to window chunks in flight
+            for chunk in islice(chunks, window - len(pending)):
+                future = pool.submit(_render_chunk, chunk)
+                if ordered:
+                    pending.append((future, chunk))
+                else:
+                    pending[future] = chunk
+            if not pending:
+                return
+
+            if ordered:
+                future, chunk = pending.popleft()
+                yield from zip(chunk, future.result())
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from zip(pending.pop(future), future.result())
+    finally:
+        # Also when the consumer stops early: drop what wasn't started
+        for future in pending:
+            if ordered:
+                future = future[0]
+            future.cancel()
+        pool.shutdown(wait=True)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# render_cache.py
+#
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from PIL import Image
+from ._version import __version__
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 256 # images kept in memory
+
+class RenderCache:
+    """Content-addressed cache of rendered chip labels.
+
+    Labels are keyed on a hash of everything that affects the output image
+    (chip pins, name, description, spacing and the printer render settings).
+    Recently used images are kept in memory (LRU), and optionally persisted
+    as .png files in cache_dir so they survive between runs.
+    """
+    def __init__(self, size=DEFAULT_CACHE_SIZE, cache_dir=None):
+        log.debug('RenderCache.__init__(%d, %s)', size, cache_dir)
+        if size < 0:
+            raise ValueError('Cache size must be positive')
+        self._size = size
+        self._cache_dir = cache_dir
+        self._images = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(chip, settings):
+        key_data = (
+            __version__,
+            chip.display_name,
+            chip.description,
+            chip.pin_spacing,
+            chip.row_spacing,
+            tuple(chip),
+            tuple(settings)
+        )
+        return hashlib.sha1(repr(key_data).encode('utf8')).hexdigest()
+
+    def _get_cache_file(self, key):
+        return os.path.join(self._cache_dir, f'{key}.png')
+
+    def get(self, key):
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image.copy()
+
+        if self._cache_dir:
+            image = self._load(key)
+            if image is not None:
+                self.disk_hits += 1
+                self._add(key, image)
+                return image.copy()
+
+        self.misses += 1
+        return None
+
+    def put(self, key, image):
+        image = image.copy()
+        self._add(key, image)
+        if self._cache_dir:
+            self._save(key, image)
+
+    def clear(self):
+        self._images.clear()
+
+    def _add(self, key, image):
+        if not self._size:
+            return
+        self._images[key] = image
+        self._images.move_to_end(key)
+        while len(self._images) > self._size:
+            self._images.popitem(last=False)
+
+    def _load(self, key):
+        cache_file = self._get_cache_file(key)
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with Image.open(cache_file) as image:
+                image.load()
+                return image.copy()
+        except (IOError, SyntaxError) as err:
+            log.warning('Unable to read cached label [%s]: %s', cache_file, err)
+            return None
+
+    def _save(self, key, image):
+        cache_file = self._get_cache_file(key)
+        temp_file = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            image.save(temp_file, format='PNG')
+            os.replace(temp_file, cache_file)
+        except IOError as err:
+            log.warning('Unable to write cached label [%s]: %s', cache_file, err)
+
+    def __len__(self):
+        return len(self._images)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+        }
+
+    def __str__(self):
+        return (f'{self.hits + self.disk_hits} hits '
+            f'({self.disk_hits} from disk), {self.misses} misses')
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# server.py
+#
+# Resident label server: the chip library, fonts and caches stay loaded
+# between requests.
+#
+#   GET /chips                         list of chip names (json)
+#   GET /label/<chip>.png?dpi=600      single label
+#   GET /page.png?chip=7400&chip=555   page sheet, ?page=n for the next pages
+#                                      (.pbm and .tiff bitmaps, .svg and .pdf for vector output)
+#   GET /stats                         server and cache statistics (json)
+#
+import argparse
+import functools
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from .args import PAGE_PACKING, _dpi_range, _float_type, _page_padding_range, _page_size_range
+from .bilevel import encode_image
+from .chip_grid_printer import ChipGridPrinter
+from .chip_printer import ChipPrinter
+from .render_cache import RenderCache
+from .text_cache import get_text_cache_stats
+from .vector_printer import VectorChipPrinter, VectorGridPrinter
+
+log = logging.getLogger(__name__)
+
+UNIX_PREFIX = 'unix:'
+MAX_PRINTERS = 16 # request settings kept, least recently used first out
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+def _bool_type(string):
+    if string.lower() in ('1', 'true', 'yes', 'on', ''):
+        return True
+    if string.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise argparse.ArgumentTypeError(f'{string} is not a boolean value')
+
+def _page_size_type(string):
+    values = string.split(',')
+    if len(values) != 2:
+        raise argparse.ArgumentTypeError(f'{string} is not a page size (width,height)')
+    return tuple(_page_size_range(value) for value in values)
+
+def _page_packing_type(string):
+    if string not in PAGE_PACKING:
+        raise argparse.ArgumentTypeError(f'{string} is not one of {PAGE_PACKING}')
+    return string
+
+# Settings that can be changed per request, with the same validation as the command line
+LABEL_PARAMS = {
+    'dpi': _dpi_range,
+    'fontSize': _float_type,
+    'invert': _bool_type,
+}
+PAGE_PARAMS = {
+    'page_size': _page_size_type,
+    'page_padding': _page_padding_range,
+    'page_packing': _page_packing_type,
+    'page_rotate': _bool_type,
+    'page_nocrop': _bool_type,
+}
+
+# Vector formats have no encoder, the vector printers return the data
+FORMATS = {
+    'png': ('image/png', functools.partial(encode_image, format='png')),
+    'pbm': ('image/x-portable-bitmap', functools.partial(encode_image, format='pbm')),
+    'tiff': ('image/tiff', functools.partial(encode_image, format='tiff')),
+    'svg': ('image/svg+xml', None),
+    'pdf': ('application/pdf', None),
+}
+
+class _PageCollector:
+    """Keeps the pages of a ChipGridPrinter in memory instead of writing them"""
+    def __init__(self):
+        self.pages = []
+
+    def submit(self, image, filename, **save_args):
+        self.pages.append(image)
+
+class LabelServer:
+    """Renders labels and pages from a loaded chip list.
+
+    Printers (fonts) are created once per distinct request settings, the
+    MAX_PRINTERS most recently used are kept, labels go through a shared
+    RenderCache. Requests are handled in
+    concurrent threads but rendering is serialized; identical requests
+    in flight at the same time are coalesced into a single render.
+    """
+    def __init__(self, chip_list, config, render_cache=None):
+        self._chip_list = chip_list
+        # Pages are returned as images, never written to files
+        self._config = {**config, 'page_file': None, 'page_memory': None}
+        self._render_cache = render_cache if render_cache is not None else RenderCache()
+        self._printers = OrderedDict()
+        self._render_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._start_time = time.time()
+        self._stats = {
+            'requests': 0,
+            'errors': 0,
+            'renders': 0,
+            'coalesced': 0,
+        }
+
+    @property
+    def chip_list(self):
+        return self._chip_list
+
+    @property
+    def render_cache(self):
+        return self._render_cache
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def _parse_settings(self, query, params):
+        settings = {}
+        for name, parse in params.items():
+            values = query.get(name)
+            if not values:
+                continue
+            try:
+                settings[name] = parse(values[-1])
+            except argparse.ArgumentTypeError as err:
+                raise RequestError(HTTPStatus.BAD_REQUEST, f'Invalid {name}: {err}')
+        return tuple(sorted(settings.items()))
+
+    def _get_chip(self, chip_id):
+        chip = self._chip_list[chip_id]
+        if not chip:
+            suggestions = self._chip_list.suggest(chip_id)
+            hint = f", did you mean: {', '.join(suggestions)}?" if suggestions else ''
+            raise RequestError(HTTPStatus.NOT_FOUND, f'Chip not found: {chip_id}{hint}')
+        return chip
+
+    def _get_format(self, name):
+        image_format = FORMATS.get(name)
+        if not image_format:
+            raise RequestError(HTTPStatus.NOT_FOUND, f'Unsupported format: {name}')
+        return image_format
+
+    def _get_printer(self, printer_class, settings):
+        # Called with the render lock held
+        key = (printer_class, settings)
+        printer = self._printers.get(key)
+        if printer is None:
+            log.info('New %s: %s', printer_class.__name__, dict(settings))
+            config = {**self._config, **dict(settings)}
+            if printer_class is ChipGridPrinter:
+                printer = ChipGridPrinter(render_cache=self._render_cache,
+                    image_writer=_PageCollector(), **config)
+            elif printer_class in (VectorChipPrinter, VectorGridPrinter):
+                printer = printer_class(**config)
+            else:
+                printer = ChipPrinter(render_cache=self._render_cache, **config)
+            self._printers[key] = printer
+            if len(self._printers) > MAX_PRINTERS:
+                self._printers.popitem(last=False)
+        else:
+            self._printers.move_to_end(key)
+        return printer
+
+    def _coalesce(self, key, function):
+        """Returns function(), sharing the result with identical requests in flight"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            self._count('coalesced')
+            return future.result()
+
+        try:
+            future.set_result(function())
+        except BaseException as err:
+            future.set_exception(err)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return future.result()
+
+    def get_label(self, chip_id, format_name='png', query=None):
+        """Returns (content type, data) of the label of chip_id"""
+        chip = self._get_chip(chip_id)
+        content_type, encode = self._get_format(format_name)
+        settings = self._parse_settings(query or {}, LABEL_PARAMS)
+
+        def render():
+            with self._render_lock:
+                self._count('renders')
+                if encode is None:
+                    vector_settings = settings + (('format', format_name),)
+                    return self._get_printer(VectorChipPrinter, vector_settings).print_chip(chip)
+                image = self._get_printer(ChipPrinter, settings).print_chip(chip)
+            return encode(image)
+
+        key = ('label', chip.scoped_id, format_name, settings)
+        return content_type, self._coalesce(key, render)
+
+    def get_page(self, chip_ids, page=1, format_name='png', query=None):
+        """Returns (content type, data, page count) of page n of a sheet with chip_ids"""
+        chips = [self._get_chip(chip_id) for chip_id in chip_ids]
+        if not chips:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'No chip specified')
+        content_type, encode = self._get_format(format_name)
+        settings = self._parse_settings(query or {}, {**LABEL_PARAMS, **PAGE_PARAMS})
+
+        def render():
+            with self._render_lock:
+                self._count('renders')
+                if encode is None:
+                    vector_settings = settings + (('format', format_name),)
+                    return self._get_printer(VectorGridPrinter, vector_settings).get_pages(chips)
+                printer = self._get_printer(ChipGridPrinter, settings)
+                printer.image_writer.pages.clear()
+                printer.reset()
+                printer.print_chips(chips)
+                pages = list(printer.image_writer.pages)
+            return [encode(image) for image in pages]
+
+        key = ('page', tuple(chip.scoped_id for chip in chips), format_name, settings)
+        pages = self._coalesce(key, render)
+        if page < 1 or page > len(pages):
+            raise RequestError(HTTPStatus.NOT_FOUND, f'Page not found: {page} (out of {len(pages)})')
+        return content_type, pages[page-1], len(pages)
+
+    @property
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'uptime': round(time.time() - self._start_time, 3),
+            'chips': len(self._chip_list),
+            'printers': len(self._printers),
+            'render_cache': self._render_cache.stats,
+            'text_cache': get_text_cache_stats(),
+        })
+        return stats
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'chiplabel'
+
+    @property
+    def label_server(self):
+        return self.server.label_server
+
+    def address_string(self):
+        # Unix sockets have no client address
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return 'unix'
+
+    def log_message(self, format, *args):
+        log.info('%s %s', self.address_string(), format % args)
+
+    def _send(self, status, content_type, data, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _send_json(self, value, status=HTTPStatus.OK):
+        self._send(status, 'application/json', json.dumps(value).encode('utf8'))
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.label_server
+        server._count('requests')
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        try:
+            if path == '/chips':
+                self._send_json(sorted(server.chip_list.names, key=str.casefold))
+            elif path == '/stats':
+                self._send_json(server.stats)
+            elif path.startswith('/label/'):
+                chip_id, _, format_name = path[len('/label/'):].rpartition('.')
+                content_type, data = server.get_label(chip_id, format_name, query)
+                self._send(HTTPStatus.OK, content_type, data)
+            elif path.startswith('/page.'):
+                try:
+                    page = int(query.get('page', ['1'])[-1])
+                except ValueError:
+                    raise RequestError(HTTPStatus.BAD_REQUEST, 'Invalid page number')
+                chip_ids = [chip_id for value in query.get('chip', [])
+                    for chip_id in value.split(',') if chip_id]
+                content_type, data, page_count = server.get_page(
+                    chip_ids, page, path[len('/page.'):], query)
+                self._send(HTTPStatus.OK, content_type, data, {'X-Page-Count': str(page_count)})
+            else:
+                raise RequestError(HTTPStatus.NOT_FOUND, f'Not found: {path}')
+        except RequestError as err:
+            server._count('errors')
+            self._send_json({'error': str(err)}, err.status)
+        except Exception as err:
+            server._count('errors')
+            log.exception('Error handling request [%s]', self.path)
+            self._send_json({'error': str(err)}, HTTPStatus.INTERNAL_SERVER_ERROR)
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer needs Python 3.7
+    daemon_threads = True
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def _is_socket(self):
+        try:
+            return stat.S_ISSOCK(os.lstat(self.server_address).st_mode)
+        except FileNotFoundError:
+            return False
+
+    def server_bind(self):
+        # Replace the socket of a previous server, never another file
+        if self._is_socket():
+            os.unlink(self.server_address)
+        elif os.path.lexists(self.server_address):
+            raise FileExistsError(f'{self.server_address} exists and is not a socket')
+        socketserver.ThreadingUnixStreamServer.server_bind(self)
+
+    def server_close(self):
+        socketserver.ThreadingUnixStreamServer.server_close(self)
+        if self._is_socket():
+            os.unlink(self.server_address)
+
+def parse_address(address):
+    """'unix:/path/to/socket', 'host:port' or 'port'. Returns a path or (host, port)"""
+    if address.startswith(UNIX_PREFIX):
+        return address[len(UNIX_PREFIX):]
+    host, _, port = address.rpartition(':')
+    try:
+        return (host or 'localhost', int(port))
+    except ValueError:
+        raise ValueError(f'Invalid server address: {address}')
+
+def make_server(address, label_server):
+    """Returns a socketserver (not started) for label_server listening on address"""
+    server_address = parse_address(address)
+    if isinstance(server_address, str):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError('Unix sockets are not supported on this platform')
+        server = _UnixHTTPServer(server_address, _RequestHandler)
+    else:
+        server = _ThreadingHTTPServer(server_address, _RequestHandler)
+    server.label_server = label_server
+    return server
+
+def serve(chip_list, args):
+    config = vars(args)
+    cache_dir = os.path.join(args.cache, 'render') if args.cache else None
+    label_server = LabelServer(chip_list, config, RenderCache(cache_dir=cache_dir))
+    try:
+        server = make_server(args.serve, label_server)
+    except (OSError, ValueError) as err:
+        log.error('Unable to start server [%s]: %s', args.serve, err)
+        return
+    print(f'Serving {len(chip_list)} chips on {args.serve}', flush=True)
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
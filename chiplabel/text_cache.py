@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# text_cache.py
+#
+import logging
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TEXT_CACHE_SIZE = 4096 # strings kept per font
+
+class TextCache:
+    """Text metrics and pre-rendered 1-bit bitmaps for one font.
+
+    Pin names (GND, VCC, 1A, ...) repeat a lot between chips. Each string
+    is measured and rasterized once, drawing it afterwards is a single
+    paste of the cached bitmap. The size most recently used strings are
+    kept (LRU), strings drawn only once (chip names) can skip the cache.
+    """
+    def __init__(self, font, size=DEFAULT_TEXT_CACHE_SIZE):
+        if size < 0:
+            raise ValueError('Cache size must be positive')
+        self._font = font
+        self._size = size
+        self._metrics = OrderedDict()
+        self._bitmaps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def font(self):
+        return self._font
+
+    def _get_bbox(self, text):
+        try:
+            return self._font.getbbox(text)
+        except AttributeError:
+            # Bitmap fonts (load_default) are drawn at the text position
+            width, height = self._font.getsize(text)
+            return (0, 0, width, height)
+
+    def _add(self, entries, text, value):
+        entries[text] = value
+        if len(entries) > self._size:
+            entries.popitem(last=False)
+
+    def textsize(self, text, cache=True):
+        size = self._metrics.get(text)
+        if size is not None:
+            self._metrics.move_to_end(text)
+            return size
+        scratch = ImageDraw.Draw(Image.new(mode='1', size=(1, 1)))
+        size = scratch.textsize(text, font=self._font)
+        if cache:
+            self._add(self._metrics, text, size)
+        return size
+
+    def get_bitmap(self, text, cache=True):
+        """Returns (bitmap, (x, y) offset from the text position).
+
+        bitmap is a mode '1' mask of the text pixels, None for empty text.
+        """
+        cached = self._bitmaps.get(text)
+        if cached:
+            self._bitmaps.move_to_end(text)
+            self.hits += 1
+            return cached
+        if not cache:
+            return self._render(text)
+
+        self.misses += 1
+        cached = self._render(text)
+        self._add(self._bitmaps, text, cached)
+        return cached
+
+    def _render(self, text):
+        left, top, right, bottom = self._get_bbox(text)
+        bitmap = None
+        offset = (0, 0)
+        if right > left and bottom > top:
+            # Some glyphs (e.g. cedilla) rasterize slightly outside getbbox(),
+            # draw with a margin and crop to the actual pixels
+            margin = (bottom - top) // 2 + 2
+            canvas = Image.new(mode='1', color=0,
+                size=(right - left + 2*margin, bottom - top + 2*margin))
+            origin = (margin - left, margin - top)
+            ImageDraw.Draw(canvas).text(origin, text, font=self._font, fill=1)
+            box = canvas.getbbox()
+            if box:
+                bitmap = canvas.crop(box)
+                offset = (box[0] - origin[0], box[1] - origin[1])
+        return (bitmap, offset)
+
+    def draw_text(self, image, xy, text, fill=0, cache=True):
+        """Same as ImageDraw.text(xy, text, fill) on a mode '1' image"""
+        bitmap, (x, y) = self.get_bitmap(text, cache)
+        if bitmap:
+            image.paste(fill, box=(xy[0]+x, xy[1]+y), mask=bitmap)
+
+    def __len__(self):
+        return len(self._bitmaps)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def __str__(self):
+        return f'{self.hits} hits, {self.misses} misses'
+
+MAX_TEXT_CACHES = 32 # font settings kept, least recently used first out
+
+# Caches are shared by all printers using the same font settings
+_text_caches = OrderedDict()
+_lock = threading.Lock()
+
+def get_text_cache(key, font):
+    """Returns the shared TextCache for key (font settings), using font if it's a new one"""
+    with _lock:
+        cache = _text_caches.get(key)
+        if cache is None:
+            log.debug('New text cache: %s', key)
+            cache = TextCache(font)
+            _text_caches[key] = cache
+            if len(_text_caches) > MAX_TEXT_CACHES:
+                _text_caches.popitem(last=False)
+        else:
+            _text_caches.move_to_end(key)
+        return cache
+
+def get_text_cache_stats():
+    with _lock:
+        caches = list(_text_caches.values())
+    return {
+        'caches': len(caches),
+        'strings': sum(len(cache) for cache in caches),
+        'hits': sum(cache.hits for cache in caches),
+        'misses': sum(cache.misses for cache in caches),
+    }
+
+def clear_text_caches():
+    with _lock:
+        _text_caches.clear()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# tiff_writer.py
+#
+# CCITT group 4 (T.6) tiff encoder for 1-bit images, written from the
+# packed rows of bands so it needs neither libtiff nor a full page image.
+# G4 codes each row from the positions where the color changes, relative
+# to the row above: mostly white labels compress to a few bytes per row.
+#
+import struct
+
+WHITE, BLACK = 0, 1
+
+# T.4 terminating (0-63) and makeup (64-1728) codes, white then black
+_TERMINATING = (
+    ('00110101', '000111', '0111', '1000', '1011', '1100', '1110', '1111',
+    '10011', '10100', '00111', '01000', '001000', '000011', '110100', '110101',
+    '101010', '101011', '0100111', '0001100', '0001000', '0010111', '0000011', '0000100',
+    '0101000', '0101011', '0010011', '0100100', '0011000', '00000010', '00000011', '00011010',
+    '00011011', '00010010', '00010011', '00010100', '00010101', '00010110', '00010111', '00101000',
+    '00101001', '00101010', '00101011', '00101100', '00101101', '00000100', '00000101', '00001010',
+    '00001011', '01010010', '01010011', '01010100', '01010101', '00100100', '00100101', '01011000',
+    '01011001', '01011010', '01011011', '01001010', '01001011', '00110010', '00110011', '00110100'),
+    ('0000110111', '010', '11', '10', '011', '0011', '0010', '00011',
+    '000101', '000100', '0000100', '0000101', '0000111', '00000100', '00000111', '000011000',
+    '0000010111', '0000011000', '0000001000', '00001100111', '00001101000', '00001101100', '00000110111', '00000101000',
+    '00000010111', '00000011000', '000011001010', '000011001011', '000011001100', '000011001101', '000001101000', '000001101001',
+    '000001101010', '000001101011', '000011010010', '000011010011', '000011010100', '000011010101', '000011010110', '000011010111',
+    '000001101100', '000001101101', '000011011010', '000011011011', '000001010100', '000001010101', '000001010110', '000001010111',
+    '000001100100', '000001100101', '000001010010', '000001010011', '000000100100', '000000110111', '000000111000', '000000100111',
+    '000000101000', '000001011000', '000001011001', '000000101011', '000000101100', '000001011010', '000001100110', '000001100111'),
+)
+_MAKEUP = (
+    ('11011', '10010', '010111', '0110111', '00110110', '00110111', '01100100', '01100101',
+    '01101000', '01100111', '011001100', '011001101', '011010010', '011010011', '011010100', '011010101',
+    '011010110', '011010111', '011011000', '011011001', '011011010', '011011011', '010011000', '010011001',
+    '010011010', '011000', '010011011'),
+    ('0000001111', '000011001000', '000011001001', '000001011011', '000000110011', '000000110100', '000000110101', '0000001101100',
+    '0000001101101', '0000001001010', '0000001001011', '0000001001100', '0000001001101', '0000001110010', '0000001110011', '0000001110100',
+    '0000001110101', '0000001110110', '0000001110111', '0000001010010', '0000001010011', '0000001010100', '0000001010101', '0000001011010',
+    '0000001011011', '0000001100100', '0000001100101'),
+)
+# Extended makeup codes (1792-2560), the same for both colors
+_EXTENDED_MAKEUP = ('00000001000', '00000001100', '00000001101', '000000010010', '000000010011',
+    '000000010100', '000000010101', '000000010110', '000000010111', '000000011100',
+    '000000011101', '000000011110', '000000011111')
+
+PASS = '0001'
+HORIZONTAL = '001'
+# Vertical mode codes, by a1 - b1
+VERTICAL = {0: '1', 1: '011', 2: '000011', 3: '0000011', -1: '010', -2: '000010', -3: '0000010'}
+EOFB = '000000000001' * 2
+
+MAX_MAKEUP = 2560
+
+def _run_code(length, color):
+    """Code of a run of length pixels of color"""
+    codes = []
+    while length > MAX_MAKEUP:
+        codes.append(_EXTENDED_MAKEUP[-1])
+        length -= MAX_MAKEUP
+    if length >= 64:
+        makeup = length // 64
+        codes.append(_MAKEUP[color][makeup - 1] if makeup <= 27 else _EXTENDED_MAKEUP[makeup - 28])
+        length -= makeup * 64
+    codes.append(_TERMINATING[color][length])
+    return ''.join(codes)
+
+def _changes(row, width, padding):
+    """Positions where the color of a row of mode '1' data changes, the
+    pixel before the first one is white. Ends with width 3 times, for the
+    lookups past the last change"""
+    # 1 for black pixels, the padding bits are cleared
+    black = ~int.from_bytes(row, 'big') & ((1 << len(row) * 8) - 1)
+    black >>= padding
+    # Bit of a pixel xor bit of the previous pixel, position 0 is the
+    # most significant bit
+    changed = black ^ (black >> 1)
+    changes = []
+    while changed:
+        bit = changed.bit_length() - 1
+        changes.append(width - 1 - bit)
+        changed ^= 1 << bit
+    changes.extend((width, width, width))
+    return changes
+
+class G4Encoder:
+    """Encodes rows of mode '1' data (packed, 1 is white) with CCITT group 4"""
+    def __init__(self, width):
+        self._width = width
+        self._stride = (width + 7) // 8
+        self._padding = self._stride * 8 - width
+        # Imaginary white row above the first row
+        self._reference = [width, width, width]
+        self._reference_row = b'\xff' * self._stride
+        self._bits = ''
+        self._data = []
+
+    def _encode_row(self, changes):
+        width = self._width
+        reference = self._reference
+        codes = []
+        a0 = -1
+        color = WHITE
+        index = 0 # changes[index] is a1, the first change after a0
+        ref_index = 0
+        while a0 < width:
+            # b1: first change of the reference row after a0 to the opposite
+            # color of a0, changes to black have even indexes. b1 moves
+            # forward with a0 but can be the change before the last b1
+            ref_index = max(ref_index - 1, 0)
+            while reference[ref_index] <= a0:
+                ref_index += 1
+            if (ref_index & 1) != color:
+                ref_index += 1
+            b1 = reference[ref_index]
+            b2 = reference[ref_index + 1]
+            a1 = changes[index]
+
+            if b2 < a1:
+                codes.append(PASS)
+                a0 = b2
+            elif -3 <= a1 - b1 <= 3:
+                codes.append(VERTICAL[a1 - b1])
+                a0 = a1
+                color = 1 - color
+                index += 1
+            else:
+                a2 = changes[index + 1]
+                codes.append(HORIZONTAL)
+                codes.append(_run_code(a1 - a0 if a0 > 0 else a1, color))
+                codes.append(_run_code(a2 - a1, 1 - color))
+                a0 = a2
+                index += 2
+        self._reference = changes
+        return codes
+
+    def encode(self, data):
+        """Encode the rows of data, a multiple of the row size"""
+        stride = self._stride
+        codes = [self._bits]
+        for offset in range(0, len(data), stride):
+            row = data[offset:offset + stride]
+            if row == self._reference_row:
+                # Same changes as the row above: a V0 per change, and one for the end
+                codes.append('1' * (len(self._reference) - 2))
+                continue
+            codes.extend(self._encode_row(_changes(row, self._width, self._padding)))
+            self._reference_row = row
+        bits = ''.join(codes)
+        whole = len(bits) - len(bits) % 8
+        self._bits = bits[whole:]
+        if whole:
+            self._data.append(int(bits[:whole], 2).to_bytes(whole // 8, 'big'))
+
+    def flush(self):
+        """End of the image, returns the encoded data"""
+        bits = self._bits + EOFB
+        bits += '0' * (-len(bits) % 8)
+        self._data.append(int(bits, 2).to_bytes(len(bits) // 8, 'big'))
+        self._bits = ''
+        data = b''.join(self._data)
+        self._data = []
+        return data
+
+# Tag, type (3: short, 4: long, 5: rational), value
+_SHORT, _LONG, _RATIONAL = 3, 4, 5
+
+def write_g4_tiff(stream, size, bands, dpi=None):
+    """Write a 1-bit G4 compressed tiff of size (width, height) to a binary stream.
+
+    bands is an iterable of mode '1' images (or objects with size and
+    tobytes()) of the full width, from top to bottom, whose heights add
+    up to the image height.
+    """
+    width, height = size
+    encoder = G4Encoder(width)
+    rows = 0
+    for band in bands:
+        if band.size[0] != width:
+            raise ValueError(f'Band width {band.size[0]} is not the image width {width}')
+        rows += band.size[1]
+        encoder.encode(band.tobytes())
+    if rows != height:
+        raise ValueError(f'Bands have {rows} rows instead of {height}')
+    data = encoder.flush()
+
+    # Header, strip, then the IFD and the resolution values it points to
+    ifd_offset = 8 + len(data) + len(data) % 2
+    tags = [
+        (256, _LONG, width),
+        (257, _LONG, height),
+        (258, _SHORT, 1), # bits per sample
+        (259, _SHORT, 4), # compression: CCITT group 4
+        (262, _SHORT, 0), # photometric: white is zero
+        (273, _LONG, 8), # strip offset
+        (277, _SHORT, 1), # samples per pixel
+        (278, _LONG, height), # rows per strip
+        (279, _LONG, len(data)), # strip byte count
+    ]
+    if dpi:
+        resolution_offset = ifd_offset + 2 + (len(tags) + 3) * 12 + 4
+        tags += [
+            (282, _RATIONAL, resolution_offset), # x resolution
+            (283, _RATIONAL, resolution_offset), # y resolution
+            (296, _SHORT, 2), # resolution unit: inch
+        ]
+    stream.write(b'II*\0' + struct.pack('<I', ifd_offset))
+    stream.write(data)
+    if len(data) % 2:
+        stream.write(b'\0')
+    stream.write(struct.pack('<H', len(tags)))
+    for tag, tag_type, value in tags:
+        value_format = '<HHIHH' if tag_type == _SHORT else '<HHII'
+        values = (value, 0) if tag_type == _SHORT else (value,)
+        stream.write(struct.pack(value_format, tag, tag_type, 1, *values))
+    stream.write(struct.pack('<I', 0))
+    if dpi:
+        stream.write(struct.pack('<II', round(dpi * 1000), 1000))
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# vector_printer.py
+#
+# SVG and PDF output: the label layout of ChipPrinter drawn with vector
+# primitives, in mm. Output size and render time don't depend on the dpi.
+#
+import io
+import logging
+from xml.sax.saxutils import escape, quoteattr
+from .args import VECTOR_FORMATS
+from .chip_grid_printer import PageLayout
+from .chip_printer import ChipPrinter
+from .page_file import PdfPageFile
+from .pdf import MM_TO_POINTS, PdfWriter, encode_text, format_number as _num
+from .profiler import phase
+
+log = logging.getLogger(__name__)
+
+# PDF text uses the standard Courier font (not embedded): glyph advance,
+# and baseline offset to center the capitals vertically, in em
+COURIER_ADVANCE = 0.6
+COURIER_CENTER = 0.3
+COURIER_OVERLINE = 0.68
+
+class LabelDrawing:
+    """Vector drawing of a label, in mm with y going down.
+
+    Items are ('rect', x, y, width, height),
+    ('notch', x, y0, y1) half circle on the left edge,
+    ('text', x, y, text, angle, anchor, overline) with y the vertical
+    center of the text, angle 0 or 90 (counterclockwise), anchor 'start'
+    or 'end', and overline a (start, end) character range or None.
+    """
+    def __init__(self, width, height, line_width, font_size):
+        self.width = width
+        self.height = height
+        self.line_width = line_width
+        self.font_size = font_size
+        self.items = []
+
+class VectorChipPrinter(ChipPrinter):
+    def __init__(self, **kwargs):
+        ChipPrinter.__init__(self, **kwargs)
+        if self.format not in VECTOR_FORMATS:
+            raise ValueError(f'Unsupported vector format: {self.format}')
+
+    @property
+    def format(self):
+        return self.config.get('format', 'svg')
+
+    @property
+    def font_family(self):
+        try:
+            family = self._font.getname()[0]
+        except AttributeError: # Bitmap font
+            return 'monospace'
+        return f"'{family}', monospace"
+
+    def _pixel_to_mm(self, pixels):
+        return pixels * 25.4 / self.dpi
+
+    def get_drawing(self, chip):
+        """Same layout as ChipPrinter._render_chip, without rasterizing"""
+        with phase('render', chip.scoped_id):
+            return self._get_drawing(chip)
+
+    def _get_drawing(self, chip):
+        self._chip = chip
+        # Unrotated label, the pins are drawn on the long sides
+        width = chip.row_spacing
+        height = len(chip) // 2 * chip.pin_spacing
+        line_width = self._pixel_to_mm(1)
+        padding = self._pixel_to_mm(self.config['padding'])
+        indent = self.config['indentSize']
+        drawing = LabelDrawing(height, width, line_width, self.config['fontSize'])
+        items = drawing.items
+
+        items.append(('rect', line_width/2, line_width/2, height - line_width, width - line_width))
+
+        # The label is rotated 90 degrees counterclockwise: unrotated (x, y)
+        # is (y, width - x) and the pin names go up
+        rows = len(chip) // 2
+        pin = 1
+        for col in range(2):
+            effective_col = 1-col if self.config['invert'] else col
+            for row in range(rows):
+                y = chip.pin_spacing * (row + 0.5)
+                if col == 1:
+                    y = height - y
+                pin_name, invert_range = self._get_pin_info(pin)
+                pin += 1
+                if effective_col == 0:
+                    items.append(('text', y, width - padding, pin_name, 90, 'start', invert_range))
+                else:
+                    items.append(('text', y, padding, pin_name, 90, 'end', invert_range))
+
+        items.append(('text', indent * 1.2, width / 2, chip.full_name, 0, 'start', None))
+        y0 = (width - indent) / 2
+        items.append(('notch', 0, y0, y0 + indent))
+        return drawing
+
+    def _page_data(self, width, height, page):
+        with phase('encode'):
+            return self._encode_page(width, height, page)
+
+    def _encode_page(self, width, height, page):
+        if self.format == 'svg':
+            return _to_svg(width, height, page, self.font_family).encode('utf8')
+        output = io.BytesIO()
+        with PdfWriter(output) as writer:
+            _add_pdf_page(writer, width, height, page)
+        return output.getvalue()
+
+    def print_chip(self, chip):
+        """Returns the label as svg or pdf data (bytes)"""
+        drawing = self.get_drawing(chip)
+        return self._page_data(drawing.width, drawing.height, [(drawing, 0, 0, False)])
+
+    def print_chip_to_file(self, chip, output_file):
+        data = self.print_chip(chip)
+        with open(output_file, 'wb') as vector_file:
+            vector_file.write(data)
+        log.info('Output saved to %s', output_file)
+
+class VectorGridPrinter(PageLayout, VectorChipPrinter):
+    """Pages of labels in svg or pdf, one file per page.
+
+    The layout is computed by the page packing method (in pixels at the
+    configured dpi, like the raster pages).
+    """
+    def _get_page_drawing(self, chip_list, placements):
+        drawings = {}
+        page = []
+        for placement in placements:
+            chip = chip_list[placement.index]
+            drawing = drawings.get(chip.scoped_id)
+            if drawing is None:
+                drawing = drawings[chip.scoped_id] = self.get_drawing(chip)
+            page.append((drawing, self._pixel_to_mm(placement.x),
+                self._pixel_to_mm(placement.y), placement.rotated))
+
+        width, height = (self._pixel_to_mm(size) for size in self.page_size_pixels)
+        if not self.config.get('page_nocrop', False) and page:
+            # Exact size of the labels, placements are rounded up to pixels
+            extents = [(x, y, x + drawing.height, y + drawing.width) if rotated
+                else (x, y, x + drawing.width, y + drawing.height) for drawing, x, y, rotated in page]
+            left = min(extent[0] for extent in extents)
+            top = min(extent[1] for extent in extents)
+            width = max(extent[2] for extent in extents) - left
+            height = max(extent[3] for extent in extents) - top
+            page = [(drawing, x - left, y - top, rotated) for drawing, x, y, rotated in page]
+        return width, height, page
+
+    def get_pages(self, chip_list):
+        """Returns the pages as a list of svg or pdf data (bytes)"""
+        chip_list = list(chip_list)
+        return [self._page_data(*self._get_page_drawing(chip_list, placements))
+            for placements in self.get_layout(chip_list)]
+
+    def print_chips(self, chip_list):
+        page_file_path = self._get_page_file_path()
+        if page_file_path:
+            return self._print_page_file(chip_list, page_file_path)
+
+        output_dir = self._get_output_dir()
+        pages = self.get_pages(chip_list)
+        for page_index, data in enumerate(pages):
+            output_file = f'{output_dir}page{page_index + 1}.{self.format}'
+            with open(output_file, 'wb') as vector_file:
+                vector_file.write(data)
+            log.info('Output saved to %s', output_file)
+        return len(pages)
+
+    def _print_page_file(self, chip_list, page_file_path):
+        """All the pages in a single pdf file, written one page at a time"""
+        if self.format != 'pdf' or not page_file_path.lower().endswith('.pdf'):
+            raise ValueError(f'Vector pages can only be written to a pdf page file: {page_file_path}')
+        chip_list = list(chip_list)
+        with PdfPageFile(page_file_path, self.dpi) as page_file:
+            for placements in self.get_layout(chip_list):
+                page = self._get_page_drawing(chip_list, placements)
+                with phase('encode'):
+                    _add_pdf_page(page_file.writer, *page)
+            page_count = page_file.page_count
+        log.info('Output saved to %s', page_file_path)
+        return page_count
+
+def _split_overline(text, overline):
+    if not overline:
+        return [(text, False)]
+    start, end = overline
+    return [part for part in [(text[:start], False), (text[start:end], True), (text[end:], False)]
+        if part[0]]
+
+def _svg_label(drawing):
+    stroke = f'fill="none" stroke="black" stroke-width="{_num(drawing.line_width)}"'
+    elements = []
+    for item in drawing.items:
+        kind = item[0]
+        if kind == 'rect':
+            _, x, y, width, height = item
+            elements.append(f'<rect x="{_num(x)}" y="{_num(y)}" '
+                f'width="{_num(width)}" height="{_num(height)}" {stroke}/>')
+        elif kind == 'notch':
+            _, x, y0, y1 = item
+            radius = (y1 - y0) / 2
+            elements.append(f'<path d="M{_num(x)} {_num(y0)}H{_num(x + radius)}'
+                f'A{_num(radius)} {_num(radius)} 0 0 1 {_num(x + radius)} {_num(y1)}H{_num(x)}" {stroke}/>')
+        elif kind == 'text':
+            _, x, y, text, angle, anchor, overline = item
+            transform = f'translate({_num(x)} {_num(y)})'
+            if angle:
+                transform += f' rotate({-angle})'
+            spans = ''.join(f'<tspan text-decoration="overline">{escape(part)}</tspan>' if over
+                else escape(part) for part, over in _split_overline(text, overline))
+            elements.append(f'<text transform="{transform}" text-anchor="{anchor}" '
+                f'dominant-baseline="central">{spans}</text>')
+    return elements
+
+def _to_svg(width, height, placements, font_family):
+    """svg document of width x height mm with the (drawing, x, y, rotated) placements"""
+    font_size = placements[0][0].font_size if placements else 1
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_num(width)}mm" height="{_num(height)}mm" '
+            f'viewBox="0 0 {_num(width)} {_num(height)}">',
+        f'<g font-family={quoteattr(font_family)} font-size="{_num(font_size)}" fill="black">',
+    ]
+    labels = {}
+    for drawing, x, y, rotated in placements:
+        elements = labels.get(id(drawing))
+        if elements is None:
+            elements = labels[id(drawing)] = _svg_label(drawing)
+        if rotated:
+            # Same as rotating the label image 90 degrees counterclockwise
+            transform = f'matrix(0 -1 1 0 {_num(x)} {_num(y + drawing.width)})'
+        else:
+            transform = f'translate({_num(x)} {_num(y)})'
+        lines.append(f'<g transform="{transform}">')
+        lines.extend(elements)
+        lines.append('</g>')
+    lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
+
+def _pdf_label(drawing):
+    """Content stream operators for a label, in mm with y going down"""
+    operators = [f'{_num(drawing.line_width)} w']
+    for item in drawing.items:
+        kind = item[0]
+        if kind == 'rect':
+            _, x, y, width, height = item
+            operators.append(f'{_num(x)} {_num(y)} {_num(width)} {_num(height)} re S')
+        elif kind == 'notch':
+            _, x, y0, y1 = item
+            radius = (y1 - y0) / 2
+            center = (y0 + y1) / 2
+            # Half circle with two bezier curves
+            k = radius * 0.5523
+            operators.append(f'{_num(x)} {_num(y0)} m {_num(x + radius)} {_num(y0)} l '
+                f'{_num(x + radius + k)} {_num(y0)} {_num(x + 2*radius)} {_num(center - k)} '
+                f'{_num(x + 2*radius)} {_num(center)} c '
+                f'{_num(x + 2*radius)} {_num(center + k)} {_num(x + radius + k)} {_num(y1)} '
+                f'{_num(x + radius)} {_num(y1)} c {_num(x)} {_num(y1)} l S')
+        elif kind == 'text':
+            _, x, y, text, angle, anchor, overline = item
+            size = drawing.font_size
+            advance = COURIER_ADVANCE * size
+            start = -advance * len(text) if anchor == 'end' else 0
+            # Flip back to y going up for the text, then rotate
+            matrix = f'1 0 0 -1 {_num(x)} {_num(y)} cm'
+            if angle:
+                matrix += ' 0 1 -1 0 0 0 cm'
+            operators.append(f'q {matrix} BT /F1 {_num(size)} Tf '
+                f'{_num(start)} {_num(-COURIER_CENTER * size)} Td '
+                + encode_text(text).decode('latin-1') + ' Tj ET')
+            if overline:
+                overline_y = _num((COURIER_OVERLINE - COURIER_CENTER) * size)
+                operators.append(f'{_num(start + overline[0] * advance)} {overline_y} m '
+                    f'{_num(start + overline[1] * advance)} {overline_y} l S')
+            operators.append('Q')
+    return '\n'.join(operators)
+
+def _add_pdf_page(writer, width, height, placements):
+    # User space in mm, origin at the top left and y going down
+    operators = [f'{_num(MM_TO_POINTS)} 0 0 {_num(-MM_TO_POINTS)} 0 {_num(height * MM_TO_POINTS)} cm']
+    labels = {}
+    for drawing, x, y, rotated in placements:
+        label = labels.get(id(drawing))
+        if label is None:
+            label = labels[id(drawing)] = _pdf_label(drawing)
+        if rotated:
+            matrix = f'0 -1 1 0 {_num(x)} {_num(y + drawing.width)}'
+        else:
+            matrix = f'1 0 0 1 {_num(x)} {_num(y)}'
+        operators.append(f'q {matrix} cm')
+        operators.append(label)
+        operators.append('Q')
+    content = '\n'.join(operators).encode('latin-1')
+    writer.add_page(width * MM_TO_POINTS, height * MM_TO_POINTS, content)
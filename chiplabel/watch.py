@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# watch.py
+#
+# --watch: the chip list and the printers stay loaded, the library files
+# are polled for changes and only the labels and pages of the chips that
+# changed are rendered again.
+#
+import logging
+import os
+import time
+from .args import VECTOR_FORMATS
+from .chip_list import ChipList
+
+log = logging.getLogger(__name__)
+
+class LibraryPoller:
+    """Library files of a path (file or directory) added, modified or
+    deleted since the last poll, from their mtime and size"""
+    def __init__(self, path):
+        self._path = path
+        self._stats = self._scan()
+
+    def _scan(self):
+        try:
+            files = ChipList._get_library_files(self._path)
+        except IOError:
+            files = []
+        stats = {}
+        for filename in files:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            stats[filename] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def poll(self):
+        stats = self._scan()
+        changed = sorted(filename for filename in stats.keys() | self._stats.keys()
+            if stats.get(filename) != self._stats.get(filename))
+        self._stats = stats
+        return changed
+
+class Watcher:
+    """Prints the labels (or pages) of the chips returned by get_chips again
+    when their library files change.
+
+    Labels are compared by output key (chip definition and render
+    settings): only the label files whose key changed are written. A page
+    depends on all its chips, pages are printed again if any chip
+    changed, the labels that didn't change come from the render cache.
+    """
+    def __init__(self, chip_list, args, get_chips):
+        self._chip_list = chip_list
+        self._args = args
+        self._get_chips = get_chips
+        self._poller = LibraryPoller(args.input)
+        output_dir = args.output
+        if output_dir[-1] not in ('/', '\\'):
+            output_dir = output_dir + '/'
+        self._output_dir = output_dir
+        self._printer = self._create_printer()
+        self._keys = self._get_keys(get_chips())
+
+    def _create_printer(self):
+        config = vars(self._args)
+        if self._args.format in VECTOR_FORMATS:
+            from .vector_printer import VectorChipPrinter, VectorGridPrinter
+            printer_class = VectorGridPrinter if self._args.page else VectorChipPrinter
+            return printer_class(**config)
+
+        from .chip_printer import ChipPrinter
+        from .chip_grid_printer import ChipGridPrinter
+        from .render_cache import RenderCache
+        cache_dir = os.path.join(self._args.cache, 'render') if self._args.cache else None
+        printer_class = ChipGridPrinter if self._args.page else ChipPrinter
+        return printer_class(render_cache=RenderCache(cache_dir=cache_dir), **config)
+
+    def _get_output_file(self, chip):
+        return f'{self._output_dir}{chip.unscoped_id}.{self._printer.format}'
+
+    def _get_keys(self, chips):
+        if self._args.page:
+            return [self._printer.get_output_key(chip) for chip in chips]
+        # Chips with the same unscoped id write the same file, the last one wins
+        return {self._get_output_file(chip): self._printer.get_output_key(chip) for chip in chips}
+
+    def poll(self):
+        """Reload the library files that changed, then print the labels or
+        pages that changed. Returns the number of files written"""
+        filenames = self._poller.poll()
+        if not filenames:
+            return 0
+        for filename in filenames:
+            changes = self._chip_list.reload_file(filename)
+            log.info('%s: %d added, %d changed, %d removed chips', os.path.basename(filename),
+                len(changes.added), len(changes.changed), len(changes.removed))
+
+        chips = self._get_chips()
+        if self._args.page:
+            return self._update_pages(chips)
+        return self._update_labels(chips)
+
+    def _update_labels(self, chips):
+        keys = self._get_keys(chips)
+        chip_files = {self._get_output_file(chip): chip for chip in chips}
+        changed = [output_file for output_file, key in keys.items() if self._keys.get(output_file) != key]
+        errors = 0
+        for output_file in changed:
+            try:
+                self._printer.print_chip_to_file(chip_files[output_file], output_file)
+            except Exception as err:
+                log.error('Unable to print [%s]: %s', output_file, err)
+                # Printed again on the next change
+                keys[output_file] = None
+                errors += 1
+
+        deleted = 0
+        if self._args.all:
+            # Labels of the chips that no longer exist
+            for output_file in self._keys.keys() - keys.keys():
+                try:
+                    os.remove(output_file)
+                    deleted += 1
+                    log.info('Deleted %s', output_file)
+                except OSError as err:
+                    log.warning('Unable to delete [%s]: %s', output_file, err)
+        self._keys = keys
+        log.info('%d labels updated, %d deleted', len(changed) - errors, deleted)
+        return len(changed) - errors
+
+    def _update_pages(self, chips):
+        keys = self._get_keys(chips)
+        if keys == self._keys:
+            log.info('Pages unchanged')
+            return 0
+        if hasattr(self._printer, 'reset'):
+            self._printer.reset()
+        page_count = self._printer.print_chips(chips)
+        # Printed again on the next change if print_chips failed
+        self._keys = keys
+        if not self._args.page_file:
+            self._remove_extra_pages(page_count)
+        log.info('%d pages updated', page_count)
+        return page_count
+
+    def _remove_extra_pages(self, page_count):
+        """Pages of a previous run with more pages"""
+        page = page_count + 1
+        while True:
+            page_file = f'{self._output_dir}page{page}.{self._printer.format}'
+            if not os.path.isfile(page_file):
+                break
+            os.remove(page_file)
+            log.info('Deleted %s', page_file)
+            page += 1
+
+    def run(self, interval, polls=None):
+        """Poll every interval seconds until interrupted (or polls times)"""
+        log.info('Watching %s for changes, press Ctrl+C to stop', self._args.input)
+        try:
+            while polls is None or polls > 0:
+                time.sleep(interval)
+                try:
+                    self.poll()
+                except Exception as err:
+                    # Output errors (disk full, file locked...) may go away
+                    log.error('Unable to update the output: %s', err)
+                if polls is not None:
+                    polls -= 1
+        except KeyboardInterrupt:
+            pass
@@ -34,6 +34,7 @@ setuptools.setup(
     ],
     python_requires = '>=3.6',
     install_requires = ['Pillow', 'PyYAML'],
+    extras_require = {'numpy': ['numpy']},
     setup_requires = ['pytest-runner'],
     tests_require = ['pytest'],
     entry_points = {
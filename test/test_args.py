@@ -27,6 +27,7 @@ def test_default_args():
     assert arg_list.page_size == [7.5, 10]
     assert arg_list.page_padding == 0.1
     assert arg_list.page_nocrop == False
+    assert arg_list.cache == None
 
 def test_args():
     arg_list = args.parse_args([
@@ -156,3 +157,156 @@ def test_mode(capsys):
         arg_list = args.parse_args(['-l', '-c', 'chip'])
     capture = capsys.readouterr()
     assert 'not allowed with argument' in capture.err
+
+def test_cache():
+    arg_list = args.parse_args(['-a', '--cache'])
+    assert arg_list.cache == args.DEFAULT_CACHE_DIR
+    assert arg_list.cache.endswith('chiplabel')
+
+    arg_list = args.parse_args(['-a', '--cache', 'cachedir'])
+    assert arg_list.cache == 'cachedir'
+
+def test_jobs(capsys):
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.jobs == 1
+
+    arg_list = args.parse_args(['-a', '-j', '0'])
+    assert arg_list.jobs == 0
+
+    arg_list = args.parse_args(['-a', '--jobs', '8'])
+    assert arg_list.jobs == 8
+
+    with pytest.raises(SystemExit):
+        arg_list = args.parse_args(['-a', '--jobs', '-1'])
+    capture = capsys.readouterr()
+    assert 'argument -j/--jobs: -1' in capture.err
+
+def test_page_packing(capsys):
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.page_packing == 'shelf'
+    assert arg_list.page_rotate == False
+
+    arg_list = args.parse_args(['-a', '--page_packing', 'maxrects', '--page_rotate'])
+    assert arg_list.page_packing == 'maxrects'
+    assert arg_list.page_rotate == True
+
+    with pytest.raises(SystemExit):
+        arg_list = args.parse_args(['-a', '--page_packing', 'bad'])
+    capture = capsys.readouterr()
+    assert 'argument --page_packing: invalid choice' in capture.err
+
+def test_serve():
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.serve == None
+
+    arg_list = args.parse_args(['--serve'])
+    assert arg_list.serve == args.DEFAULT_SERVE_ADDRESS
+
+    arg_list = args.parse_args(['--serve', 'unix:/tmp/chiplabel.sock'])
+    assert arg_list.serve == 'unix:/tmp/chiplabel.sock'
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['--serve', '-a'])
+
+def test_search():
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.search == None
+
+    arg_list = args.parse_args(['--search', 'shift', 'reg'])
+    assert arg_list.search == ['shift', 'reg']
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['--search', 'shift', '-a'])
+
+def test_profile():
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.profile == False
+    assert arg_list.profile_stats == None
+    assert arg_list.profile_trace == None
+
+    arg_list = args.parse_args(['-a', '--profile', '--profile_trace', 'trace.json'])
+    assert arg_list.profile == True
+    assert arg_list.profile_trace == 'trace.json'
+
+def test_incremental():
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.incremental == False
+
+    arg_list = args.parse_args(['-a', '--incremental'])
+    assert arg_list.incremental == True
+
+def test_watch(capsys):
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.watch == None
+
+    arg_list = args.parse_args(['-a', '--watch'])
+    assert arg_list.watch == args.DEFAULT_WATCH_INTERVAL
+
+    arg_list = args.parse_args(['-a', '--watch', '0.5'])
+    assert arg_list.watch == 0.5
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['-a', '--watch', '0'])
+    captured = capsys.readouterr()
+    assert 'is not a positive number' in captured.err
+
+def test_format():
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.format == 'png'
+
+    arg_list = args.parse_args(['-a', '--format', 'pdf'])
+    assert arg_list.format == 'pdf'
+
+    arg_list = args.parse_args(['-a', '--format', 'tiff'])
+    assert arg_list.format == 'tiff'
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['-a', '--format', 'gif'])
+
+def test_png_compress(capsys):
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.png_compress == args.DEFAULT_PNG_COMPRESS
+    assert arg_list.png_strategy == 'default'
+
+    arg_list = args.parse_args(['-a', '--png_compress', '1', '--png_strategy', 'rle'])
+    assert arg_list.png_compress == 1
+    assert arg_list.png_strategy == 'rle'
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['-a', '--png_compress', '10'])
+    with pytest.raises(SystemExit):
+        args.parse_args(['-a', '--png_strategy', 'paeth'])
+    captured = capsys.readouterr()
+    assert 'invalid choice' in captured.err
+
+def test_page_file():
+    arg_list = args.parse_args(['-a', '-p'])
+    assert arg_list.page_file == None
+
+    arg_list = args.parse_args(['-a', '-p', '--page_file', 'labels.TIFF'])
+    assert arg_list.page_file == 'labels.TIFF'
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['-a', '-p', '--page_file', 'labels.png'])
+
+def test_page_engine(capsys):
+    arg_list = args.parse_args(['-a'])
+    assert arg_list.page_engine == 'pil'
+
+    arg_list = args.parse_args(['-a', '--page_engine', 'numpy'])
+    assert arg_list.page_engine == 'numpy'
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['-a', '--page_engine', 'cairo'])
+    captured = capsys.readouterr()
+    assert 'invalid choice' in captured.err
+
+def test_page_memory():
+    arg_list = args.parse_args(['-a', '-p'])
+    assert arg_list.page_memory == args.DEFAULT_PAGE_MEMORY
+
+    arg_list = args.parse_args(['-a', '-p', '--page_memory', '0'])
+    assert arg_list.page_memory == 0
+
+    with pytest.raises(SystemExit):
+        args.parse_args(['-a', '-p', '--page_memory', '-1'])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# test_bilevel.py
+
+import io
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+from chiplabel.bilevel import encode_image, get_format, save_image, write_bands, write_pbm
+
+def _image(size):
+    image = Image.new('1', size, color=255)
+    draw = ImageDraw.Draw(image)
+    draw.line([(0, 0), (size[0]-1, size[1]-1)])
+    draw.rectangle([(5, 5), (30, 40)])
+    return image
+
+def _same(data, image):
+    result = Image.open(io.BytesIO(data))
+    assert result.size == image.size
+    assert ImageChops.difference(result.convert('1'), image).getbbox() == None
+    return result
+
+def test_get_format():
+    assert get_format('label.png') == 'png'
+    assert get_format('dir.x/label.PBM') == 'pbm'
+    assert get_format('page.tif') == 'tiff'
+    assert get_format('label.jpg') == None
+    assert get_format('label') == None
+
+def test_write_pbm():
+    image = _image((103, 57))
+    output = io.BytesIO()
+    write_pbm(output, image.size, [image.crop((0, 0, 103, 20)), image.crop((0, 20, 103, 57))])
+    assert output.getvalue().startswith(b'P4\n103 57\n')
+    assert len(output.getvalue()) == len(b'P4\n103 57\n') + 13 * 57
+    _same(output.getvalue(), image)
+
+    with pytest.raises(ValueError):
+        write_pbm(io.BytesIO(), (103, 58), [image])
+    with pytest.raises(ValueError):
+        write_bands(io.BytesIO(), 'bmp', image.size, [image])
+
+@pytest.mark.parametrize('strategy', ['default', 'filtered', 'huffman', 'rle', 'fixed'])
+def test_png_options(strategy):
+    image = _image((103, 57))
+    fast = encode_image(image, png_compress=1, png_strategy=strategy, dpi=300)
+    small = encode_image(image, png_compress=9, png_strategy=strategy, dpi=300)
+    assert _same(fast, image).info['dpi'] == pytest.approx((300, 300), abs=0.01)
+    _same(small, image)
+
+    # Band writer, same options
+    output = io.BytesIO()
+    write_bands(output, 'png', image.size, [image], png_compress=0, png_strategy=strategy)
+    _same(output.getvalue(), image)
+
+def test_formats():
+    image = _image((103, 57))
+    _same(encode_image(image, 'pbm'), image)
+    assert encode_image(image, 'tiff', dpi=300).startswith(b'II*\0')
+    assert encode_image(image, 'png') != encode_image(image, 'png', png_compress=0)
+    with pytest.raises(ValueError):
+        encode_image(image, 'bmp')
+
+def test_save_image(tmpdir):
+    image = _image((103, 57))
+    save_image(image, str(tmpdir.join('label.pbm')))
+    assert tmpdir.join('label.pbm').read_binary().startswith(b'P4')
+    save_image(image, str(tmpdir.join('label.tif')))
+    assert tmpdir.join('label.tif').read_binary().startswith(b'II*\0')
+    # Other formats are saved by Pillow
+    save_image(image, str(tmpdir.join('label.bmp')), dpi=300)
+    assert Image.open(str(tmpdir.join('label.bmp'))).format == 'BMP'
+    # The format argument wins over the extension
+    save_image(image, str(tmpdir.join('label.out')), 'png')
+    assert Image.open(str(tmpdir.join('label.out'))).format == 'PNG'
+
+    with pytest.raises(ValueError):
+        save_image(image, '')
+    with pytest.raises(ValueError):
+        save_image(image, str(tmpdir.join('label.notanimage')))
+
+    # No partial file
+    with pytest.raises(RuntimeError):
+        save_image(_BrokenImage(), str(tmpdir.join('broken.pbm')))
+    assert not tmpdir.join('broken.pbm').check()
+
+class _BrokenImage:
+    size = (10, 10)
+    def tobytes(self):
+        raise RuntimeError('broken')
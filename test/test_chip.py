@@ -207,16 +207,24 @@ def test_alias():
     assert alias.description == 'newdesc'
     assert a.description == 'adescription'
 
-    # This is a shallow copy so pins and config are shared
+    # This is a shallow copy so pins and config are shared.
+    # Pins are immutable, changing them only affects one chip
+    assert alias._pins is a._pins
     a[1] = 'newpin1'
     assert a[1] == 'newpin1'
-    assert alias[1] == 'newpin1'
+    assert alias[1] == '1'
 
     assert a.config['config_flag'] == 'flag'
     assert alias.config['config_flag'] == 'flag'
     alias.config['config_flag'] = 'newflag'
     assert a.config['config_flag'] == 'newflag'
 
+    # Spacings are the alias' own
+    assert alias.config is not a.config
+    alias.config['rowSpacing'] = 12
+    assert alias.row_spacing == 12
+    assert a.row_spacing == 6
+
 def test_good_set_pins():
     a = chip.Chip('chip', 4)
     assert len(a) == 4
@@ -296,3 +304,60 @@ def test_print_ASCII(capsys):
     assert '3 | 3' in captured.out
     assert 'P4 | 4' in captured.out
   
+
+def test_from_compiled():
+    a = chip.Chip.from_compiled('chip', 'lib', 'name', 'desc', ('1', '2', '3', '4'), rowSpacing=12)
+    assert a.id == 'lib/chip'
+    assert a.name == 'name'
+    assert a.description == 'desc'
+    assert len(a) == 4
+    assert a[4] == '4'
+    assert a.config['rowSpacing'] == 12
+    assert a.config['pinSpacing'] == 2.54
+
+def test_shared_pins():
+    # Only the chips created with the same pin_tuples share their pins
+    pin_tuples = {}
+    a = chip.Chip.from_compiled('a', 'lib', '', '', ['1', 2, '3', 4], pin_tuples=pin_tuples)
+    b = chip.Chip.from_compiled('b', 'lib', '', '', ('1', '2', '3', '4'), pin_tuples=pin_tuples)
+    assert a._pins is b._pins
+    assert isinstance(a._pins, tuple)
+    c = chip.Chip.from_compiled('c', 'lib', '', '', ('1', '2', '3', '4'))
+    assert c._pins == a._pins
+    assert c._pins is not a._pins
+
+    b[4] = 'P4'
+    assert a[4] == '4'
+    assert b[4] == 'P4'
+    assert a._pins is not b._pins
+    # Pins changed afterwards are not added to pin_tuples
+    assert len(pin_tuples) == 1
+
+def test_slots():
+    a = chip.Chip('chip', 4)
+    assert not hasattr(a, '__dict__')
+    with pytest.raises(AttributeError):
+        a.foo = 'bar'
+
+def test_config():
+    a = chip.Chip('chip', 4, rowSpacing=12, flag='flag')
+    assert a.row_spacing == 12
+    assert a.pin_spacing == 2.54
+    assert dict(a.config) == {'pinSpacing': 2.54, 'rowSpacing': 12, 'flag': 'flag'}
+    assert a.config is a.config
+    assert len(a.config) == 3
+    assert 'flag' in a.config
+    assert 'dpi' not in a.config
+    assert a.config.get('dpi', 300) == 300
+
+    a.config['rowSpacing'] = 6
+    assert a.row_spacing == 6
+    a.config['dpi'] = 600
+    assert a.config['dpi'] == 600
+    del a.config['dpi']
+    assert 'dpi' not in a.config
+    with pytest.raises(KeyError):
+        del a.config['rowSpacing']
+
+    b = chip.Chip('chip', 4)
+    assert dict(b.config) == {'pinSpacing': 2.54, 'rowSpacing': 6}
@@ -6,6 +6,7 @@ import pytest
 from PIL import Image
 from PIL import ImageChops
 from chiplabel import chip
+from chiplabel.args import PAGE_PACKING
 from chiplabel.chip_grid_printer import ChipGridPrinter
 
 CREATE_REFERENCES = False
@@ -229,6 +230,98 @@ def test_print_chips(tmpdir):
     assert tmpdir.join('page3.png').check(file=1)
     assert tmpdir.join('page4.png').check(file=1)
 
+@pytest.mark.parametrize('page_file', ['pages.tiff', 'pages.pdf'])
+def test_print_chips_page_file(tmpdir, page_file):
+    c = chip.Chip('id', 20, rowSpacing=25.4)
+    p = ChipGridPrinter(page_size=(2.2, 2.2), page_padding=0.1,
+        output=tmpdir, page_file=page_file)
+    p.print_chips([c]*15)
+    assert p.current_page == 4
+    assert tmpdir.join('page1.png').check(file=0)
+
+    if page_file.endswith('.tiff'):
+        image = Image.open(str(tmpdir.join(page_file)))
+        assert image.n_frames == 4
+        assert image.size == (630, 630)
+        image.seek(3)
+        assert image.size == (630, 630)
+    else:
+        with open(str(tmpdir.join(page_file)), 'rb') as pdf_file:
+            data = pdf_file.read()
+        assert data.count(b'/Type /Page ') == 4
+        # 630 pixels at 300 dpi
+        assert b'/MediaBox [0 0 151.2 151.2]' in data
+
+    # Back to a file per page
+    p.config['page_file'] = None
+    p.reset()
+    p.print_chips([c])
+    assert tmpdir.join('page1.png').check(file=1)
+
+@pytest.mark.parametrize('page_nocrop', [False, True])
+def test_print_chips_banded(tmpdir, page_nocrop):
+    chips = [chip.Chip('big', 20, rowSpacing=25.4)]*3 + [chip.Chip('small', 20, rowSpacing=6)]*5
+    settings = dict(page_size=(2.2, 2.2), page_padding=0.1, page_packing='maxrects',
+        page_nocrop=page_nocrop)
+
+    tmpdir.mkdir('full')
+    p = ChipGridPrinter(output=tmpdir.join('full'), page_memory=0, **settings)
+    p.print_chips(chips)
+    assert p.current_page == 2
+
+    # 660x660 page > 0.1 MB, bands of 158 rows
+    tmpdir.mkdir('banded')
+    p = ChipGridPrinter(output=tmpdir.join('banded'), page_memory=0.1, **settings)
+    assert p._needs_bands()
+    p.print_chips(chips)
+    assert p.current_page == 2
+    for page in ['page1.png', 'page2.png']:
+        full = Image.open(str(tmpdir.join('full', page)))
+        banded = Image.open(str(tmpdir.join('banded', page)))
+        assert banded.size == full.size
+        assert ImageChops.difference(banded.convert('1'), full.convert('1')).getbbox() == None
+
+    # Streamed to pbm files
+    tmpdir.mkdir('pbm')
+    p = ChipGridPrinter(output=tmpdir.join('pbm'), page_memory=0.1, format='pbm', **settings)
+    p.print_chips(chips)
+    for page in [1, 2]:
+        full = Image.open(str(tmpdir.join('full', f'page{page}.png')))
+        banded = Image.open(str(tmpdir.join('pbm', f'page{page}.pbm')))
+        assert ImageChops.difference(banded.convert('1'), full.convert('1')).getbbox() == None
+
+    # Streamed to a pdf page file
+    p = ChipGridPrinter(output=tmpdir, page_memory=0.1, page_file='pages.pdf', **settings)
+    p.print_chips(chips)
+    with open(str(tmpdir.join('pages.pdf')), 'rb') as pdf_file:
+        assert pdf_file.read().count(b'/Type /Page ') == 2
+
+@pytest.mark.parametrize('page_packing', PAGE_PACKING)
+def test_banded_same_layout(tmpdir, page_packing):
+    chips = ([chip.Chip('big', 20, rowSpacing=25.4)]*2 + [chip.Chip('wide', 28, rowSpacing=15.24)]*3 +
+        [chip.Chip('small', 8)]*9 + [chip.Chip('mid', 14)]*4)
+    settings = dict(page_size=(2.5, 2.5), page_padding=0.1, page_packing=page_packing)
+    page_count = None
+    for name, page_memory in [('full', 0), ('banded', 0.1)]:
+        tmpdir.mkdir(name)
+        p = ChipGridPrinter(output=tmpdir.join(name), page_memory=page_memory, **settings)
+        assert p._needs_bands() == bool(page_memory)
+        assert page_count in (None, p.print_chips(chips))
+        page_count = p.current_page
+    assert page_count > 1
+    for page in range(1, page_count + 1):
+        full = Image.open(str(tmpdir.join('full', f'page{page}.png')))
+        banded = Image.open(str(tmpdir.join('banded', f'page{page}.png')))
+        assert banded.size == full.size
+        assert ImageChops.difference(banded.convert('1'), full.convert('1')).getbbox() == None
+
+def test_lazy_page():
+    # The page image is allocated when needed
+    p = ChipGridPrinter(page_size=(20, 20), dpi=2000)
+    assert p._curr_page_image == None
+    assert p._needs_bands()
+    assert not ChipGridPrinter(page_size=(20, 20), dpi=2000, page_memory=0)._needs_bands()
+
 def test_output_dir():
     c = chip.Chip('id', 20)
     p = ChipGridPrinter(output='bad/dir')
@@ -264,3 +357,126 @@ def test_nocrop(tmpdir):
     assert p.page_size_pixels == (600, 600)
     assert p.page_padding_pixels == 30
     _crop(p, tmpdir, (600, 600))
+
+@pytest.mark.parametrize('method', ['skyline', 'maxrects', 'guillotine'])
+def test_print_chips_packed(tmpdir, method):
+    small = chip.Chip('small', 20, rowSpacing=6)
+    big = chip.Chip('big', 20, rowSpacing=25.4)
+
+    p = ChipGridPrinter(page_size=(2.2, 2.2),
+        page_padding=0.1, output=tmpdir, page_packing=method)
+    assert p.page_packing == method
+    assert p.page_rotate == False
+    assert p.get_label_size(small) == (300, 71)
+
+    layout = p.get_layout([big]*4 + [small]*4)
+    assert len(layout) == 2
+
+    p.print_chips([big]*4 + [small]*4)
+    assert p.current_page == 2
+    assert tmpdir.join('page1.png').check(file=1)
+    assert tmpdir.join('page2.png').check(file=1)
+    assert tmpdir.join('page3.png').check(file=0)
+
+def test_print_chips_rotate(tmpdir):
+    # Page is too narrow for the label unless rotated
+    c = chip.Chip('id', 8, rowSpacing=6)
+    p = ChipGridPrinter(page_size=(0.3, 1.5), output=tmpdir, page_nocrop=True,
+        page_packing='maxrects', page_rotate=True)
+    assert p.get_label_size(c) == (120, 71)
+    layout = p.get_layout([c]*2)
+    assert len(layout) == 1
+    assert all(placement.rotated for placement in layout[0])
+
+    p.print_chips([c]*2)
+    image = Image.open(str(tmpdir.join('page1.png')))
+    assert image.size == (90, 450)
+    # Label border
+    assert image.getpixel((0, 0)) == 0
+    assert image.getpixel((70, 119)) == 0
+
+def test_page_bbox():
+    c = chip.Chip('id', 20, rowSpacing=6)
+    p = ChipGridPrinter(page_size=(2, 2), page_padding=0.1)
+    assert p.page_bbox == None
+    p.print_to_page(c)
+    assert p.page_bbox == (0, 0, 300, 71)
+    p.print_to_page(c)
+    assert p.page_bbox == (0, 0, 300, 172) # Second row
+    # Clipped to the page
+    assert p.page_size_pixels == (600, 600)
+    p._paste_label(p.print_chip(c), (500, 550))
+    assert p.page_bbox == (0, 0, 600, 600)
+    p.new_page()
+    assert p.page_bbox == None
+
+@pytest.mark.parametrize('method', ['shelf', 'skyline', 'maxrects', 'guillotine'])
+def test_crop_packed(tmpdir, method):
+    chips = [chip.Chip('small', 8, rowSpacing=6), chip.Chip('big', 20, rowSpacing=25.4),
+        chip.Chip('wide', 16, rowSpacing=12)] * 2
+    for nocrop in (True, False):
+        output = tmpdir.mkdir(f'nocrop{nocrop}')
+        p = ChipGridPrinter(page_size=(2.5, 2.5), page_padding=0.1, output=output,
+            page_packing=method, page_nocrop=nocrop)
+        p.print_chips(chips)
+
+    page = Image.open(str(tmpdir.join('nocropTrue', 'page1.png')))
+    cropped = Image.open(str(tmpdir.join('nocropFalse', 'page1.png')))
+    assert page.size == (750, 750)
+    expected = page.crop(ImageChops.invert(page.convert('L')).getbbox())
+    assert cropped.size == expected.size
+    assert not ImageChops.difference(cropped.convert('L'), expected.convert('L')).getbbox()
+
+@pytest.mark.parametrize('method', ['shelf', 'maxrects'])
+def test_print_copies(tmpdir, monkeypatch, method):
+    c1 = chip.Chip('c1', 8, rowSpacing=6)
+    c2 = chip.Chip('c2', 8, rowSpacing=6)
+    p = ChipGridPrinter(page_size=(2, 2), output=tmpdir, page_packing=method)
+    rendered = []
+    render_chip = p._render_chip
+    def count_render(chip):
+        rendered.append(chip.id)
+        return render_chip(chip)
+    monkeypatch.setattr(p, '_render_chip', count_render)
+
+    p.print_chips([c1]*6 + [c2] + [c1]*2)
+    assert sorted(rendered) == ['c1', 'c2']
+    assert tmpdir.join('page1.png').check(file=1)
+
+@pytest.mark.parametrize('settings', [
+    dict(page_packing='shelf'),
+    dict(page_packing='maxrects', page_rotate=True),
+    dict(page_packing='maxrects', page_memory=0.01),
+    dict(page_packing='shelf', page_nocrop=True, page_file='pages.tiff'),
+])
+def test_numpy_engine(tmpdir, settings):
+    pytest.importorskip('numpy')
+    chips = [chip.Chip('big', 20, rowSpacing=25.4)]*3 + [chip.Chip('small', 14, rowSpacing=6)]*7
+    pages = {}
+    for engine in ('pil', 'numpy'):
+        output = tmpdir.mkdir(engine)
+        p = ChipGridPrinter(page_size=(2.2, 2.2), page_padding=0.1, output=output,
+            page_engine=engine, **settings)
+        pages[engine] = p.print_chips(chips)
+    assert pages['numpy'] == pages['pil'] == 2
+
+    for page in (['pages.tiff'] if 'page_file' in settings else ['page1.png', 'page2.png']):
+        expected = Image.open(str(tmpdir.join('pil', page)))
+        image = Image.open(str(tmpdir.join('numpy', page)))
+        for frame in range(getattr(expected, 'n_frames', 1)):
+            expected.seek(frame)
+            image.seek(frame)
+            assert image.size == expected.size
+            assert not ImageChops.difference(image.convert('L'), expected.convert('L')).getbbox()
+
+def test_numpy_engine_memory():
+    pytest.importorskip('numpy')
+    # 4500x6000 pixels: bands of a byte per pixel, a packed page is 3.4 MB
+    assert ChipGridPrinter(page_size=(15, 20), page_memory=4)._needs_bands()
+    assert not ChipGridPrinter(page_size=(15, 20), page_memory=4, page_engine='numpy')._needs_bands()
+
+def test_numpy_engine_missing(monkeypatch, caplog):
+    monkeypatch.setattr('chiplabel.packed_page.numpy', None)
+    p = ChipGridPrinter(page_engine='numpy')
+    assert p.page_engine == 'pil'
+    assert 'numpy is not installed' in caplog.text
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 # test_chip_grid_printer.py
 
+import io
+import os
+import subprocess
+import sys
 import pkg_resources
 import pytest
 from chiplabel import chip_label
@@ -112,6 +116,122 @@ def test_chip_multi_from_file(tmpdir, capsys):
     assert tmpdir.join('555.png').check(file=1)
     assert tmpdir.join('TestChip.png').check(file=0)
 
+def test_search(capsys):
+    args = ['', '--search', 'tim', '-i', f'{TEST_DIR}/chip2.yaml']
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert captured.out == 'chip2/555                Timer\n'
+
+    args = ['', '--search', 'my', 'p4', '-i', TEST_DIR]
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert captured.out == 'chip2/TestChip           myDescription\n'
+
+    args = ['', '--search', 'qwerty', '-i', TEST_DIR]
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert captured.out == ''
+    assert 'No chip found for [qwerty]' in captured.err
+
+    args = ['', '-c', '5555', '-i', f'{TEST_DIR}/chip1.yaml', '-t']
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'Chip not found: 5555, skipping. Did you mean: 555?' in captured.err
+
+    # Family alias and typo in the default library
+    chip_label.main(['', '--search', '74HC59'])
+    assert '7400/74HC595' in capsys.readouterr().out
+    chip_label.main(['', '--search', 'Z8O'])
+    assert 'cpu/Z80' in capsys.readouterr().out
+
+def test_profile(tmpdir, capsys):
+    args = ['', '-a', '-p',
+        '-i', f'{TEST_DIR}',
+        '-o', str(tmpdir),
+        '--page_packing', 'maxrects',
+        '--profile']
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'ERROR' not in captured.err
+    report = captured.err.split('Phase ', 1)[1].splitlines()
+    phases = [line.split()[0] for line in report[1:] if line and not line.startswith('Wall')]
+    for name in ('yaml', 'load', 'font', 'measure', 'draw', 'rotate', 'render', 'layout', 'paste', 'crop', 'encode'):
+        assert name in phases
+    assert tmpdir.join('page1.png').check(file=1)
+
+    # Implied by a trace or stats file
+    trace_file = tmpdir.join('trace.json')
+    stats_file = tmpdir.join('stats.pstats')
+    args = ['', '-c', '555', '-i', f'{TEST_DIR}/chip1.yaml', '-o', str(tmpdir),
+        '--profile_trace', str(trace_file), '--profile_stats', str(stats_file)]
+    chip_label.main(args)
+    assert 'Wall time' in capsys.readouterr().err
+    assert trace_file.check(file=1)
+    assert stats_file.check(file=1)
+
+    # Not profiled
+    chip_label.main(['', '-c', '555', '-i', f'{TEST_DIR}/chip1.yaml', '-o', str(tmpdir)])
+    assert 'Wall time' not in capsys.readouterr().err
+
+def test_incremental(tmpdir, capsys):
+    library = tmpdir.mkdir('library')
+    library.join('chip2.yaml').write(open(f'{TEST_DIR}/chip2.yaml').read())
+    output = tmpdir.mkdir('output')
+    args = ['', '-a', '-i', str(library), '-o', str(output), '--incremental', '-v']
+
+    chip_label.main(args)
+    assert 'Incremental: 0 labels up to date, 2 to render, 0 deleted' in capsys.readouterr().err
+    assert output.join('chiplabel-manifest.json').check(file=1)
+
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'Incremental: 2 labels up to date, 0 to render, 0 deleted' in captured.err
+    assert 'Output saved' not in captured.err
+
+    # Changed chip and render settings
+    library.join('chip2.yaml').write(open(f'{TEST_DIR}/chip2.yaml').read().replace('myDescription', 'changed'))
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'Incremental: 1 labels up to date, 1 to render, 0 deleted' in captured.err
+    assert 'TestChip.png' in captured.err
+    chip_label.main(args + ['--invert', '-j', '2'])
+    assert '0 labels up to date, 2 to render' in capsys.readouterr().err
+    chip_label.main(args + ['--invert', '--writers', '2'])
+    assert '2 labels up to date, 0 to render' in capsys.readouterr().err
+
+    # Removed chips are deleted with -a only
+    library.join('chip2.yaml').write('555:\n  pins: [A, B, C, D]\n')
+    chip_label.main(['', '-c', '555', '-i', str(library), '-o', str(output), '--incremental', '-v'])
+    assert '0 labels up to date, 1 to render, 0 deleted' in capsys.readouterr().err
+    assert output.join('TestChip.png').check(file=1)
+    chip_label.main(args)
+    assert '1 labels up to date, 0 to render, 1 deleted' in capsys.readouterr().err
+    assert output.join('TestChip.png').check(file=0)
+    assert output.join('555.png').check(file=1)
+
+    # Vector labels
+    chip_label.main(args + ['--format', 'svg'])
+    assert '0 labels up to date, 1 to render, 1 deleted' in capsys.readouterr().err
+    assert output.join('555.svg').check(file=1)
+    assert output.join('555.png').check(file=0)
+    chip_label.main(args + ['--format', 'svg'])
+    assert '1 labels up to date, 0 to render' in capsys.readouterr().err
+
+    chip_label.main(args + ['-p'])
+    assert '--incremental is ignored in page mode' in capsys.readouterr().err
+
+def test_watch(tmpdir, capsys, caplog, monkeypatch):
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+    monkeypatch.setattr('chiplabel.watch.time.sleep', interrupt)
+    output = tmpdir.mkdir('output')
+    chip_label.main(['', '-c', '555', '-i', TEST_DIR, '-o', str(output), '--watch', '-v'])
+    assert output.join('555.png').check(file=1)
+    assert 'Watching' in capsys.readouterr().err
+
+    chip_label.main(['', '-c', '555', '-i', TEST_DIR, '-t', '--watch'])
+    assert '--watch is ignored with text output' in caplog.text
+
 def test_text_output(capsys):
     args = ['', '-t', '-c', '444', '555']
     chip_label.main(args)
@@ -121,6 +241,29 @@ def test_text_output(capsys):
     assert '555' in captured.out
     assert '444' not in captured.out
 
+@pytest.mark.parametrize('image_format', ['pbm', 'tiff'])
+def test_bitmap_formats(tmpdir, capsys, image_format):
+    args = ['', '-a', '--format', image_format, '--dpi', '300',
+        '-i', f'{TEST_DIR}',
+        '-o', str(tmpdir)]
+    chip_label.main(args)
+    chip_label.main(args + ['-p'])
+    captured = capsys.readouterr()
+    assert 'ERROR' not in captured.err
+    assert tmpdir.join(f'555.{image_format}').check(file=1)
+    assert tmpdir.join(f'page1.{image_format}').check(file=1)
+    assert not tmpdir.join('555.png').check()
+
+def test_png_compress(tmpdir, capsys):
+    sizes = []
+    for level in ['0', '9']:
+        output_dir = tmpdir.mkdir(level)
+        chip_label.main(['', '-c', '555', '--png_compress', level, '--png_strategy', 'rle',
+            '-i', f'{TEST_DIR}', '-o', str(output_dir)])
+        sizes.append(output_dir.join('555.png').size())
+    assert 'ERROR' not in capsys.readouterr().err
+    assert sizes[1] < sizes[0]
+
 def test_all_page_from_directory(tmpdir, capsys):
     args = ['', '-a', '-p',
         '-i', f'{TEST_DIR}',
@@ -137,3 +280,127 @@ def test_verbose(capsys):
     assert 'Found 1 chips' in captured.err
     assert 'Printing 1 chips to text' in captured.err
     assert '555 Timer' in captured.out
+
+def test_render_cache(tmpdir, capsys):
+    cache_dir = tmpdir.mkdir('cache')
+    out_dir = tmpdir.mkdir('out')
+    args = ['', '-v', '-c', '555', '555',
+        '-i', f'{TEST_DIR}/chip1.yaml',
+        '-o', str(out_dir),
+        '--cache', str(cache_dir)]
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'ERROR' not in captured.err
+    # Repeated chips are rendered once
+    assert 'Render cache: 0 hits (0 from disk), 1 misses' in captured.err
+    assert out_dir.join('555.png').check(file=1)
+    assert len(cache_dir.join('render').listdir()) == 1
+
+    # Second run is served from disk
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'Render cache: 1 hits (1 from disk), 0 misses' in captured.err
+
+def test_jobs(tmpdir, capsys):
+    args = ['', '-a', '-j', '2',
+        '-i', f'{TEST_DIR}',
+        '-o', str(tmpdir)]
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'ERROR' not in captured.err
+
+    assert tmpdir.join('555.png').check(file=1)
+    assert tmpdir.join('TestChip.png').check(file=1)
+
+def test_writers(tmpdir, capsys):
+    args = ['', '-a', '--writers', '2',
+        '-i', f'{TEST_DIR}',
+        '-o', str(tmpdir)]
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'ERROR' not in captured.err
+
+    assert tmpdir.join('555.png').check(file=1)
+    assert tmpdir.join('TestChip.png').check(file=1)
+
+def _imported_modules(args, modules):
+    # Fresh interpreter, the test session already imported everything
+    code = ('import sys; from chiplabel import chip_label; chip_label.main(sys.argv); '
+        f'print([name for name in {modules!r} if name in sys.modules])')
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code, *args], cwd=root_dir,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    return result.stdout.splitlines()[-1]
+
+def test_lazy_imports(tmpdir):
+    modules = ['PIL', 'pkg_resources']
+    assert _imported_modules(['--version'], modules + ['yaml']) == '[]'
+    assert _imported_modules(['-l', '-i', TEST_DIR], modules) == '[]'
+    assert _imported_modules(['-t', '-c', '555', '-i', TEST_DIR], modules) == '[]'
+    assert _imported_modules(['-c', '555', '-i', TEST_DIR, '-o', str(tmpdir)], modules) == "['PIL']"
+
+def test_index(tmpdir, capsys):
+    cache_dir = tmpdir.join('cache')
+    args = ['', '-t', '-c', 'TestChip', '-v',
+        '-i', f'{TEST_DIR}',
+        '--cache', str(cache_dir)]
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'chip1.yaml' in captured.err
+
+    # Only the file with the chip is loaded
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'chip1.yaml' not in captured.err
+    assert 'Loaded 2 chips from' in captured.err
+    assert 'myName myDescription' in captured.out
+
+    chip_label.main(['', '-l', '-i', f'{TEST_DIR}', '--cache', str(cache_dir)])
+    captured = capsys.readouterr()
+    assert 'chip2/TestChip\n' in captured.out
+
+def test_parse_chip_specs():
+    assert chip_label._parse_chip_specs(['555', '7400', '555']) == [('555', 2), ('7400', 1)]
+    assert chip_label._parse_chip_specs(['74LS173 x8', '555 2', '4011 X3', '7400 *2']) == \
+        [('74LS173', 8), ('555', 2), ('4011', 3), ('7400', 2)]
+    # csv, header and extra columns
+    assert chip_label._parse_chip_specs(['id,qty', '74LS173,8', '555, 2, U1 U2', '7400,']) == \
+        [('74LS173', 8), ('555', 2), ('7400', 1)]
+    assert chip_label._parse_chip_specs(['', '  # comment', ' 555 ']) == [('555', 1)]
+
+def test_parse_chip_specs_invalid(caplog):
+    assert chip_label._parse_chip_specs(['555 x0', '7400 many', '4011']) == [('4011', 1)]
+    assert 'Invalid quantity for chip 555: [x0]' in caplog.text
+    assert 'Invalid quantity for chip 7400: [many]' in caplog.text
+
+def test_parse_chip_specs_arguments(caplog):
+    # -c 74LS173 x8, the quantity is a separate argument
+    assert chip_label._parse_chip_specs(['74LS173', 'x8', '555', '*2', '4011']) == \
+        [('74LS173', 8), ('555', 2), ('4011', 1)]
+    assert chip_label._parse_chip_specs(['555', '555', 'x3']) == [('555', 4)]
+    # Bare numbers are chip ids
+    assert chip_label._parse_chip_specs(['555', '4011']) == [('555', 1), ('4011', 1)]
+    assert not caplog.text
+
+    assert chip_label._parse_chip_specs(['x8', '555 x2', 'x3', '4011', 'x0']) == [('555', 2)]
+    assert "Quantity [x8] without a chip id, skipping. Use 'id x8' or 'id,8'" in caplog.text
+    assert 'Quantity [x3] without a chip id' in caplog.text
+    assert 'Invalid quantity for chip 4011: [x0]' in caplog.text
+
+def test_text_quantity(capsys):
+    chip_label.main(['', '-t', '-c', '555', 'x3'])
+    captured = capsys.readouterr()
+    assert captured.out.count('555') == 1
+    assert 'Chip not found' not in captured.err
+
+def test_chip_stdin(tmpdir, capsys, monkeypatch):
+    monkeypatch.setattr('sys.stdin', io.StringIO('555 x3\nTestChip,2\n'))
+    args = ['', '-v', '-p', '-c', '-',
+        '-i', f'{TEST_DIR}/chip2.yaml',
+        '-o', str(tmpdir)]
+    chip_label.main(args)
+    captured = capsys.readouterr()
+    assert 'ERROR' not in captured.err
+    assert 'Found 5 chips' in captured.err
+    assert 'Render cache: 0 hits (0 from disk), 2 misses' in captured.err
+    assert tmpdir.join('page1.png').check(file=1)
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 # test_chip_list.py
 
+import logging
+import pickle
 import pkg_resources
 import pytest
 from chiplabel import chip
+from chiplabel import family
 from chiplabel.chip_list import ChipList
 
 TEST_DATA_DIR = pkg_resources.resource_filename('test', 'data')
@@ -178,3 +181,337 @@ def test_bad_dup(caplog):
     assert len(chip_list.global_names) == 2
     chip = chip_list['555']
     assert chip.name == 'dup'
+
+def _compiled_files(cache_dir):
+    return [path for path in cache_dir.listdir() if not path.basename.startswith('index-')]
+
+def test_cache(tmpdir, monkeypatch, caplog):
+    cache_dir = tmpdir.join('cache')
+    chip_list = ChipList(cache_dir=str(cache_dir))
+    chip_list.load(f'{TEST_DATA_DIR}')
+    assert len(_compiled_files(cache_dir)) == 3
+
+    # Warm load doesn't parse yaml
+    def no_yaml(*args, **kwargs):
+        pytest.fail('yaml parser called')
+    monkeypatch.setattr(ChipList, '_read_yaml', no_yaml)
+    monkeypatch.setattr(chip.Chip, '__init__', no_yaml)
+
+    warm_list = ChipList(cache_dir=str(cache_dir))
+    warm_list.load(f'{TEST_DATA_DIR}')
+    assert warm_list.names == chip_list.names
+    assert warm_list.global_names == chip_list.global_names
+
+    test_chip = warm_list['TestChip']
+    assert test_chip.id == 'chip2/TestChip'
+    assert test_chip.name == 'myName'
+    assert test_chip.description == 'myDescription'
+    assert test_chip.config['rowSpacing'] == 12
+    assert [pin for pin in test_chip] == ['P1', 'P2', 'P3', 'P4']
+
+def test_cache_invalidate(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    chip_file = tmpdir.join('lib.yaml')
+    chip_file.write('555:\n  pins: [A, B, C, D]\n')
+
+    chip_list = ChipList(cache_dir=str(cache_dir))
+    chip_list.load(str(chip_file))
+    assert chip_list['555'][1] == 'A'
+
+    # Same size and mtime, different content
+    stat = chip_file.stat()
+    chip_file.write('555:\n  pins: [E, F, G, H]\n')
+    chip_file.setmtime(stat.mtime)
+
+    chip_list = ChipList(cache_dir=str(cache_dir))
+    chip_list.load(str(chip_file))
+    assert chip_list['555'][1] == 'E'
+    assert len(_compiled_files(cache_dir)) == 1
+
+def test_cache_messages(tmpdir, caplog):
+    # Warnings are replayed when loading from the cache
+    cache_dir = tmpdir.join('cache')
+    for n in range(2):
+        chip_list = ChipList(cache_dir=str(cache_dir))
+        chip_list.load(f'{TEST_DATA_DIR}/bad/bad_type.yaml')
+        assert len(chip_list) == 2
+        assert 'Unknown type attribute' in caplog.text
+        caplog.clear()
+
+        chip_list = ChipList(cache_dir=str(cache_dir))
+        chip_list.load(f'{TEST_DATA_DIR}/bad/bad_chip.yaml')
+        assert len(chip_list) == 1
+        assert 'Error adding chip [bad_chip/5pins]' in caplog.text
+        caplog.clear()
+
+@pytest.mark.parametrize('garbage', [
+    b'garbage',
+    pickle.dumps({'version': 0})[:-4], # truncated
+    pickle.dumps(['not', 'a', 'dict']),
+    b'cnonexistent_module\nCompiled\n.', # class that can't be imported
+], ids=['text', 'truncated', 'list', 'missing_class'])
+def test_bad_cache(tmpdir, caplog, garbage):
+    caplog.set_level(logging.DEBUG, logger='chiplabel.chip_list')
+    cache_dir = tmpdir.join('cache')
+    chip_list = ChipList(cache_dir=str(cache_dir))
+    chip_list.load(f'{TEST_DATA_DIR}/chip1.yaml')
+    cache_files = cache_dir.listdir()
+    for cache_file in cache_files:
+        cache_file.write_binary(garbage)
+    caplog.clear()
+
+    chip_list = ChipList(cache_dir=str(cache_dir))
+    chip_list.load(f'{TEST_DATA_DIR}/chip1.yaml')
+    assert len(chip_list) == 1
+    assert 'Unable to read library cache' in caplog.text
+    assert not [record for record in caplog.records if record.levelno >= logging.WARNING]
+    # The garbage files are replaced
+    assert sorted(cache_dir.listdir()) == sorted(cache_files)
+    chip_list = ChipList(cache_dir=str(cache_dir))
+    caplog.clear()
+    chip_list.load(f'{TEST_DATA_DIR}/chip1.yaml')
+    assert len(chip_list) == 1
+    assert 'Unable to read library cache' not in caplog.text
+
+def test_index(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join('cache'))
+    library = tmpdir.mkdir('library')
+    for name in ('chip0', 'chip1', 'chip2'):
+        library.join(f'{name}.yaml').write(open(f'{TEST_DATA_DIR}/{name}.yaml').read())
+    family_dir = f'{TEST_DATA_DIR}/family'
+
+    # No index yet, everything is loaded
+    chip_list = ChipList(cache_dir=cache_dir)
+    assert chip_list.load(str(library), chip_ids=['TestChip']) == 3
+    assert len(chip_list) == 3
+
+    chip_list = ChipList(cache_dir=cache_dir)
+    assert chip_list.load(str(library), chip_ids=['TestChip']) == 3
+    assert sorted(chip_list.names) == ['chip2/555', 'chip2/TestChip']
+
+    chip_list = ChipList(cache_dir=cache_dir)
+    chip_list.load(str(library), chip_ids=['chip1/555'])
+    assert chip_list.names == ['chip1/555']
+
+    chip_list = ChipList(cache_dir=cache_dir)
+    assert chip_list.load(str(library), chip_ids=['notfound']) == 3
+    assert len(chip_list) == 0
+
+    # Family aliases
+    ChipList(cache_dir=cache_dir).load(family_dir)
+    chip_list = ChipList(cache_dir=cache_dir)
+    chip_list.load(family_dir, chip_ids=['74LS999'])
+    assert chip_list.names == ['7400a/74999']
+    assert chip_list['74LS999'].unscoped_id == '74LS999'
+
+    # Modified files are always loaded
+    chip1 = library.join('chip1.yaml')
+    chip1.setmtime(chip1.mtime() + 10)
+    chip_list = ChipList(cache_dir=cache_dir)
+    chip_list.load(str(library), chip_ids=['TestChip'])
+    assert sorted(chip_list.names) == ['chip1/555', 'chip2/555', 'chip2/TestChip']
+
+    # New and deleted files
+    library.join('chip3.yaml').write('4011:\n  pins: [A, B, C, D]\n')
+    library.join('chip0.yaml').remove()
+    chip_list = ChipList(cache_dir=cache_dir)
+    assert chip_list.load(str(library), chip_ids=['4011']) == 4
+    assert chip_list.names == ['chip3/4011']
+
+def test_index_names(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join('cache'))
+    chip_list = ChipList()
+    chip_list.load(TEST_DATA_DIR)
+
+    assert sorted(ChipList().load_names(TEST_DATA_DIR)) == sorted(chip_list.names)
+    assert sorted(ChipList(cache_dir=cache_dir).load_names(TEST_DATA_DIR)) == sorted(chip_list.names)
+
+    # Served from the index
+    def no_chip(*args, **kwargs):
+        pytest.fail('chip created')
+    monkeypatch.setattr(chip.Chip, '__init__', no_chip)
+    monkeypatch.setattr(chip.Chip, 'from_compiled', no_chip)
+    assert sorted(ChipList(cache_dir=cache_dir).load_names(TEST_DATA_DIR)) == sorted(chip_list.names)
+
+def _load_streaming(path):
+    chip_list = ChipList(stream_threshold=0)
+    chip_list.load(path)
+    return chip_list
+
+def test_stream():
+    for path in [TEST_DATA_DIR, f'{TEST_DATA_DIR}/family/7400a.yaml',
+            f'{TEST_DATA_DIR}/bad', f'{TEST_DATA_DIR}/chip0.yaml']:
+        chip_list = ChipList(stream_threshold=None)
+        chip_list.load(path)
+        stream_list = _load_streaming(path)
+        assert stream_list.names == chip_list.names
+        assert stream_list.global_names == chip_list.global_names
+        for a, b in zip(chip_list, stream_list):
+            assert a.full_name == b.full_name
+            assert list(a) == list(b)
+            assert a.config == b.config
+
+def test_stream_anchors(tmpdir):
+    # Templates and merge keys are resolved across entries
+    chip_file = tmpdir.join('lib.yaml')
+    chip_file.write(
+        '_quad: &quad\n'
+        '  description: quad\n'
+        '  pins: [A, B, C, D]\n'
+        'chip1: *quad\n'
+        'chip2:\n'
+        '  <<: *quad\n'
+        '  description: custom\n'
+        'chip3:\n'
+        '  type: wide\n'
+        '  pins: [E, F, G, H]\n')
+    chip_list = _load_streaming(str(chip_file))
+    assert chip_list.names == ['lib/chip1', 'lib/chip2', 'lib/chip3']
+    assert chip_list['chip1'].description == 'quad'
+    assert chip_list['chip2'].description == 'custom'
+    assert list(chip_list['chip2']) == ['A', 'B', 'C', 'D']
+    assert chip_list['chip3'].config['rowSpacing'] == 12
+    # Chips of a file with the same pinout share their pins
+    assert chip_list['chip1']._pins is chip_list['chip2']._pins
+
+def test_stream_bad_yaml(caplog):
+    chip_list = _load_streaming(f'{TEST_DATA_DIR}/bad/bad_yaml.yaml')
+    assert len(chip_list) == 0
+    assert 'Error parsing chip file' in caplog.text
+
+@pytest.mark.parametrize('stream_threshold', [0, None])
+def test_truncated_yaml(tmpdir, caplog, stream_threshold):
+    # A file that can't be parsed adds none of its chips, even the ones
+    # streamed before the error
+    chip_file = tmpdir.join('lib.yaml')
+    chip_file.write(
+        'chip1:\n'
+        '  pins: [A, B, C, D]\n'
+        '7400:\n'
+        '  family: 7400\n'
+        '  pins: [A, B, C, D]\n'
+        'chip3:\n'
+        '  pins: [A, B')
+    cache_dir = tmpdir.join('cache')
+    chip_list = ChipList(cache_dir=str(cache_dir), stream_threshold=stream_threshold)
+    chip_list.load(f'{TEST_DATA_DIR}/chip1.yaml')
+    assert chip_list.load(str(chip_file)) == 0
+    assert 'Error parsing chip file' in caplog.text
+    assert chip_list.names == ['chip1/555']
+    assert chip_list.global_names == ['555']
+    assert chip_list['chip1'] is None
+    assert chip_list['74LS00'] is None
+    assert chip_list.search('chip1') == []
+    # Not cached either
+    assert chip_list.load(str(chip_file)) == 0
+    assert len(chip_list) == 1
+
+def test_family_lazy():
+    chip_list = ChipList()
+    chip_list.load(f'{TEST_DATA_DIR}/family/7400a.yaml')
+
+    # Aliases are not stored
+    assert len(chip_list._global_name_dict) == 1
+
+    alias = chip_list['74LS999']
+    assert alias.unscoped_id == '74LS999'
+    assert alias.display_name == '74LS999'
+    assert list(alias) == list(chip_list['74999'])
+
+    assert chip_list['74XYZ999'] == None
+    assert chip_list['74LS998'] == None
+    assert chip_list['74LS'] == None
+
+def test_family_custom(monkeypatch):
+    monkeypatch.setattr(family, 'FAMILY_RULES', dict(family.FAMILY_RULES))
+    family.register_family(family.PrefixFamilyRule('4000', '4', ['CD', 'HEF']))
+
+    chip_list = ChipList()
+    chip_list.load(f'{TEST_DATA_DIR}/bad/bad_family.yaml')
+    assert 'TestChip' in chip_list.global_names
+    assert 'CDTestChip' not in chip_list.global_names
+
+def test_search():
+    chip_list = ChipList()
+    chip_list.load(f'{TEST_DATA_DIR}')
+    results = chip_list.search('tim')
+    assert [result.chip.scoped_id for result in results] == ['chip1/555', 'chip2/555']
+    assert results[0].score > 0
+    assert [result.chip.scoped_id for result in chip_list.search('mydesc p1')] == ['chip2/TestChip']
+    assert len(chip_list.search('tim', limit=1)) == 1
+    assert chip_list.search('qwerty') == []
+
+    # Family aliases are alias chips
+    chip_list.load(f'{TEST_DATA_DIR}/family/7400a.yaml')
+    results = chip_list.search('74LS99')
+    assert [result.chip.unscoped_id for result in results] == ['74LS999']
+    assert list(results[0].chip) == list(chip_list['74999'])
+
+def test_suggest():
+    chip_list = ChipList()
+    chip_list.load(f'{TEST_DATA_DIR}')
+    assert chip_list.suggest('TestChp') == ['TestChip']
+    assert chip_list.suggest('5555') == ['chip1/555', 'chip2/555']
+    assert chip_list.suggest('qwerty') == []
+
+def test_suggest_unloaded(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    family_dir = f'{TEST_DATA_DIR}/family'
+    ChipList(cache_dir=cache_dir).load(family_dir)
+
+    # Files skipped by the index are not searched, their ids are suggested
+    chip_list = ChipList(cache_dir=cache_dir)
+    chip_list.load(family_dir, chip_ids=['notfound'])
+    assert len(chip_list) == 0
+    assert chip_list.search('74999') == []
+    assert chip_list.suggest('74998') == ['74999']
+    assert chip_list.suggest('74LS998') == ['74LS999']
+
+def test_reload_file(tmpdir, caplog):
+    library = tmpdir.mkdir('library')
+    for name in ('chip1', 'chip2'):
+        library.join(f'{name}.yaml').write(open(f'{TEST_DATA_DIR}/{name}.yaml').read())
+    library.join('family.yaml').write(open(f'{TEST_DATA_DIR}/family/7400a.yaml').read())
+    chip2 = library.join('chip2.yaml')
+    chip_list = ChipList()
+    chip_list.load(str(library))
+    names = chip_list.names
+
+    # Unchanged
+    changes = chip_list.reload_file(str(chip2))
+    assert changes == ([], [], [])
+    assert chip_list.names == names
+
+    # Chips keep their place in the list
+    chip2.write(chip2.read().replace('myDescription', 'changed') + '4011:\n  pins: [A, B, C, D]\n')
+    changes = chip_list.reload_file(str(chip2))
+    assert changes.added == ['chip2/4011']
+    assert changes.changed == ['chip2/TestChip']
+    assert changes.removed == []
+    assert chip_list['TestChip'].description == 'changed'
+    position = names.index('chip2/555')
+    assert chip_list.names == names[:position] + ['chip2/555', 'chip2/TestChip', 'chip2/4011'] + names[position + 2:]
+
+    # Bad yaml: previous version kept
+    chip2.write('555: [\n')
+    assert chip_list.reload_file(str(chip2)) == ([], [], [])
+    assert 'Keeping the previous chips' in caplog.text
+    assert chip_list['chip2/4011']
+
+    # Deleted file: chips with the same id in another library are found again
+    chip2.remove()
+    changes = chip_list.reload_file(str(chip2))
+    assert changes.removed == ['chip2/4011', 'chip2/555', 'chip2/TestChip']
+    assert chip_list['555'] is chip_list['chip1/555']
+    assert chip_list['TestChip'] == None
+
+    # Family aliases follow the reloaded chips
+    family_file = library.join('family.yaml')
+    assert chip_list['74LS999']
+    family_file.write(family_file.read().replace('family: 7400', 'family: 7400\n  name: changed'))
+    assert chip_list.reload_file(str(family_file)).changed == ['family/74999']
+    assert chip_list['74LS999'].name == 'changed'
+    family_file.write('74998:\n  pins: [A, B, C, D]\n')
+    changes = chip_list.reload_file(str(family_file))
+    assert changes == (['family/74998'], [], ['family/74999'])
+    assert chip_list['74LS999'] == None
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# test_chip_search.py
+
+from chiplabel import chip
+from chiplabel.chip_search import SearchIndex, tokenize
+
+def _chip(id, description='', pins=('A', 'B', 'C', 'D'), name=None):
+    return chip.Chip.from_compiled(id, 'lib', name or '', description, list(pins))
+
+def _index():
+    index = SearchIndex()
+    index.add('lib/74595', _chip('74595', '8-bit shift register'), '7400')
+    index.add('lib/74164', _chip('74164', 'serial shift register'), '7400')
+    index.add('lib/7400', _chip('7400', 'quad NAND'), '7400')
+    index.add('lib/Z80', _chip('Z80', 'CPU', name='Z80 CPU'))
+    index.add('lib/555', _chip('555', 'Timer', pins=['GND', 'TRG', 'OUT', 'VCC']))
+    return index
+
+def _keys(index, results):
+    return [index.get_key(doc) for doc, score, alias in results]
+
+def test_tokenize():
+    assert tokenize('8-bit Shift_Reg /OE') == ['8', 'bit', 'shift_reg', 'oe']
+    assert tokenize('') == []
+
+def test_exact_and_prefix():
+    index = _index()
+    assert len(index) == 5
+    assert _keys(index, index.search('555')) == ['lib/555']
+    assert _keys(index, index.search('741')) == ['lib/74164']
+    # Exact matches first
+    results = index.search('7400')
+    assert _keys(index, results)[0] == 'lib/7400'
+    assert index.search('') == []
+
+def test_fields():
+    index = _index()
+    assert _keys(index, index.search('timer')) == ['lib/555']
+    assert _keys(index, index.search('trg')) == ['lib/555']
+    # id matches before description matches
+    assert _keys(index, index.search('z80')) == ['lib/Z80']
+    results = index.search('shift')
+    assert sorted(_keys(index, results)) == ['lib/74164', 'lib/74595']
+
+def test_all_words():
+    index = _index()
+    assert _keys(index, index.search('shift serial')) == ['lib/74164']
+    assert _keys(index, index.search('shift 8')) == ['lib/74595']
+    assert index.search('shift timer') == []
+
+def test_limit():
+    index = _index()
+    assert len(index.search('74', limit=2)) == 2
+    assert len(index.search('74')) == 3
+
+def test_abbreviation():
+    index = _index()
+    # reg is a prefix of register, registers has no prefix match
+    assert sorted(_keys(index, index.search('registers'))) == ['lib/74164', 'lib/74595']
+    assert index.search('registers', fuzzy=False) == []
+
+def test_fuzzy():
+    index = _index()
+    assert _keys(index, index.search('Z8O')) == ['lib/Z80']
+    assert _keys(index, index.search('timmer')) == ['lib/555']
+    assert index.search('Z8O', fuzzy=False) == []
+    assert index.search('qwerty') == []
+
+def test_family_alias():
+    index = _index()
+    results = index.search('74HC595')
+    assert [(index.get_key(doc), alias) for doc, score, alias in results] == [('lib/74595', '74HC595')]
+    # Prefix of an alias
+    results = index.search('74LS16')
+    assert [(index.get_key(doc), alias) for doc, score, alias in results] == [('lib/74164', '74LS164')]
+    # Aliases only for chips of the family, 555 is not 74555
+    assert index.search('74HC555', fuzzy=False) == []
+    assert ('lib/555', '74HC555') not in [(index.get_key(doc), alias)
+        for doc, score, alias in index.search('74HC555')]
+
+def test_unregistered_family():
+    index = SearchIndex()
+    index.add('lib/4011', None, '4000')
+    index.add('lib/4013', _chip('4013', 'dual D flip-flop'), '4000')
+    assert index.suggest('4012') == ['4011', '4013']
+    assert _keys(index, index.search('4013')) == ['lib/4013']
+
+def test_suggest():
+    index = _index()
+    assert index.suggest('74596')[0] == '74595'
+    assert index.suggest('Z8O') == ['Z80']
+    assert index.suggest('lib/Z8O') == ['Z80']
+    assert index.suggest('74HC5955')[0] == '74HC595'
+    assert index.suggest('qwerty') == []
+    assert len(index.suggest('74', count=2)) == 2
+
+def test_unloaded_chip():
+    index = SearchIndex()
+    index.add('lib/4011', None)
+    assert index.get_chip(0) is None
+    assert index.suggest('4012') == ['4011']
+    # Only the id is indexed
+    assert _keys(index, index.search('4011')) == ['lib/4011']
+
+def test_common_words():
+    # Words matching most of the chips, the first ids for equal scores
+    index = SearchIndex()
+    for n in range(100):
+        index.add(f'lib/C{n:03}', _chip(f'C{n:03}', f'synthetic chip {n % 10}', name=f'Chip{n:03}' if n % 2 else None))
+    assert _keys(index, index.search('synthetic', limit=3)) == ['lib/C000', 'lib/C001', 'lib/C002']
+    assert _keys(index, index.search('synthetic 7', limit=3)) == ['lib/C007', 'lib/C017', 'lib/C027']
+    # Names score higher than descriptions
+    results = index.search('chip', limit=60)
+    assert _keys(index, results[:2]) == ['lib/C001', 'lib/C003']
+    assert _keys(index, results[50:52]) == ['lib/C000', 'lib/C002']
+    assert _keys(index, index.search('chip synthetc 8', limit=2)) == ['lib/C008', 'lib/C018']
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# test_family.py
+
+import pytest
+from chiplabel import family
+
+def test_7400():
+    rule = family.get_family('7400')
+    assert rule
+    assert rule.name == '7400'
+
+    assert rule.check('7400') == None
+    assert 'missing 74 prefix' in rule.check('badttl')
+
+    aliases = rule.get_aliases('74999')
+    assert len(aliases) == 29
+    assert '74LS999' in aliases
+    assert '74HCT999' in aliases
+
+    assert list(rule.get_base_ids('74LS00'))[0] == '7400'
+    assert '7400' in rule.get_base_ids('74HCT00')
+    assert list(rule.get_base_ids('7400')) == []
+    assert list(rule.get_base_ids('74L')) == []
+    assert list(rule.get_base_ids('555')) == []
+
+def test_unknown():
+    assert family.get_family('4000') == None
+    assert family.get_family('') == None
+
+def test_prefix_rule():
+    rule = family.PrefixFamilyRule('4000', '4', ['CD', 'HEF', 'MC1'])
+    assert rule.check('4011') == None
+    assert 'must start with 4' in rule.check('7400')
+    assert rule.get_aliases('4011') == ['CD4011', 'HEF4011', 'MC14011']
+    assert list(rule.get_base_ids('MC14011')) == ['4011']
+    assert list(rule.get_base_ids('CD4011')) == ['4011']
+    assert list(rule.get_base_ids('4011')) == []
+
+def test_register_family(monkeypatch):
+    monkeypatch.setattr(family, 'FAMILY_RULES', dict(family.FAMILY_RULES))
+    rule = family.PrefixFamilyRule('4000', '4', ['CD'])
+    family.register_family(rule)
+    assert family.get_family('4000') is rule
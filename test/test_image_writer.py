@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# test_image_writer.py
+
+import threading
+import pytest
+from PIL import Image
+from chiplabel import chip
+from chiplabel.chip_printer import ChipPrinter
+from chiplabel.chip_grid_printer import ChipGridPrinter
+from chiplabel.image_writer import ImageWriter
+
+def test_init():
+    with pytest.raises(ValueError):
+        ImageWriter(0)
+
+    writer = ImageWriter(2)
+    assert writer.close() == []
+    assert writer.written == 0
+
+def test_write(tmpdir):
+    image = Image.new(mode='1', size=(10, 20), color=255)
+    with ImageWriter(3) as writer:
+        for n in range(20):
+            writer.submit(image, f'{tmpdir}/{n}.png', dpi=(300, 300))
+    assert writer.written == 20
+    assert writer.errors == []
+    for n in range(20):
+        assert Image.open(str(tmpdir.join(f'{n}.png'))).size == (10, 20)
+
+    with pytest.raises(ValueError):
+        writer.submit(image, f'{tmpdir}/late.png')
+
+def test_save_function(tmpdir):
+    image = Image.new(mode='1', size=(10, 20), color=255)
+    saved = []
+    def save(image, filename, **save_args):
+        saved.append((filename, save_args))
+    with ImageWriter(2) as writer:
+        writer.submit(image, 'a.pbm', save=save, format='pbm')
+    assert saved == [('a.pbm', {'format': 'pbm'})]
+    assert writer.written == 1
+
+def test_errors(tmpdir):
+    image = Image.new(mode='1', size=(10, 20), color=255)
+    writer = ImageWriter(2)
+    writer.submit(image, f'{tmpdir}/good.png')
+    writer.submit(image, f'{tmpdir}/baddir/bad.png')
+    writer.submit(image, f'{tmpdir}/badext.notanimage')
+    errors = writer.close()
+    assert sorted(filename for filename, err in errors) == [
+        f'{tmpdir}/baddir/bad.png',
+        f'{tmpdir}/badext.notanimage']
+    assert writer.written == 1
+    assert tmpdir.join('good.png').check(file=1)
+
+class _SlowImage:
+    def __init__(self, event):
+        self._event = event
+    def save(self, filename, **kwargs):
+        self._event.wait()
+
+def test_backpressure(tmpdir):
+    event = threading.Event()
+    writer = ImageWriter(1, queue_size=1)
+    writer.submit(_SlowImage(event), 'a') # taken by the worker
+    writer.submit(_SlowImage(event), 'b') # queued
+
+    blocked = threading.Thread(target=writer.submit, args=(_SlowImage(event), 'c'))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    event.set()
+    blocked.join()
+    assert writer.close() == []
+    assert writer.written == 3
+
+def test_printers(tmpdir):
+    c = chip.Chip('id', 20, rowSpacing=25.4)
+    with ImageWriter(2) as writer:
+        p = ChipPrinter(image_writer=writer)
+        assert p.image_writer is writer
+        p.print_chip_to_file(c, f'{tmpdir}/chip.png')
+
+        p = ChipGridPrinter(image_writer=writer, page_size=(2, 2),
+            page_padding=0, output=tmpdir)
+        p.print_chips([c]*5)
+    assert writer.errors == []
+    assert tmpdir.join('chip.png').check(file=1)
+    assert tmpdir.join('page1.png').check(file=1)
+    assert tmpdir.join('page2.png').check(file=1)
+    assert Image.open(str(tmpdir.join('page1.png'))).size == (600, 600)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# test_manifest.py
+
+import json
+import os
+from chiplabel.manifest import MANIFEST_FILE, OutputManifest
+
+def _write(output_dir, filename, data='label'):
+    output_dir.join(filename).write(data)
+
+def test_empty(tmpdir):
+    manifest = OutputManifest(str(tmpdir))
+    assert len(manifest) == 0
+    assert manifest.path == os.path.join(str(tmpdir), MANIFEST_FILE)
+    assert not manifest.is_fresh('555.png', 'key')
+    manifest.save()
+    assert json.loads(tmpdir.join(MANIFEST_FILE).read()) == {'version': 1, 'files': {}}
+
+def test_fresh(tmpdir):
+    manifest = OutputManifest(str(tmpdir))
+    manifest.add('555.png', 'key1', 'chips/555')
+    _write(tmpdir, '555.png')
+    # Not written
+    manifest.add('7400.png', 'key2', 'chips/7400')
+    manifest.save()
+    assert '555.png' in manifest
+    assert '7400.png' not in manifest
+
+    manifest = OutputManifest(str(tmpdir))
+    assert len(manifest) == 1
+    assert manifest.is_fresh('555.png', 'key1')
+    assert not manifest.is_fresh('555.png', 'key2')
+    assert not manifest.is_fresh('7400.png', 'key2')
+
+    # Modified or deleted outputs are not up to date
+    _write(tmpdir, '555.png', 'modified')
+    assert not manifest.is_fresh('555.png', 'key1')
+    tmpdir.join('555.png').remove()
+    assert not manifest.is_fresh('555.png', 'key1')
+
+def test_add_removes_file(tmpdir):
+    _write(tmpdir, '555.png')
+    manifest = OutputManifest(str(tmpdir))
+    manifest.add('555.png', 'key1', 'chips/555')
+    assert tmpdir.join('555.png').check(file=0)
+    # Failed write: nothing recorded
+    manifest.save()
+    assert len(OutputManifest(str(tmpdir))) == 0
+
+def test_remove_stale(tmpdir):
+    manifest = OutputManifest(str(tmpdir))
+    for filename in ('555.png', '7400.png', '7402.png'):
+        manifest.add(filename, 'key', filename)
+        _write(tmpdir, filename)
+    manifest.save()
+    _write(tmpdir, 'other.png')
+
+    manifest = OutputManifest(str(tmpdir))
+    tmpdir.join('7402.png').remove()
+    assert manifest.remove_stale(['555.png']) == ['7400.png', '7402.png']
+    manifest.save()
+    assert tmpdir.join('555.png').check(file=1)
+    assert tmpdir.join('7400.png').check(file=0)
+    # Files not written by chiplabel are kept
+    assert tmpdir.join('other.png').check(file=1)
+    assert len(OutputManifest(str(tmpdir))) == 1
+
+def test_bad_manifest(tmpdir, caplog):
+    tmpdir.join(MANIFEST_FILE).write('{bad json')
+    assert len(OutputManifest(str(tmpdir))) == 0
+    assert 'Unable to read output manifest' in caplog.text
+
+    tmpdir.join(MANIFEST_FILE).write('{"version": 0, "files": {"555.png": {}}}')
+    assert len(OutputManifest(str(tmpdir))) == 0
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# test_packed_page.py
+
+import io
+import random
+import pytest
+from PIL import Image
+from PIL import ImageChops
+from chiplabel import packed_page
+
+numpy = pytest.importorskip('numpy')
+PackedPage = packed_page.PackedPage
+
+def _random_image(size, seed):
+    rng = random.Random(seed)
+    stride = (size[0] + 7) // 8
+    image = Image.frombytes('1', size, bytes(rng.randrange(256) for n in range(stride * size[1])))
+    # Same padding bits as a drawn image
+    return image.convert('L').convert('1')
+
+def _same(packed, image):
+    assert packed.size == image.size
+    assert packed.tobytes() == image.tobytes()
+
+def test_new():
+    page = PackedPage((13, 5))
+    _same(page, Image.new('1', (13, 5), 255))
+    assert page.nbytes == 2 * 5
+    _same(PackedPage((13, 5), color=0), Image.new('1', (13, 5), 0))
+    assert PackedPage((16, 2)).tobytes() == b'\xff' * 4
+
+@pytest.mark.parametrize('position', [(0, 0), (3, 2), (8, 1), (13, 4), (-5, -2), (30, 20), (45, 0), (60, 60)])
+def test_paste(position):
+    image = Image.new('1', (50, 30), 255)
+    page = PackedPage((50, 30))
+    for source in (_random_image((17, 9), str(position)), Image.new('1', (21, 3), 0)):
+        image.paste(source, box=position)
+        page.paste(source, position)
+        _same(page, image)
+        # Packed labels
+        page.paste(PackedPage.from_image(source), position)
+        _same(page, image)
+
+def test_fill():
+    image = _random_image((40, 10), 1)
+    page = PackedPage.from_image(image)
+    for color, box in [(255, (3, 1, 29, 7)), (0, (9, 0, 16, 10)), (255, (-4, -4, 100, 2))]:
+        image.paste(color, box=box)
+        page.paste(color, box)
+        _same(page, image)
+
+@pytest.mark.parametrize('box', [(0, 0, 40, 10), (3, 2, 29, 7), (8, 0, 16, 10), (5, 1, 6, 2), (1, 0, 40, 10)])
+def test_crop(box):
+    image = _random_image((40, 10), 2)
+    _same(PackedPage.from_image(image).crop(box), image.crop(box))
+
+    with pytest.raises(ValueError):
+        PackedPage.from_image(image).crop((0, 0, 41, 10))
+
+def test_rotate():
+    image = _random_image((19, 11), 3)
+    _same(PackedPage.from_image(image).rotate(90, expand=True), image.rotate(90, expand=True))
+    with pytest.raises(ValueError):
+        PackedPage((8, 8)).rotate(180, expand=True)
+
+def test_save(tmpdir):
+    image = _random_image((37, 12), 4)
+    page = PackedPage.from_image(image)
+    output = io.BytesIO()
+    page.save(output, format='PNG')
+    decoded = Image.open(io.BytesIO(output.getvalue()))
+    assert not ImageChops.difference(decoded.convert('L'), image.convert('L')).getbbox()
+
+    page.save(str(tmpdir.join('page.png')), dpi=(300, 300))
+    decoded = Image.open(str(tmpdir.join('page.png')))
+    assert decoded.info['dpi'][0] == pytest.approx(300, 0.01)
+    _same(PackedPage.from_image(decoded.convert('1')), image)
+
+    output = io.BytesIO()
+    page.save(output, format='PBM')
+    _same(PackedPage.from_image(Image.open(io.BytesIO(output.getvalue()))), image)
+    page.save(str(tmpdir.join('page.tif')), dpi=(300, 300))
+    assert open(str(tmpdir.join('page.tif')), 'rb').read(4) == b'II*\0'
+
+    with pytest.raises(ValueError):
+        page.save(str(tmpdir.join('page.bmp')))
+    with pytest.raises(ValueError):
+        page.save(output, format='BMP')
+
+def test_to_image():
+    image = _random_image((21, 6), 5)
+    assert PackedPage.from_image(image).to_image().tobytes() == image.tobytes()
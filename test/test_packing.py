@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# test_packing.py
+
+import random
+import pytest
+from chiplabel import packing
+
+def _check_pages(pages, sizes, page_size, padding):
+    placed = sorted(p.index for page in pages for p in page)
+    assert placed == list(range(len(sizes)))
+
+    for page in pages:
+        for a in page:
+            width, height = sizes[a.index]
+            if a.rotated:
+                width, height = height, width
+            assert (a.width, a.height) == (width, height)
+            assert a.x >= 0 and a.y >= 0
+            assert a.x + a.width <= page_size[0]
+            assert a.y + a.height <= page_size[1]
+            for b in page:
+                if a is b:
+                    continue
+                assert (a.x + a.width + padding <= b.x or b.x + b.width + padding <= a.x or
+                    a.y + a.height + padding <= b.y or b.y + b.height + padding <= a.y)
+
+def _random_sizes(count, seed=0):
+    rng = random.Random(seed)
+    return [(rng.choice([71, 95, 142]), rng.choice([213, 284, 355, 497])) for n in range(count)]
+
+@pytest.mark.parametrize('method', packing.PACKERS)
+@pytest.mark.parametrize('rotate', [False, True])
+def test_pack(method, rotate):
+    sizes = _random_sizes(200)
+    pages = packing.pack(sizes, (1200, 1200), padding=30, method=method, rotate=rotate)
+    assert len(pages) > 1
+    _check_pages(pages, sizes, (1200, 1200), 30)
+
+@pytest.mark.parametrize('method', packing.PACKERS)
+def test_exact_fit(method):
+    # 2x2 squares with padding, same as the shelf printer tests
+    sizes = [(300, 300)] * 5
+    pages = packing.pack(sizes, (660, 660), padding=30, method=method)
+    assert [len(page) for page in pages] == [4, 1]
+    assert sorted((p.x, p.y) for p in pages[0]) == [(0, 0), (0, 330), (330, 0), (330, 330)]
+
+@pytest.mark.parametrize('method', packing.PACKERS)
+def test_rotate(method):
+    # Only fits on the page when rotated
+    sizes = [(100, 50)]
+    pages = packing.pack(sizes, (60, 120), method=method)
+    assert len(pages) == 1
+    assert pages[0][0].x == 0
+
+    pages = packing.pack(sizes, (60, 120), method=method, rotate=True)
+    assert pages[0][0] == packing.Placement(0, 0, 0, 50, 100, True)
+
+@pytest.mark.parametrize('method', packing.PACKERS)
+def test_oversize(method, caplog):
+    sizes = [(50, 50), (500, 50), (50, 50)]
+    pages = packing.pack(sizes, (200, 200), method=method)
+    assert 'larger than the page' in caplog.text
+    assert [len(page) for page in pages] == [1, 2]
+    assert pages[0][0] == packing.Placement(1, 0, 0, 500, 50, False)
+
+def test_empty():
+    assert packing.pack([], (100, 100)) == []
+
+def test_bad_method():
+    with pytest.raises(ValueError):
+        packing.pack([(1, 1)], (100, 100), method='bad')
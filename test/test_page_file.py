@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# test_page_file.py
+
+import pytest
+from PIL import Image
+from chiplabel.page_file import PdfPageFile, TiffPageFile, open_page_file
+
+def _pages():
+    for size in [(300, 150), (600, 300), (30, 30)]:
+        image = Image.new('1', size, color=255)
+        image.putpixel((0, 0), 0)
+        yield image
+
+def test_open_page_file(tmpdir):
+    with open_page_file(str(tmpdir.join('out.pdf')), 300) as page_file:
+        assert isinstance(page_file, PdfPageFile)
+    with open_page_file(str(tmpdir.join('out.TIF')), 300) as page_file:
+        assert isinstance(page_file, TiffPageFile)
+    with pytest.raises(ValueError):
+        open_page_file(str(tmpdir.join('out.png')), 300)
+
+def test_pdf(tmpdir):
+    path = str(tmpdir.join('out.pdf'))
+    with open_page_file(path, 300) as page_file:
+        for image in _pages():
+            page_file.add_page(image)
+        assert page_file.page_count == 3
+    with open(path, 'rb') as pdf_file:
+        data = pdf_file.read()
+    assert data.count(b'/Subtype /Image') == 3
+    assert b'/MediaBox [0 0 72 36]' in data
+    assert b'/MediaBox [0 0 144 72]' in data
+    assert data.endswith(b'%%EOF\n')
+
+def test_tiff(tmpdir):
+    path = str(tmpdir.join('out.tiff'))
+    with open_page_file(path, 600) as page_file:
+        for image in _pages():
+            page_file.add_page(image)
+        assert page_file.page_count == 3
+
+    image = Image.open(path)
+    assert image.n_frames == 3
+    assert image.info['dpi'] == (600, 600)
+    for frame, expected in enumerate(_pages()):
+        image.seek(frame)
+        assert image.size == expected.size
+        assert image.getpixel((0, 0)) == 0
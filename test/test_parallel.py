@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# test_parallel.py
+
+import os
+import pkg_resources
+import pytest
+from PIL import Image
+from chiplabel import chip
+from chiplabel import parallel
+
+FONT_DIR = pkg_resources.resource_filename('chiplabel', 'fonts')
+DEFAULT_FONT = f'{FONT_DIR}/CascadiaMono.ttf'
+
+def test_get_job_count():
+    assert parallel.get_job_count(1, 100) == 1
+    assert parallel.get_job_count(4, 100) == 4
+    assert parallel.get_job_count(4, 2) == 2
+    assert parallel.get_job_count(4, 0) == 1
+    assert parallel.get_job_count(0, 1000) == min(os.cpu_count(), 1000)
+
+def test_auto_chunksize():
+    assert parallel.auto_chunksize(0, 4) == 1
+    assert parallel.auto_chunksize(10, 0) == 1
+    assert parallel.auto_chunksize(10, 4) == 1
+    assert parallel.auto_chunksize(100, 4) == 7
+    assert parallel.auto_chunksize(10000, 32) == 79
+
+def _init_state(prefix):
+    return {'prefix': prefix, 'pid': os.getpid(), 'tasks': 0}
+
+def _count_task(state, n):
+    state['tasks'] += 1
+    return state['pid'], state['tasks'], f"{state['prefix']}{n}"
+
+def test_worker_pool():
+    with parallel.WorkerPool(2, _init_state, ('task',)) as pool:
+        results = list(pool.map(_count_task, range(20), chunksize=3))
+        assert pool.submit(_count_task, 20).result()[2] == 'task20'
+    assert [name for _, _, name in results] == [f'task{n}' for n in range(20)]
+    # One state per worker process, kept between tasks
+    for pid in set(pid for pid, _, _ in results):
+        counts = [count for task_pid, count, _ in results if task_pid == pid]
+        assert counts == list(range(1, len(counts) + 1))
+
+def test_print_chips_to_files(tmpdir, caplog):
+    caplog.set_level('INFO')
+    chips = []
+    for n in range(6):
+        c = chip.Chip(f'chip{n}', 8)
+        c.set_pins([f'P{n}' for n in range(8)])
+        chips.append(c)
+    # Empty pin name can't be rendered
+    chips[2][1] = ''
+
+    tasks = [(c, f'{tmpdir}/{c.id}.png') for c in chips]
+    errors = parallel.print_chips_to_files(tasks, {'font': DEFAULT_FONT, 'dpi': 300}, 3)
+    assert errors == 1
+
+    for n in range(6):
+        assert tmpdir.join(f'chip{n}.png').check(file=1) == (n != 2)
+    image = Image.open(str(tmpdir.join('chip0.png')))
+    assert image.info['dpi'][0] == pytest.approx(300, 0.01)
+
+    # Messages are logged in order
+    messages = [r.getMessage() for r in caplog.records if 'Generating' in r.getMessage()]
+    assert messages == [f'Generating label for chip [chip{n}]' for n in range(6)]
+    assert 'Unable to generate label for chip [chip2]' in caplog.text
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# test_pdf.py
+
+import io
+import re
+import zlib
+from PIL import Image
+from chiplabel.pdf import PdfWriter, encode_text, format_number
+
+def _check_xref(data):
+    """Every object offset in the xref table points to its object"""
+    xref_position = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[xref_position:].startswith(b'xref\n')
+    lines = data[xref_position:].split(b'\n')
+    count = int(lines[1].split()[1])
+    for object_id in range(1, count):
+        offset = int(lines[2 + object_id].split()[0])
+        assert data[offset:].startswith(b'%d 0 obj\n' % object_id)
+    return count
+
+def test_format_number():
+    assert format_number(1) == '1'
+    assert format_number(2.5) == '2.5'
+    assert format_number(1/3) == '0.3333'
+    assert format_number(-0.00001) == '0'
+
+def test_encode_text():
+    assert encode_text('ABC') == b'(ABC)'
+    assert encode_text('a(b)\\') == b'(a\\(b\\)\\\\)'
+    assert encode_text('Ç') == b'(\xc7)'
+
+def test_pages():
+    output = io.BytesIO()
+    with PdfWriter(output, compress=False) as writer:
+        writer.add_page(72, 144, b'0 0 m 72 144 l S')
+        writer.add_page(100, 100, b'BT /F1 10 Tf (A) Tj ET')
+        assert writer.page_count == 2
+    data = output.getvalue()
+    assert data.startswith(b'%PDF-1.4\n')
+    assert b'/Type /Pages /Kids [' in data
+    assert b'/Count 2' in data
+    assert b'/MediaBox [0 0 72 144]' in data
+    assert b'/BaseFont /Courier' in data
+    assert b'0 0 m 72 144 l S' in data
+    # pages, font, 2x (content, page), catalog
+    assert _check_xref(data) == 8
+
+def test_compress():
+    output = io.BytesIO()
+    with PdfWriter(output) as writer:
+        writer.add_page(10, 10, b'0 0 m 10 10 l S')
+    data = output.getvalue()
+    stream = re.search(rb'/Filter /FlateDecode >>\nstream\n(.*?)\nendstream', data, re.DOTALL).group(1)
+    assert zlib.decompress(stream) == b'0 0 m 10 10 l S'
+    _check_xref(data)
+
+def test_image():
+    image = Image.new('1', (10, 3), color=255)
+    image.putpixel((0, 0), 0)
+    output = io.BytesIO()
+    with PdfWriter(output, compress=False) as writer:
+        image_id = writer.add_image(image)
+        writer.add_page(10, 3, b'q 10 0 0 3 0 0 cm /Im1 Do Q', images={'Im1': image_id})
+    data = output.getvalue()
+    assert b'/Length 6 /Type /XObject /Subtype /Image /Width 10 /Height 3 /ColorSpace /DeviceGray /BitsPerComponent 1' in data
+    assert b'/XObject << /Im1 %d 0 R >>' % image_id in data
+    _check_xref(data)
+
+def test_image_bands():
+    image = Image.new('1', (20, 7), color=255)
+    image.putpixel((3, 5), 0)
+    bands = [image.crop((0, y, 20, min(y + 3, 7))) for y in range(0, 7, 3)]
+    output = io.BytesIO()
+    with PdfWriter(output) as writer:
+        image_id = writer.add_image_bands(image.size, bands)
+        expected_id = writer.add_image(image)
+    data = output.getvalue()
+    streams = re.findall(rb'/Width 20 /Height 7 .*?stream\n(.*?)\nendstream', data, re.DOTALL)
+    assert len(streams) == 2
+    assert zlib.decompress(streams[0]) == zlib.decompress(streams[1]) == image.tobytes()
+    # Indirect length
+    length_id = int(re.search(rb'%d 0 obj\n<< /Length (\d+) 0 R' % image_id, data).group(1))
+    assert re.search(rb'%d 0 obj\n%d\n' % (length_id, len(streams[0])), data)
+    _check_xref(data)
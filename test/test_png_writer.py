@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# test_png_writer.py
+
+import io
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+from chiplabel.png_writer import write_png
+
+def _image(size):
+    image = Image.new('1', size, color=255)
+    draw = ImageDraw.Draw(image)
+    draw.line([(0, 0), (size[0]-1, size[1]-1)])
+    draw.rectangle([(5, 5), (30, 40)])
+    return image
+
+def _bands(image, band_height):
+    width, height = image.size
+    return [image.crop((0, y, width, min(y + band_height, height))) for y in range(0, height, band_height)]
+
+@pytest.mark.parametrize('band_height', [1, 10, 57, 1000])
+def test_write_png(band_height):
+    image = _image((103, 57))
+    output = io.BytesIO()
+    write_png(output, image.size, _bands(image, band_height), dpi=300)
+    output.seek(0)
+    result = Image.open(output)
+    assert result.mode == '1'
+    assert result.size == (103, 57)
+    assert result.info['dpi'] == pytest.approx((300, 300), abs=0.01)
+    assert ImageChops.difference(result.convert('1'), image).getbbox() == None
+
+def test_write_png_errors():
+    image = _image((100, 50))
+    with pytest.raises(ValueError):
+        write_png(io.BytesIO(), (101, 50), _bands(image, 10))
+    with pytest.raises(ValueError):
+        write_png(io.BytesIO(), (100, 51), _bands(image, 10))
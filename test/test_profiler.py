@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# test_profiler.py
+
+import io
+import json
+import pstats
+import threading
+import pytest
+from chiplabel import profiler
+
+@pytest.fixture(autouse=True)
+def no_profiler():
+    yield
+    profiler.stop_profiling()
+
+def test_disabled():
+    assert profiler.get_profiler() is None
+    with profiler.phase('render', 'chip') as phase:
+        assert phase is None
+    assert profiler.stop_profiling() is None
+
+def test_phases():
+    prof = profiler.start_profiling()
+    assert profiler.get_profiler() is prof
+    with profiler.phase('load', 'file1'):
+        with profiler.phase('yaml'):
+            pass
+    prof.add('render', 0, 0.002, 'chip1')
+    prof.add('render', 0, 0.004, 'chip2')
+    assert profiler.stop_profiling() is prof
+    assert profiler.get_profiler() is None
+
+    # Only the phases started while profiling
+    with profiler.phase('render', 'chip3'):
+        pass
+
+    phases = {stats.name: stats for stats in prof.get_phases()}
+    assert list(phases) == ['yaml', 'load', 'render']
+    assert phases['load'].count == 1
+    assert phases['load'].total >= phases['yaml'].total
+    assert phases['render'].count == 2
+    assert phases['render'].total == pytest.approx(0.006)
+    assert phases['render'].mean == pytest.approx(0.003)
+    assert phases['render'].max == pytest.approx(0.004)
+    assert prof.wall_time > 0
+
+def test_threads():
+    prof = profiler.start_profiling(trace=True)
+    def worker():
+        for n in range(100):
+            with profiler.phase('encode'):
+                pass
+    threads = [threading.Thread(target=worker) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    profiler.stop_profiling()
+    assert prof.get_phases()[0].count == 400
+
+def test_outliers():
+    prof = profiler.Profiler()
+    for n in range(10):
+        prof.add('render', 0, 0.001, f'chip{n}')
+    prof.add('render', 0, 0.010, 'slow')
+    # Items are added up
+    prof.add('render', 0, 0.002, 'chip0')
+    # Not enough items for a median
+    prof.add('yaml', 0, 0.001, 'file1')
+    prof.add('yaml', 0, 0.100, 'file2')
+
+    outliers = prof.get_outliers()
+    assert [(outlier.phase, outlier.item) for outlier in outliers] == [('render', 'slow')]
+    assert outliers[0].time == pytest.approx(0.010)
+    assert outliers[0].ratio == pytest.approx(10)
+    assert [outlier.item for outlier in prof.get_outliers(ratio=2.5)] == ['slow', 'chip0']
+    assert prof.get_outliers(count=0) == []
+
+def test_report():
+    prof = profiler.Profiler()
+    for n in range(5):
+        prof.add('render', 0, 0.001, f'chip{n}')
+    prof.add('render', 0, 0.010, 'cpu/6502')
+    prof.stop()
+    report = prof.format_report()
+    lines = report.splitlines()
+    assert lines[0].split() == ['Phase', 'Count', 'Total', 'ms', 'Mean', 'ms', 'Max', 'ms', '%', 'wall']
+    assert lines[1].split()[:5] == ['render', '6', '15.00', '2.500', '10.000']
+    assert 'Wall time' in report
+    assert 'Outliers' in report
+    assert 'cpu/6502' in report
+
+    assert 'Outliers' not in profiler.Profiler().format_report()
+
+def test_trace(tmpdir):
+    prof = profiler.Profiler()
+    with pytest.raises(ValueError):
+        prof.write_trace(str(tmpdir.join('trace.json')))
+
+    prof = profiler.Profiler(trace=True)
+    prof.add('render', prof._start + 0.001, prof._start + 0.003, 'chip1')
+    with prof.phase('encode'):
+        pass
+    trace_file = tmpdir.join('trace.json')
+    prof.write_trace(str(trace_file))
+    trace = json.loads(trace_file.read())
+    events = trace['traceEvents']
+    assert events[0]['ph'] == 'M'
+    assert events[0]['args']['name'] == 'MainThread'
+    assert events[1]['name'] == 'render'
+    assert events[1]['ph'] == 'X'
+    assert events[1]['ts'] == pytest.approx(1000)
+    assert events[1]['dur'] == pytest.approx(2000)
+    assert events[1]['args'] == {'item': 'chip1'}
+    assert events[2]['name'] == 'encode'
+    assert 'args' not in events[2]
+
+def test_profile(tmpdir):
+    output = io.StringIO()
+    trace_file = str(tmpdir.join('trace.json'))
+    stats_file = str(tmpdir.join('stats.pstats'))
+    with profiler.profile(trace_file, stats_file, output) as prof:
+        assert profiler.get_profiler() is prof
+        with profiler.phase('render', 'chip1'):
+            sorted(range(1000))
+    assert profiler.get_profiler() is None
+    assert output.getvalue().startswith('Phase')
+    assert 'render' in output.getvalue()
+    assert json.loads(open(trace_file).read())['traceEvents']
+    assert pstats.Stats(stats_file).total_calls > 0
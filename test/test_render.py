@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# test_render.py
+
+import io
+import pkg_resources
+import pytest
+from PIL import Image
+from chiplabel import chip
+from chiplabel.chip_list import ChipList
+from chiplabel.render import LabelRenderer, PackedImage, render_many
+
+TEST_DIR = pkg_resources.resource_filename('test', 'data')
+
+def _chips(count):
+    chips = []
+    for n in range(count):
+        c = chip.Chip(f'chip{n}', 8)
+        c.set_pins([f'P{p}' for p in range(8)])
+        chips.append(c)
+    return chips
+
+def test_formats():
+    c = _chips(1)[0]
+    image = LabelRenderer('image').render(c)
+    assert image.mode == '1'
+
+    png = LabelRenderer('png').render(c)
+    decoded = Image.open(io.BytesIO(png))
+    assert decoded.size == image.size
+    assert decoded.tobytes() == image.tobytes()
+
+    packed = LabelRenderer('packed').render(c)
+    assert isinstance(packed, PackedImage)
+    assert (packed.width, packed.height) == image.size
+    assert len(packed.data) == (image.width + 7) // 8 * image.height
+    assert Image.frombytes('1', image.size, packed.data).tobytes() == image.tobytes()
+
+    pbm = LabelRenderer('pbm').render(c)
+    assert Image.open(io.BytesIO(pbm)).convert('1').tobytes() == image.tobytes()
+    assert LabelRenderer('tiff').render(c).startswith(b'II*\0')
+
+    assert b'<svg' in LabelRenderer('svg').render(c)
+    assert LabelRenderer('pdf').render(c).startswith(b'%PDF')
+
+    with pytest.raises(ValueError):
+        LabelRenderer('bmp')
+
+def test_render_ids():
+    chip_list = ChipList()
+    chip_list.load(TEST_DIR)
+    results = list(render_many(['TestChip', 'chip1/555'], 'packed', chip_list=chip_list))
+    assert [c.scoped_id for c, _ in results] == ['chip2/TestChip', 'chip1/555']
+
+    with pytest.raises(KeyError):
+        list(render_many(['notfound'], chip_list=chip_list))
+    with pytest.raises(ValueError):
+        list(render_many(['555']))
+
+def test_lazy():
+    consumed = []
+    def chips():
+        for c in _chips(100):
+            consumed.append(c)
+            yield c
+    results = render_many(chips(), 'image', dpi=100)
+    assert not consumed
+    next(results)
+    assert len(consumed) == 1
+    results.close()
+
+def test_parallel():
+    chips = _chips(12)
+    expected = [data for _, data in render_many(chips, 'png', dpi=100)]
+    results = list(render_many(chips, 'png', jobs=3, dpi=100))
+    assert [c.id for c, _ in results] == [c.id for c in chips]
+    assert [data for _, data in results] == expected
+
+    # Generator input, as completed
+    results = list(render_many(iter(chips), 'png', jobs=3, ordered=False, window=2, dpi=100))
+    assert sorted(c.id for c, _ in results) == sorted(c.id for c in chips)
+    assert dict((c.id, data) for c, data in results) == dict((c.id, data) for c, data in zip(chips, expected))
+
+def test_parallel_bounded():
+    consumed = []
+    def chips():
+        for c in _chips(50):
+            consumed.append(c)
+            yield c
+    results = render_many(chips(), 'packed', jobs=2, window=3, chunksize=2, dpi=100)
+    next(results)
+    # No more than window chunks read ahead
+    assert len(consumed) == 3 * 2
+    results.close()
+
+def test_parallel_error():
+    chips = _chips(4)
+    # Empty pin name can't be rendered
+    chips[2][1] = ''
+    results = render_many(chips, 'png', jobs=2, chunksize=1, dpi=100)
+    assert [c.id for c, _ in (next(results), next(results))] == ['chip0', 'chip1']
+    with pytest.raises(Exception):
+        next(results)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# test_render_cache.py
+
+import pkg_resources
+import pytest
+from PIL import Image
+from PIL import ImageChops
+from chiplabel import chip
+from chiplabel.chip_printer import ChipPrinter
+from chiplabel.render_cache import RenderCache
+
+FONT_DIR = pkg_resources.resource_filename('chiplabel', 'fonts')
+DEFAULT_FONT = f'{FONT_DIR}/CascadiaMono.ttf'
+
+def _create_chip(id='chip', pins=8, **kwargs):
+    c = chip.Chip(id, pins, **kwargs)
+    c.description = 'desc'
+    c.set_pins([f'P{n}' for n in range(1, pins+1)])
+    return c
+
+def _same_image(a, b):
+    return a.size == b.size and not ImageChops.difference(a, b).getbbox()
+
+def test_init():
+    cache = RenderCache()
+    assert len(cache) == 0
+    assert cache.cache_dir == None
+    assert cache.stats == {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    with pytest.raises(ValueError):
+        RenderCache(size=-1)
+
+def test_make_key():
+    settings = (300, DEFAULT_FONT, 1.0, False, 1.0, 2)
+    a = _create_chip()
+    b = _create_chip()
+    assert RenderCache.make_key(a, settings) == RenderCache.make_key(b, settings)
+
+    # Render settings
+    assert RenderCache.make_key(a, settings) != RenderCache.make_key(a, (600,) + settings[1:])
+    assert RenderCache.make_key(a, settings) != RenderCache.make_key(a, settings[:3] + (True,) + settings[4:])
+
+    # Chip attributes
+    b[1] = 'other'
+    assert RenderCache.make_key(a, settings) != RenderCache.make_key(b, settings)
+    b = _create_chip()
+    b.description = 'other'
+    assert RenderCache.make_key(a, settings) != RenderCache.make_key(b, settings)
+    b = _create_chip(rowSpacing=12)
+    assert RenderCache.make_key(a, settings) != RenderCache.make_key(b, settings)
+
+    # Aliases print a different name
+    assert RenderCache.make_key(a, settings) != RenderCache.make_key(a.create_alias('alias'), settings)
+
+def test_get_put():
+    cache = RenderCache(size=2)
+    image = Image.new(mode='1', size=(10, 10), color=255)
+
+    assert cache.get('a') == None
+    assert cache.misses == 1
+
+    cache.put('a', image)
+    cached = cache.get('a')
+    assert cached
+    assert cached is not image
+    assert _same_image(cached, image)
+    assert cache.hits == 1
+
+    # Cached images are copies
+    cached.putpixel((0, 0), 0)
+    assert _same_image(cache.get('a'), image)
+
+def test_lru():
+    cache = RenderCache(size=2)
+    image = Image.new(mode='1', size=(10, 10), color=255)
+
+    cache.put('a', image)
+    cache.put('b', image)
+    assert cache.get('a') # 'a' is now most recent
+    cache.put('c', image)
+    assert len(cache) == 2
+    assert cache.get('b') == None
+    assert cache.get('a')
+    assert cache.get('c')
+
+    cache = RenderCache(size=0)
+    cache.put('a', image)
+    assert len(cache) == 0
+    assert cache.get('a') == None
+
+def test_disk_cache(tmpdir):
+    image = Image.new(mode='1', size=(10, 20), color=255)
+    image.putpixel((1, 2), 0)
+
+    cache = RenderCache(cache_dir=str(tmpdir))
+    cache.put('a', image)
+    assert tmpdir.join('a.png').check(file=1)
+
+    # New instance, empty memory tier
+    cache = RenderCache(cache_dir=str(tmpdir))
+    assert len(cache) == 0
+    cached = cache.get('a')
+    assert cached
+    assert cached.mode == '1'
+    assert _same_image(cached, image)
+    assert cache.stats == {'hits': 0, 'disk_hits': 1, 'misses': 0}
+
+    # Second lookup comes from memory
+    assert cache.get('a')
+    assert cache.stats == {'hits': 1, 'disk_hits': 1, 'misses': 0}
+
+def test_bad_disk_cache(tmpdir, caplog):
+    tmpdir.join('a.png').write('not an image')
+    cache = RenderCache(cache_dir=str(tmpdir))
+    assert cache.get('a') == None
+    assert cache.misses == 1
+    assert 'Unable to read cached label' in caplog.text
+
+def test_printer():
+    c = _create_chip()
+    cache = RenderCache()
+    p = ChipPrinter(font=DEFAULT_FONT, render_cache=cache)
+    assert p.render_cache is cache
+
+    ref = ChipPrinter(font=DEFAULT_FONT).print_chip(c)
+
+    image = p.print_chip(c)
+    assert cache.stats == {'hits': 0, 'disk_hits': 0, 'misses': 1}
+    assert _same_image(image, ref)
+
+    image = p.print_chip(c)
+    assert cache.stats == {'hits': 1, 'disk_hits': 0, 'misses': 1}
+    assert _same_image(image, ref)
+
+    # Different settings, shared cache
+    p = ChipPrinter(font=DEFAULT_FONT, invert=True, render_cache=cache)
+    image = p.print_chip(c)
+    assert cache.stats == {'hits': 1, 'disk_hits': 0, 'misses': 2}
+    assert not _same_image(image, ref)
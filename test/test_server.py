@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# test_server.py
+
+import io
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import pkg_resources
+import pytest
+from PIL import Image
+from chiplabel.args import parse_args
+from chiplabel.chip_list import ChipList
+from chiplabel import server
+from chiplabel.server import LabelServer, RequestError, make_server, parse_address
+
+TEST_DIR = pkg_resources.resource_filename('test', 'data')
+
+@pytest.fixture
+def label_server():
+    chip_list = ChipList()
+    chip_list.load(TEST_DIR)
+    return LabelServer(chip_list, vars(parse_args(['--serve'])))
+
+@pytest.fixture
+def http_server(label_server):
+    server = make_server('localhost:0', label_server)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://localhost:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def _get(url):
+    with urllib.request.urlopen(url) as response:
+        return response.status, response.headers, response.read()
+
+def _get_error(url):
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _get(url)
+    return err.value.code, json.loads(err.value.read())
+
+def test_parse_address():
+    assert parse_address('localhost:8765') == ('localhost', 8765)
+    assert parse_address('0.0.0.0:80') == ('0.0.0.0', 80)
+    assert parse_address('8765') == ('localhost', 8765)
+    assert parse_address('unix:/tmp/chiplabel.sock') == '/tmp/chiplabel.sock'
+    with pytest.raises(ValueError):
+        parse_address('localhost:http')
+
+def test_label(label_server):
+    content_type, data = label_server.get_label('555')
+    assert content_type == 'image/png'
+    image = Image.open(io.BytesIO(data))
+    assert image.size == (120, 71)
+
+    _, data = label_server.get_label('555', query={'dpi': ['600']})
+    assert Image.open(io.BytesIO(data)).size == (240, 142)
+
+    with pytest.raises(RequestError) as err:
+        label_server.get_label('notfound')
+    assert err.value.status == 404
+    with pytest.raises(RequestError) as err:
+        label_server.get_label('5555')
+    assert 'did you mean: chip1/555, chip2/555?' in str(err.value)
+    with pytest.raises(RequestError) as err:
+        label_server.get_label('555', query={'dpi': ['10']})
+    assert err.value.status == 400
+    with pytest.raises(RequestError) as err:
+        label_server.get_label('555', 'gif')
+    assert err.value.status == 404
+
+def test_printers_reused(label_server):
+    for n in range(3):
+        label_server.get_label('555')
+        label_server.get_label('555', query={'invert': ['']})
+    stats = label_server.stats
+    assert stats['printers'] == 2
+    assert stats['renders'] == 6
+    assert stats['render_cache'] == {'hits': 4, 'disk_hits': 0, 'misses': 2}
+
+def test_printers_bounded(label_server, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_PRINTERS', 3)
+    for dpi in range(300, 310):
+        label_server.get_label('555', query={'dpi': [str(dpi)]})
+    assert label_server.stats['printers'] == 3
+
+def test_page(label_server):
+    _, data, page_count = label_server.get_page(['555', 'TestChip'])
+    assert page_count == 1
+    assert Image.open(io.BytesIO(data)).size[0] == 210
+
+    query = {'page_size': ['1,1'], 'page_nocrop': ['1']}
+    _, data, page_count = label_server.get_page(['555']*8, 2, query=query)
+    assert page_count == 2
+    assert Image.open(io.BytesIO(data)).size == (300, 300)
+
+    with pytest.raises(RequestError) as err:
+        label_server.get_page(['555'], 3)
+    assert err.value.status == 404
+    with pytest.raises(RequestError) as err:
+        label_server.get_page([])
+    assert err.value.status == 400
+
+def test_bitmap(label_server):
+    content_type, data = label_server.get_label('555', 'pbm')
+    assert content_type == 'image/x-portable-bitmap'
+    assert Image.open(io.BytesIO(data)).size == (120, 71)
+    content_type, data = label_server.get_label('555', 'tiff')
+    assert content_type == 'image/tiff'
+    assert data.startswith(b'II*\0')
+    # Same printer as png
+    label_server.get_label('555')
+    assert label_server.stats['printers'] == 1
+
+def test_vector(label_server):
+    content_type, data = label_server.get_label('555', 'svg')
+    assert content_type == 'image/svg+xml'
+    assert data.startswith(b'<?xml')
+    content_type, data = label_server.get_label('555', 'pdf', query={'dpi': ['600']})
+    assert content_type == 'application/pdf'
+    assert data.startswith(b'%PDF-')
+
+    query = {'page_size': ['1,1']}
+    content_type, data, page_count = label_server.get_page(['555']*8, 2, 'pdf', query=query)
+    assert content_type == 'application/pdf'
+    assert page_count == 2
+    assert label_server.stats['printers'] == 3
+
+def test_coalesce(label_server):
+    calls = []
+    started = threading.Event()
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 'result'
+
+    results = []
+    def request():
+        results.append(label_server._coalesce('key', slow))
+
+    threads = [threading.Thread(target=request)]
+    threads[0].start()
+    started.wait()
+    threads += [threading.Thread(target=request) for n in range(4)]
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['result'] * 5
+    assert len(calls) == 1
+    assert label_server.stats['coalesced'] == 4
+    # Not in flight anymore
+    assert label_server._coalesce('key', lambda: 'new') == 'new'
+
+def test_coalesce_error(label_server):
+    def fail():
+        raise ValueError('render error')
+    with pytest.raises(ValueError):
+        label_server._coalesce('key', fail)
+    assert label_server._coalesce('key', lambda: 'ok') == 'ok'
+
+def test_http(http_server):
+    status, headers, data = _get(f'{http_server}/chips')
+    assert status == 200
+    assert 'chip2/TestChip' in json.loads(data)
+
+    status, headers, data = _get(f'{http_server}/label/555.png?dpi=600')
+    assert headers['Content-Type'] == 'image/png'
+    assert Image.open(io.BytesIO(data)).size == (240, 142)
+
+    status, headers, data = _get(f'{http_server}/page.png?chip=555,TestChip&chip=555')
+    assert headers['X-Page-Count'] == '1'
+    assert Image.open(io.BytesIO(data))
+
+    stats = json.loads(_get(f'{http_server}/stats')[2])
+    assert stats['requests'] == 4
+    assert stats['chips'] == 3
+
+def test_http_errors(http_server):
+    assert _get_error(f'{http_server}/label/notfound.png') == \
+        (404, {'error': 'Chip not found: notfound'})
+    assert _get_error(f'{http_server}/label/555.png?dpi=abc')[0] == 400
+    assert _get_error(f'{http_server}/page.png?chip=555&page=x')[0] == 400
+    assert _get_error(f'{http_server}/unknown')[0] == 404
+
+    stats = json.loads(_get(f'{http_server}/stats')[2])
+    assert stats['errors'] == 4
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets not supported')
+def test_unix_socket(label_server, tmpdir):
+    path = str(tmpdir.join('chiplabel.sock'))
+    server = make_server(f'unix:{path}', label_server)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(b'GET /stats HTTP/1.0\r\n\r\n')
+            response = b''
+            while True:
+                data = client.recv(4096)
+                if not data:
+                    break
+                response += data
+        assert response.startswith(b'HTTP/1.0 200')
+        assert json.loads(response.split(b'\r\n\r\n', 1)[1])['chips'] == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not os.path.exists(path)
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets not supported')
+def test_unix_socket_file(label_server, tmpdir):
+    # A file that is not a socket is never replaced
+    path = tmpdir.join('labels.txt')
+    path.write('keep')
+    with pytest.raises(FileExistsError):
+        make_server(f'unix:{path}', label_server)
+    assert path.read() == 'keep'
+
+    # The socket of a previous server is replaced
+    stale = str(tmpdir.join('stale.sock'))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as previous:
+        previous.bind(stale)
+    server = make_server(f'unix:{stale}', label_server)
+    server.server_close()
+    assert not os.path.exists(stale)
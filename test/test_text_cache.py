@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# test_text_cache.py
+
+import pkg_resources
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+from collections import OrderedDict
+from chiplabel import chip
+from chiplabel import text_cache
+from chiplabel.chip_printer import ChipPrinter
+from chiplabel.text_cache import TextCache
+
+FONT_DIR = pkg_resources.resource_filename('chiplabel', 'fonts')
+DEFAULT_FONT = f'{FONT_DIR}/CascadiaMono.ttf'
+
+TEXTS = ['GND', 'VCC', '1A', 'CLK', 'j', 'Wy_', ' A ', '555 Timer', 'ÉÀç']
+POSITIONS = [(0, 0), (3, 7), (-2, -3), (90, 30)]
+
+def _fonts():
+    return [ImageFont.truetype(DEFAULT_FONT, size) for size in (12, 25, 50)] + \
+        [ImageFont.load_default()]
+
+def test_draw_text():
+    for font in _fonts():
+        cache = TextCache(font)
+        for text in TEXTS:
+            if not isinstance(font, ImageFont.FreeTypeFont) and not text.isascii():
+                continue
+            for pos in POSITIONS:
+                ref = Image.new(mode='1', size=(100, 40), color=255)
+                ImageDraw.Draw(ref).text(pos, text, font=font)
+
+                image = Image.new(mode='1', size=(100, 40), color=255)
+                cache.draw_text(image, pos, text)
+                assert not ImageChops.difference(image, ref).getbbox(), (font, text, pos)
+
+def test_textsize():
+    for font in _fonts():
+        cache = TextCache(font)
+        draw = ImageDraw.Draw(Image.new(mode='1', size=(1, 1)))
+        for text in TEXTS:
+            if not isinstance(font, ImageFont.FreeTypeFont) and not text.isascii():
+                continue
+            assert cache.textsize(text) == draw.textsize(text, font=font)
+
+def test_empty():
+    cache = TextCache(ImageFont.truetype(DEFAULT_FONT, 12))
+    bitmap, _ = cache.get_bitmap('')
+    assert bitmap == None
+    image = Image.new(mode='1', size=(10, 10), color=255)
+    cache.draw_text(image, (0, 0), '')
+    assert image.getextrema() == (255, 255)
+
+def test_stats():
+    cache = TextCache(ImageFont.truetype(DEFAULT_FONT, 12))
+    assert cache.stats == {'hits': 0, 'misses': 0}
+    image = Image.new(mode='1', size=(10, 10), color=255)
+    for n in range(3):
+        cache.draw_text(image, (0, 0), 'GND')
+    cache.draw_text(image, (0, 0), 'VCC')
+    assert cache.stats == {'hits': 2, 'misses': 2}
+    assert len(cache) == 2
+    assert str(cache) == '2 hits, 2 misses'
+
+def test_size():
+    cache = TextCache(ImageFont.truetype(DEFAULT_FONT, 12), size=2)
+    image = Image.new(mode='1', size=(10, 10), color=255)
+    for text in ['GND', 'VCC', 'GND', 'CLK']:
+        cache.draw_text(image, (0, 0), text)
+        cache.textsize(text)
+    # VCC is the least recently used
+    assert len(cache) == 2
+    assert list(cache._bitmaps) == ['GND', 'CLK']
+    assert list(cache._metrics) == ['GND', 'CLK']
+
+    # Not cached
+    cache.draw_text(image, (0, 0), 'Unique chip name', cache=False)
+    cache.textsize('Unique chip name', cache=False)
+    assert list(cache._bitmaps) == ['GND', 'CLK']
+    assert list(cache._metrics) == ['GND', 'CLK']
+    assert cache.stats == {'hits': 1, 'misses': 3}
+
+    with pytest.raises(ValueError):
+        TextCache(ImageFont.load_default(), size=-1)
+
+def test_shared(monkeypatch):
+    monkeypatch.setattr(text_cache, '_text_caches', OrderedDict())
+
+    p1 = ChipPrinter(font=DEFAULT_FONT, dpi=300)
+    p2 = ChipPrinter(font=DEFAULT_FONT, dpi=300, invert=True)
+    p3 = ChipPrinter(font=DEFAULT_FONT, dpi=600)
+    assert p1.text_cache is p2.text_cache
+    assert p1.text_cache is not p3.text_cache
+
+    c = chip.Chip('chip', 8)
+    p1.print_chip(c)
+    # NC, the chip name is not cached
+    assert p1.text_cache.stats == {'hits': 7, 'misses': 1}
+    p2.print_chip(c)
+    assert p1.text_cache.stats == {'hits': 15, 'misses': 1}
+
+    stats = text_cache.get_text_cache_stats()
+    assert stats == {'caches': 2, 'strings': 1, 'hits': 15, 'misses': 1}
+
+    text_cache.clear_text_caches()
+    assert text_cache.get_text_cache_stats()['caches'] == 0
+
+def test_max_caches(monkeypatch):
+    monkeypatch.setattr(text_cache, '_text_caches', OrderedDict())
+    monkeypatch.setattr(text_cache, 'MAX_TEXT_CACHES', 2)
+    font = ImageFont.load_default()
+    first = text_cache.get_text_cache('a', font)
+    text_cache.get_text_cache('b', font)
+    # 'a' is used again, 'b' is the least recently used
+    assert text_cache.get_text_cache('a', font) is first
+    text_cache.get_text_cache('c', font)
+    assert list(text_cache._text_caches) == ['a', 'c']
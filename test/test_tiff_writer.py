@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# test_tiff_writer.py
+
+import io
+import struct
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+from chiplabel.bilevel import has_libtiff
+from chiplabel.tiff_writer import G4Encoder, _changes, write_g4_tiff
+
+def _image(size):
+    image = Image.new('1', size, color=255)
+    draw = ImageDraw.Draw(image)
+    draw.line([(0, 0), (size[0]-1, size[1]-1)])
+    draw.rectangle([(5, 5), (30, 40)])
+    draw.rectangle([(60, 10), (90, 20)], fill=0)
+    return image
+
+def _bands(image, band_height):
+    width, height = image.size
+    return [image.crop((0, y, width, min(y + band_height, height))) for y in range(0, height, band_height)]
+
+def _bits(bits):
+    bits += '0' * (-len(bits) % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, 'big')
+
+def _tags(data):
+    """Tag: value of the first IFD"""
+    ifd_offset, = struct.unpack('<I', data[4:8])
+    count, = struct.unpack('<H', data[ifd_offset:ifd_offset + 2])
+    tags = {}
+    for n in range(count):
+        entry = data[ifd_offset + 2 + n * 12:ifd_offset + 14 + n * 12]
+        tag, tag_type = struct.unpack('<HH', entry[:4])
+        tags[tag] = struct.unpack('<H' if tag_type == 3 else '<I', entry[8:10] if tag_type == 3 else entry[8:])[0]
+    return tags
+
+def test_changes():
+    assert _changes(b'\xff', 8, 0) == [8, 8, 8]
+    assert _changes(b'\x00', 8, 0) == [0, 8, 8, 8]
+    # Padding bits are not black pixels
+    assert _changes(b'\xe7\x80', 9, 7) == [3, 5, 9, 9, 9]
+    assert _changes(b'\xfe\x00', 9, 7) == [7, 9, 9, 9]
+
+def test_encode():
+    eofb = '000000000001' * 2
+    encoder = G4Encoder(8)
+    encoder.encode(b'\xff')
+    # V0 on the imaginary white row
+    assert encoder.flush() == _bits('1' + eofb)
+
+    encoder = G4Encoder(8)
+    encoder.encode(b'\x00\x00')
+    # Horizontal: 0 white and 8 black pixels, then V0 V0 for the same row
+    assert encoder.flush() == _bits('001' + '00110101' + '000101' + '11' + eofb)
+
+    encoder = G4Encoder(2000)
+    encoder.encode(b'\x00' * 250)
+    # Black run of 2000: makeup code of 1984, terminating code of 16
+    assert encoder.flush() == _bits('001' + '00110101' + '000000010010' + '0000010111' + eofb)
+
+@pytest.mark.parametrize('band_height', [1, 10, 57])
+def test_write_g4_tiff(band_height):
+    image = _image((103, 57))
+    output = io.BytesIO()
+    write_g4_tiff(output, image.size, _bands(image, band_height), dpi=300)
+    data = output.getvalue()
+    assert data[:4] == b'II*\0'
+    tags = _tags(data)
+    assert (tags[256], tags[257]) == (103, 57)
+    assert tags[259] == 4
+    assert tags[262] == 0
+    strip = data[tags[273]:tags[273] + tags[279]]
+    # Same data whatever the bands
+    whole = io.BytesIO()
+    write_g4_tiff(whole, image.size, [image], dpi=300)
+    assert whole.getvalue() == data
+    # Much smaller than the raw rows
+    assert len(strip) < 13 * 57 / 2
+
+    no_dpi = io.BytesIO()
+    write_g4_tiff(no_dpi, image.size, [image])
+    assert 282 not in _tags(no_dpi.getvalue())
+
+@pytest.mark.skipif(not has_libtiff(), reason='Pillow has no G4 decoder')
+def test_decode():
+    image = _image((103, 57))
+    output = io.BytesIO()
+    write_g4_tiff(output, image.size, _bands(image, 10), dpi=300)
+    output.seek(0)
+    result = Image.open(output)
+    assert result.info['dpi'] == pytest.approx((300, 300), abs=0.01)
+    assert ImageChops.difference(result.convert('1'), image).getbbox() == None
+
+def test_write_g4_tiff_errors():
+    image = _image((100, 50))
+    with pytest.raises(ValueError):
+        write_g4_tiff(io.BytesIO(), (101, 50), _bands(image, 10))
+    with pytest.raises(ValueError):
+        write_g4_tiff(io.BytesIO(), (100, 51), _bands(image, 10))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# test_vector_printer.py
+
+import os
+import xml.etree.ElementTree as ET
+import pkg_resources
+import pytest
+from chiplabel import chip
+from chiplabel.vector_printer import VectorChipPrinter, VectorGridPrinter
+
+FONT_DIR = pkg_resources.resource_filename('chiplabel', 'fonts')
+DEFAULT_FONT = f'{FONT_DIR}/CascadiaMono.ttf'
+SVG = '{http://www.w3.org/2000/svg}'
+
+def _chip():
+    c = chip.Chip('7400', 14)
+    c.description = 'quad nand'
+    c.set_pins(['1A', '1B', '1Y', '2A', '2B', '2Y', 'GND',
+        '3Y', '3A', '3B', '4Y', '4A', '4B', '/VCC'])
+    return c
+
+def test_init():
+    assert VectorChipPrinter().format == 'svg'
+    assert VectorChipPrinter(format='pdf').format == 'pdf'
+    with pytest.raises(ValueError):
+        VectorChipPrinter(format='png')
+
+def test_drawing():
+    p = VectorChipPrinter(font=DEFAULT_FONT)
+    drawing = p.get_drawing(_chip())
+    # Rotated label: 7 pins x 2.54mm wide, 6mm high
+    assert drawing.width == pytest.approx(17.78)
+    assert drawing.height == pytest.approx(6)
+    texts = [item for item in drawing.items if item[0] == 'text']
+    assert len(texts) == 15
+    assert texts[0][1:7] == (pytest.approx(1.27), pytest.approx(6 - 2*25.4/300), '1A', 90, 'start', None)
+    assert texts[13][3:] == ('VCC', 90, 'end', (0, 3))
+    assert texts[14][3] == '7400 quad nand'
+
+    # Pins on the other side
+    inverted = VectorChipPrinter(font=DEFAULT_FONT, invert=True).get_drawing(_chip())
+    assert inverted.items[1][2] == pytest.approx(2*25.4/300)
+
+def test_svg():
+    data = VectorChipPrinter(font=DEFAULT_FONT).print_chip(_chip())
+    root = ET.fromstring(data)
+    assert root.get('width') == '17.78mm'
+    assert root.get('viewBox') == '0 0 17.78 6'
+    assert 'Cascadia' in root.find(f'{SVG}g').get('font-family')
+    texts = [''.join(text.itertext()) for text in root.iter(f'{SVG}text')]
+    assert '1A' in texts and 'VCC' in texts and '7400 quad nand' in texts
+    overlines = [span.text for span in root.iter(f'{SVG}tspan')]
+    assert overlines == ['VCC']
+    assert len(list(root.iter(f'{SVG}rect'))) == 1
+    assert len(list(root.iter(f'{SVG}path'))) == 1
+
+def test_pdf():
+    data = VectorChipPrinter(format='pdf').print_chip(_chip())
+    assert data.startswith(b'%PDF-')
+    assert b'/MediaBox [0 0 50.4 17.0079]' in data
+    assert data.endswith(b'%%EOF\n')
+
+def test_dpi_independent():
+    # Same geometry, the dpi only sets the line width and padding
+    low = VectorChipPrinter(dpi=100, font=DEFAULT_FONT).print_chip(_chip())
+    high = VectorChipPrinter(dpi=1200, font=DEFAULT_FONT).print_chip(_chip())
+    assert ET.fromstring(low).get('viewBox') == ET.fromstring(high).get('viewBox')
+    assert abs(len(low) - len(high)) < 100
+
+def test_print_chip_to_file(tmpdir):
+    p = VectorChipPrinter(format='pdf')
+    output_file = os.path.join(tmpdir, '7400.pdf')
+    p.print_chip_to_file(_chip(), output_file)
+    with open(output_file, 'rb') as pdf_file:
+        assert pdf_file.read().startswith(b'%PDF-')
+
+@pytest.mark.parametrize('packing', ['shelf', 'maxrects'])
+def test_pages(tmpdir, packing):
+    p = VectorGridPrinter(font=DEFAULT_FONT, output=tmpdir, page_size=(2, 2),
+        page_padding=0.1, page_packing=packing)
+    chips = [_chip()] * 30
+    page_count = p.print_chips(chips)
+    assert page_count == len(p.get_layout(chips))
+    assert page_count > 1
+    for page in range(1, page_count + 1):
+        root = ET.parse(os.path.join(tmpdir, f'page{page}.svg')).getroot()
+        width, height = (float(value) for value in root.get('viewBox').split()[2:])
+        assert width <= 2*25.4 and height <= 2*25.4
+    assert not os.path.exists(os.path.join(tmpdir, f'page{page_count + 1}.svg'))
+
+def test_rotated_page():
+    # Only fits rotated
+    p = VectorGridPrinter(font=DEFAULT_FONT, page_size=(1, 2), page_padding=0,
+        page_packing='maxrects', page_rotate=True)
+    chips = [chip.Chip('id', 24)]
+    assert p.get_layout(chips)[0][0].rotated
+    root = ET.fromstring(p.get_pages(chips)[0])
+    assert root.find(f'{SVG}g/{SVG}g').get('transform').startswith('matrix(0 -1 1 0 0 ')
+    assert root.get('viewBox') == '0 0 6 30.48'
+
+def test_page_file(tmpdir):
+    p = VectorGridPrinter(format='pdf', output=tmpdir, page_size=(2, 2), page_file='pages.pdf')
+    chips = [_chip()] * 30
+    assert p.print_chips(chips) == len(p.get_layout(chips))
+    with open(str(tmpdir.join('pages.pdf')), 'rb') as pdf_file:
+        data = pdf_file.read()
+    assert data.count(b'/Type /Page ') == len(p.get_layout(chips))
+    assert not tmpdir.join('page1.pdf').check()
+
+    with pytest.raises(ValueError):
+        VectorGridPrinter(format='svg', output=tmpdir, page_file='pages.pdf').print_chips(chips)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# test_watch.py
+
+import logging
+import os
+import pkg_resources
+import pytest
+from chiplabel import args
+from chiplabel.chip_list import ChipList
+from chiplabel.watch import LibraryPoller, Watcher
+
+TEST_DIR = pkg_resources.resource_filename('test', 'data')
+
+def _write(path, text):
+    # Same size edits in the same clock tick must be seen as changes
+    mtime = path.mtime() + 10 if path.check(file=1) else None
+    path.write(text)
+    if mtime:
+        os.utime(str(path), (mtime, mtime))
+
+def _library(tmpdir):
+    library = tmpdir.mkdir('library')
+    library.join('chip2.yaml').write(open(f'{TEST_DIR}/chip2.yaml').read())
+    return library
+
+def _watcher(library, output, *options):
+    arg_list = args.parse_args(['-a', '-i', str(library), '-o', str(output), '--watch', *options])
+    chip_list = ChipList()
+    chip_list.load(arg_list.input)
+    return Watcher(chip_list, arg_list, lambda: list(chip_list))
+
+def test_poller(tmpdir):
+    library = _library(tmpdir)
+    poller = LibraryPoller(str(library))
+    assert poller.poll() == []
+
+    chip2 = library.join('chip2.yaml')
+    _write(chip2, chip2.read().replace('Timer', 'Clock'))
+    library.join('new.yaml').write('4011:\n  pins: [A, B, C, D]\n')
+    library.join('notes.txt').write('not a library')
+    assert poller.poll() == [str(chip2), str(library.join('new.yaml'))]
+    assert poller.poll() == []
+
+    chip2.remove()
+    assert poller.poll() == [str(chip2)]
+
+    # Single file, missing path
+    assert LibraryPoller(str(library.join('new.yaml'))).poll() == []
+    assert LibraryPoller(str(tmpdir.join('notfound'))).poll() == []
+
+def test_labels(tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    library = _library(tmpdir)
+    output = tmpdir.mkdir('output')
+    watcher = _watcher(library, output)
+    assert watcher.poll() == 0
+
+    chip2 = library.join('chip2.yaml')
+    _write(chip2, chip2.read().replace('myDescription', 'changed') + '4011:\n  pins: [A, B, C, D]\n')
+    assert watcher.poll() == 2
+    assert output.join('TestChip.png').check(file=1)
+    assert output.join('4011.png').check(file=1)
+    assert output.join('555.png').check(file=0)
+    assert 'chip2.yaml: 1 added, 1 changed, 0 removed chips' in caplog.text
+
+    # Touched but not changed
+    _write(chip2, chip2.read())
+    assert watcher.poll() == 0
+    assert '0 labels updated, 0 deleted' in caplog.text
+
+    # Labels of removed chips are deleted
+    _write(chip2, '555:\n  pins: [A, B, C, D]\n')
+    assert watcher.poll() == 1
+    assert output.join('TestChip.png').check(file=0)
+    assert output.join('4011.png').check(file=0)
+    assert output.join('555.png').check(file=1)
+    assert '1 labels updated, 2 deleted' in caplog.text
+
+def test_vector_labels(tmpdir):
+    library = _library(tmpdir)
+    output = tmpdir.mkdir('output')
+    watcher = _watcher(library, output, '--format', 'svg')
+    chip2 = library.join('chip2.yaml')
+    _write(chip2, chip2.read().replace('Timer', 'Clock'))
+    assert watcher.poll() == 1
+    assert output.join('555.svg').check(file=1)
+
+def _chips(count, description=''):
+    return ''.join(f'74{n:02}:\n  description: {description}\n  pins: [A, B, C, D, E, F, G, H]\n'
+        for n in range(count))
+
+def test_pages(tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    library = tmpdir.mkdir('library')
+    chips = library.join('chips.yaml')
+    chips.write(_chips(20))
+    output = tmpdir.mkdir('output')
+    watcher = _watcher(library, output, '-p', '--page_size', '1', '1')
+    _write(chips, _chips(20, 'Logic'))
+    assert watcher.poll() == 4
+    assert output.join('page4.png').check(file=1)
+
+    _write(chips, chips.read())
+    assert watcher.poll() == 0
+    assert 'Pages unchanged' in caplog.text
+
+    # Pages of the previous version are deleted
+    _write(chips, _chips(1))
+    assert watcher.poll() == 1
+    assert output.join('page1.png').check(file=1)
+    assert output.join('page2.png').check(file=0)
+    assert output.join('page4.png').check(file=0)
+
+def test_run(tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    library = _library(tmpdir)
+    output = tmpdir.mkdir('output')
+    watcher = _watcher(library, output)
+    watcher.run(0.01, polls=2)
+    assert 'Watching' in caplog.text
+
+def test_errors(tmpdir, caplog, monkeypatch):
+    library = _library(tmpdir)
+    output = tmpdir.mkdir('output')
+    watcher = _watcher(library, output)
+    print_chip_to_file = watcher._printer.print_chip_to_file
+    def fail_4011(chip, output_file):
+        if chip.unscoped_id == '4011':
+            raise OSError('disk full')
+        print_chip_to_file(chip, output_file)
+    monkeypatch.setattr(watcher._printer, 'print_chip_to_file', fail_4011)
+
+    chip2 = library.join('chip2.yaml')
+    _write(chip2, chip2.read().replace('Timer', 'Clock') + '4011:\n  pins: [A, B, C, D]\n')
+    # The other labels are printed
+    assert watcher.poll() == 1
+    assert output.join('555.png').check(file=1)
+    assert 'Unable to print' in caplog.text and 'disk full' in caplog.text
+
+    # The failed label is printed again on the next change
+    monkeypatch.setattr(watcher._printer, 'print_chip_to_file', print_chip_to_file)
+    _write(chip2, chip2.read())
+    assert watcher.poll() == 1
+    assert output.join('4011.png').check(file=1)
+
+def test_run_errors(tmpdir, caplog, monkeypatch):
+    library = _library(tmpdir)
+    watcher = _watcher(library, tmpdir.mkdir('output'))
+    polls = []
+    def poll():
+        polls.append(1)
+        raise OSError('output locked')
+    monkeypatch.setattr(watcher, 'poll', poll)
+    # Polling goes on after an error
+    watcher.run(0.01, polls=3)
+    assert len(polls) == 3
+    assert 'output locked' in caplog.text